@@ -348,6 +348,7 @@ ALTER TABLE ONLY public.translations
     ADD CONSTRAINT translations_target_id_fkey FOREIGN KEY (target_id) REFERENCES public.languages(language_id);
 ALTER TABLE ONLY public.translations
     ADD CONSTRAINT translations_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.autographamt_users(user_id);
+CREATE INDEX translations_source_target_token_idx ON public.translations (source_id, target_id, token);
 
 
 CREATE TABLE public.translations_history (
@@ -376,6 +377,7 @@ ALTER TABLE ONLY public.translations_history
     ADD CONSTRAINT translations_history_target_id_fkey FOREIGN KEY (target_id) REFERENCES public.languages(language_id);
 ALTER TABLE ONLY public.translations_history
     ADD CONSTRAINT translations_history_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.autographamt_users(user_id) ON DELETE CASCADE;
+CREATE INDEX translations_history_source_target_idx ON public.translations_history (source_id, target_id, translation_id);
 
 
 CREATE TABLE public.translation_projects_look_up (
@@ -402,6 +404,93 @@ ALTER TABLE ONLY public.translation_projects_look_up
 
 
 
+CREATE TABLE public.phrase_models (
+    source_table text NOT NULL,
+    algo text NOT NULL,
+    content_hash text NOT NULL,
+    phrases jsonb NOT NULL,
+    created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2)
+);
+ALTER TABLE ONLY public.phrase_models
+    ADD CONSTRAINT phrase_models_pkey PRIMARY KEY (source_table, algo);
+
+CREATE TABLE public.tokenization_jobs (
+    job_id bigint NOT NULL,
+    source_id bigint NOT NULL,
+    book_id integer NOT NULL,
+    status text DEFAULT 'pending'::text NOT NULL,
+    message text,
+    attempts integer DEFAULT 0 NOT NULL,
+    created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2),
+    started_at timestamp with time zone,
+    finished_at timestamp with time zone
+);
+CREATE SEQUENCE public.tokenization_jobs_job_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+ALTER SEQUENCE public.tokenization_jobs_job_id_seq OWNED BY public.tokenization_jobs.job_id;
+ALTER TABLE ONLY public.tokenization_jobs ALTER COLUMN job_id SET DEFAULT nextval('public.tokenization_jobs_job_id_seq'::regclass);
+ALTER TABLE ONLY public.tokenization_jobs
+    ADD CONSTRAINT tokenization_jobs_pkey PRIMARY KEY (job_id);
+ALTER TABLE ONLY public.tokenization_jobs
+    ADD CONSTRAINT tokenization_jobs_source_id_fkey FOREIGN KEY (source_id) REFERENCES public.sources(source_id);
+CREATE UNIQUE INDEX tokenization_jobs_active_idx ON public.tokenization_jobs (source_id, book_id) WHERE status IN ('pending', 'running');
+CREATE INDEX tokenization_jobs_book_idx ON public.tokenization_jobs (source_id, book_id, job_id);
+
+CREATE TABLE public.email_outbox (
+    email_id bigint NOT NULL,
+    to_email text NOT NULL,
+    from_email text NOT NULL,
+    from_name text,
+    subject text NOT NULL,
+    html text NOT NULL,
+    status text DEFAULT 'pending'::text NOT NULL,
+    attempts integer DEFAULT 0 NOT NULL,
+    last_error text,
+    created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2),
+    next_attempt_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2) NOT NULL,
+    claimed_at timestamp with time zone,
+    sent_at timestamp with time zone
+);
+CREATE SEQUENCE public.email_outbox_email_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+ALTER SEQUENCE public.email_outbox_email_id_seq OWNED BY public.email_outbox.email_id;
+ALTER TABLE ONLY public.email_outbox ALTER COLUMN email_id SET DEFAULT nextval('public.email_outbox_email_id_seq'::regclass);
+ALTER TABLE ONLY public.email_outbox
+    ADD CONSTRAINT email_outbox_pkey PRIMARY KEY (email_id);
+CREATE INDEX email_outbox_unsent_idx ON public.email_outbox (email_id) WHERE status IN ('pending', 'sending');
+
+CREATE TABLE public.project_book_statistics (
+    project_id bigint NOT NULL,
+    book_id integer NOT NULL,
+    all_tokens_count integer DEFAULT 0 NOT NULL,
+    translated_tokens_count integer DEFAULT 0 NOT NULL,
+    updated_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2)
+);
+ALTER TABLE ONLY public.project_book_statistics
+    ADD CONSTRAINT project_book_statistics_pkey PRIMARY KEY (project_id, book_id);
+ALTER TABLE ONLY public.project_book_statistics
+    ADD CONSTRAINT project_book_statistics_project_id_fkey FOREIGN KEY (project_id) REFERENCES public.autographamt_projects(project_id) ON DELETE CASCADE;
+
+CREATE TABLE public.source_books (
+    source_id bigint NOT NULL,
+    book_id integer NOT NULL,
+    chapter_count integer,
+    version integer DEFAULT 1 NOT NULL,
+    updated_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2)
+);
+ALTER TABLE ONLY public.source_books
+    ADD CONSTRAINT source_books_pkey PRIMARY KEY (source_id, book_id);
+ALTER TABLE ONLY public.source_books
+    ADD CONSTRAINT source_books_source_id_fkey FOREIGN KEY (source_id) REFERENCES public.sources(source_id) ON DELETE CASCADE;
+
 -- <<<<<<<<<<<<<<<<<<<< SEED DATA >>>>>>>>>>>>>>>>>>>>>>>>
 
 INSERT INTO content_types (content_type) VALUES('bible');          
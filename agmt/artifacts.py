@@ -0,0 +1,115 @@
+'''
+A store of bible responses on disk, serialized and compressed once and shared by all the
+workers. Each response is kept as it is sent and compressed with gzip (and brotli, when the
+brotli package is installed), in a directory per source. A response is stored under a name
+(the endpoint, book and format it is made of) and the version of its content: writing a new
+version of a name removes the older ones, so a source has at most one set of files per name,
+and the directory of a source is removed when a book is uploaded to it.
+'''
+import os
+import gzip
+import shutil
+import tempfile
+import threading
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+# the file name suffix of each content encoding, None being the uncompressed response
+SUFFIXES = {None: '', 'gzip': '.gz', 'br': '.br'}
+
+
+def compress(data, encoding):
+	if encoding == 'gzip':
+		return gzip.compress(data, compresslevel=9)
+	if encoding == 'br':
+		return brotli.compress(data, mode=brotli.MODE_TEXT, quality=9)
+	return data
+
+
+class ArtifactStore(object):
+	'''The responses of the sources, in `directory`. A store without a directory keeps nothing.'''
+
+	def __init__(self, directory):
+		self.directory = directory
+		self.encodings = ['br', 'gzip'] if brotli else ['gzip']
+		self._lock = threading.Lock()
+		self._stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0}
+
+	@property
+	def enabled(self):
+		return bool(self.directory)
+
+	def negotiate(self, accept_encodings):
+		'''The content encoding to send for the Accept-Encoding of a request, None for no encoding.'''
+		for encoding in self.encodings:
+			if accept_encodings.quality(encoding) > 0:
+				return encoding
+		return None
+
+	def _path(self, sourceId, name, version, encoding):
+		return os.path.join(self.directory, str(sourceId), '%s.%s.json%s' % (name, version, SUFFIXES[encoding]))
+
+	def _count(self, name):
+		with self._lock:
+			self._stats[name] += 1
+
+	def read(self, sourceId, name, version, encoding=None):
+		'''The response of the name and version in the encoding, or None if it is not in the store.'''
+		if not self.enabled:
+			return None
+		try:
+			with open(self._path(sourceId, name, version, encoding), 'rb') as artifact:
+				data = artifact.read()
+		except IOError:
+			self._count("misses")
+			return None
+		self._count("hits")
+		return data
+
+	def write(self, sourceId, name, version, body):
+		'''Stores a response in each encoding, and returns them as {encoding: bytes}.'''
+		data = body.encode('utf-8')
+		representations = {encoding: compress(data, encoding) for encoding in [None] + self.encodings}
+		if not self.enabled:
+			return representations
+		directory = os.path.join(self.directory, str(sourceId))
+		try:
+			os.makedirs(directory, exist_ok=True)
+			for encoding, content in representations.items():
+				# written to a temporary file and renamed, so that a reader never sees part of a file
+				fd, tempPath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+				try:
+					with os.fdopen(fd, 'wb') as artifact:
+						artifact.write(content)
+					os.replace(tempPath, self._path(sourceId, name, version, encoding))
+				except OSError:
+					os.remove(tempPath)
+					raise
+			self._remove_versions(directory, name, version)
+		except OSError:
+			# the response is still sent, and stored again by the next request
+			self._count("errors")
+			return representations
+		self._count("writes")
+		return representations
+
+	def _remove_versions(self, directory, name, version):
+		'''Removes the files of the other versions of a name.'''
+		prefix = name + '.'
+		for fileName in os.listdir(directory):
+			if fileName.startswith(prefix) and not fileName.startswith(prefix + str(version) + '.'):
+				try:
+					os.remove(os.path.join(directory, fileName))
+				except OSError:
+					pass
+
+	def remove_source(self, sourceId):
+		if self.enabled:
+			shutil.rmtree(os.path.join(self.directory, str(sourceId)), ignore_errors=True)
+
+	def stats(self):
+		with self._lock:
+			return dict(self._stats, enabled=self.enabled, encodings=self.encodings)
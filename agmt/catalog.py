@@ -0,0 +1,107 @@
+import time
+import threading
+from collections import namedtuple
+
+Source = namedtuple('Source', ['source_id', 'table_name', 'content_type', 'content_id', 'status',
+	'metadata', 'language_id', 'language_code', 'language_name', 'version_code',
+	'version_description', 'revision', 'year', 'license'])
+Book = namedtuple('Book', ['book_id', 'book_name', 'book_code'])
+Language = namedtuple('Language', ['language_id', 'language_code', 'language_name',
+	'local_script_name', 'script', 'script_direction'])
+
+
+class SourceCatalog(object):
+	'''
+	An in-memory copy of the `sources`, `bible_books_look_up` and `languages` tables,
+	loaded once per worker process and shared by all its threads.
+	Writers call invalidate() after changing these tables, which makes the next read reload
+	the catalog and bumps `version`. As other workers cannot be notified, the catalog is also
+	reloaded every `ttl` seconds, and on a lookup miss (at most once in `miss_reload_interval`
+	seconds) so that a source created through another worker is found right away.
+	'''
+
+	def __init__(self, ttl=60, miss_reload_interval=5):
+		self.ttl = ttl
+		self.miss_reload_interval = miss_reload_interval
+		self.version = 0
+		self._lock = threading.Lock()
+		self._loaded_at = None
+		self._sources = {}
+		self._books_by_id = {}
+		self._books_by_code = {}
+		self._languages = {}
+		self._languages_by_code = {}
+
+	def invalidate(self):
+		with self._lock:
+			self._loaded_at = None
+
+	def load(self, conn):
+		cursor = conn.cursor()
+		cursor.execute("select s.source_id, s.table_name, c.content_type, s.content_id, s.status, s.metadata, \
+			s.language_id, l.language_code, l.language_name, v.version_code, v.version_description, v.revision, \
+				s.year, s.license from sources s left join content_types c on s.content_id=c.content_id \
+					left join languages l on s.language_id=l.language_id left join versions v on \
+						s.version_id=v.version_id")
+		sources = {int(row[0]): Source(int(row[0]), *row[1:]) for row in cursor.fetchall()}
+		cursor.execute("select book_id, book_name, book_code from bible_books_look_up order by book_id")
+		books = [Book(int(book_id), book_name, book_code) for book_id, book_name, book_code in cursor.fetchall()]
+		cursor.execute("select language_id, language_code, language_name, local_script_name, script, \
+			script_direction from languages")
+		languages = {int(row[0]): Language(int(row[0]), *row[1:]) for row in cursor.fetchall()}
+		cursor.close()
+		with self._lock:
+			self._sources = sources
+			self._books_by_id = {book.book_id: book for book in books}
+			self._books_by_code = {book.book_code.lower(): book for book in books}
+			self._languages = languages
+			self._languages_by_code = {lang.language_code: lang for lang in languages.values()}
+			self._loaded_at = time.time()
+			self.version += 1
+
+	def _ensure_loaded(self, conn):
+		loaded_at = self._loaded_at
+		if loaded_at is None or time.time() - loaded_at > self.ttl:
+			self.load(conn)
+
+	def _reload_on_miss(self, conn):
+		loaded_at = self._loaded_at
+		if loaded_at is None or time.time() - loaded_at > self.miss_reload_interval:
+			self.load(conn)
+			return True
+		return False
+
+	def get_source(self, conn, source_id):
+		'''Returns the Source for an id (int or numeric string), or None if there is no such source.'''
+		try:
+			source_id = int(source_id)
+		except (TypeError, ValueError):
+			return None
+		self._ensure_loaded(conn)
+		source = self._sources.get(source_id)
+		if source is None and self._reload_on_miss(conn):
+			source = self._sources.get(source_id)
+		return source
+
+	def get_sources(self, conn):
+		self._ensure_loaded(conn)
+		return list(self._sources.values())
+
+	def get_book(self, conn, book):
+		'''Returns the Book for an (int) book id or a 3 letter book code (any case), or None.'''
+		self._ensure_loaded(conn)
+		if isinstance(book, int):
+			return self._books_by_id.get(book)
+		return self._books_by_code.get(str(book).strip().lower())
+
+	def get_books(self, conn):
+		'''Returns all the Books, ordered by book id.'''
+		self._ensure_loaded(conn)
+		return [self._books_by_id[key] for key in sorted(self._books_by_id)]
+
+	def get_language(self, conn, language):
+		'''Returns the Language for a language id or a language code, or None.'''
+		self._ensure_loaded(conn)
+		if isinstance(language, int):
+			return self._languages.get(language)
+		return self._languages_by_code.get(language)
@@ -0,0 +1,105 @@
+'''
+Caching of the responses of the bible read endpoints.
+
+The content of a bible only changes when a book is uploaded. Each upload bumps the version of
+the book in the `source_books` table, so the version of a book, or of all the books of a source,
+tells whether a response computed before is still valid. The table also has the number of
+chapters of each book, which is all the navigation between chapters needs.
+The responses are kept in a per worker LRU, keyed by the request, along with the strong ETag
+of the content version they were made from.
+'''
+import hashlib
+import threading
+from collections import OrderedDict
+from psycopg2 import sql
+
+
+class ResponseCache(object):
+	'''An LRU of response bodies, of at most `maxsize` entries and `max_bytes` characters in all.'''
+
+	def __init__(self, maxsize=256, max_bytes=128 * 1024 * 1024):
+		self.maxsize = maxsize
+		self.max_bytes = max_bytes
+		self._lock = threading.Lock()
+		self._entries = OrderedDict()    # key -> (source id, etag, body)
+		self._size = 0
+		self._stats = {"hits": 0, "misses": 0}
+
+	def get(self, key, etag):
+		'''The body cached for the key, if it was made from the content with this etag.'''
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None or entry[1] != etag:
+				self._stats["misses"] += 1
+				return None
+			self._entries.move_to_end(key)
+			self._stats["hits"] += 1
+			return entry[2]
+
+	def put(self, key, sourceId, etag, body):
+		# a body too big for the cache would evict everything else
+		if len(body) > self.max_bytes // 4:
+			return
+		with self._lock:
+			self._remove(key)
+			self._entries[key] = (sourceId, etag, body)
+			self._size += len(body)
+			while len(self._entries) > self.maxsize or self._size > self.max_bytes:
+				self._remove(next(iter(self._entries)))
+
+	def _remove(self, key):
+		entry = self._entries.pop(key, None)
+		if entry is not None:
+			self._size -= len(entry[2])
+
+	def invalidate_source(self, sourceId):
+		'''Drops the responses of a source (the other workers find them stale by their etag).'''
+		with self._lock:
+			for key in [key for key, entry in self._entries.items() if entry[0] == sourceId]:
+				self._remove(key)
+
+	def stats(self):
+		with self._lock:
+			return dict(self._stats, entries=len(self._entries), bytes=self._size)
+
+
+def bump_book(cursor, sourceId, bookId, chapterCount):
+	'''Marks a book of a source as changed, in the transaction of the cursor.'''
+	cursor.execute("insert into source_books (source_id, book_id, chapter_count) values (%s, %s, %s) \
+		on conflict (source_id, book_id) do update set version=source_books.version+1, \
+			chapter_count=excluded.chapter_count, updated_at=now()", (sourceId, bookId, chapterCount))
+
+
+def source_books(connection, source):
+	'''
+	The navigation index of a bible: (book_id, chapter_count, version) of each of its books, in
+	book order. The books uploaded before the source_books table existed are added to it by
+	db_changes.sql; until then their version is None, and their chapter count is read from the book.
+	'''
+	cursor = connection.cursor()
+	# coalesce only reads the chapters of a book missing in source_books
+	cursor.execute(sql.SQL("select b.book_id, coalesce(s.chapter_count, (select \
+		jsonb_array_length(c.json_text->'chapters') from {bible} c where c.book_id=b.book_id limit 1), 0), \
+			s.version from (select distinct book_id from {bible}) b left join source_books s on \
+				s.source_id=%s and s.book_id=b.book_id order by b.book_id").format(
+					bible=sql.Identifier(source.table_name)), (source.source_id,))
+	books = cursor.fetchall()
+	cursor.close()
+	return books
+
+
+def content_version(books, bookId=None):
+	'''
+	The version of the content of a book (from the navigation index of its bible), or of all
+	the books if bookId is None, or None if there is no content or it has no version.
+	'''
+	if bookId is not None:
+		books = [book for book in books if book[0] == bookId]
+	# no content, or a book without a version (not in source_books yet) that cannot be cached
+	if not books or any(version is None for _, _, version in books):
+		return None
+	return "%s.%s" % (len(books), sum(version for _, _, version in books))
+
+
+def make_etag(key, version):
+	return hashlib.sha1(repr((key, version)).encode('utf-8')).hexdigest()
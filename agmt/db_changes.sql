@@ -1,2 +1,112 @@
 --Issue: 38, Date: 17-01-2020, Author: Revant
-ALTER TABLE versions ADD metadata jsonb;
\ No newline at end of file
+ALTER TABLE versions ADD metadata jsonb;
+
+--Full text index for /v1/search on the existing bible sources, Date: 18-10-2026
+DO $$
+DECLARE
+	clean_table text;
+BEGIN
+	FOR clean_table IN SELECT s.table_name || '_cleaned' FROM sources s WHERE s.content_id=1 LOOP
+		IF to_regclass(quote_ident(clean_table)) IS NOT NULL THEN
+			EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I USING gin (to_tsvector(''simple'', coalesce(verse, '''')))',
+				clean_table || '_verse_fts_idx', clean_table);
+		END IF;
+	END LOOP;
+END $$;
+
+
+--Phrase models reused by tokenize, Date: 18-10-2026
+CREATE TABLE IF NOT EXISTS phrase_models (
+	source_table TEXT NOT NULL,
+	algo TEXT NOT NULL,
+	content_hash TEXT NOT NULL,
+	phrases JSONB NOT NULL,
+	created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2),
+	PRIMARY KEY (source_table, algo)
+);
+
+--Background tokenization jobs, run by jobs.py, Date: 18-10-2026
+CREATE TABLE IF NOT EXISTS tokenization_jobs (
+	job_id BIGSERIAL PRIMARY KEY,
+	source_id BIGINT REFERENCES sources(source_id) NOT NULL,
+	book_id INT NOT NULL,
+	status TEXT NOT NULL DEFAULT 'pending',
+	message TEXT,
+	attempts INT NOT NULL DEFAULT 0,
+	created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2),
+	started_at timestamp with time zone,
+	finished_at timestamp with time zone
+);
+CREATE UNIQUE INDEX IF NOT EXISTS tokenization_jobs_active_idx ON tokenization_jobs (source_id, book_id) WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS tokenization_jobs_book_idx ON tokenization_jobs (source_id, book_id, job_id);
+
+--Lookup of the latest translation of a source and target language, used to validate the cached draft translations, Date: 18-10-2026
+CREATE INDEX IF NOT EXISTS translations_history_source_target_idx ON translations_history (source_id, target_id, translation_id);
+
+--Outbox of the emails sent by the job worker (mailer.py), Date: 18-10-2026
+CREATE TABLE IF NOT EXISTS email_outbox (
+	email_id BIGSERIAL PRIMARY KEY,
+	to_email TEXT NOT NULL,
+	from_email TEXT NOT NULL,
+	from_name TEXT,
+	subject TEXT NOT NULL,
+	html TEXT NOT NULL,
+	status TEXT NOT NULL DEFAULT 'pending',
+	attempts INT NOT NULL DEFAULT 0,
+	last_error TEXT,
+	created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2),
+	next_attempt_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP(2),
+	claimed_at timestamp with time zone,
+	sent_at timestamp with time zone
+);
+CREATE INDEX IF NOT EXISTS email_outbox_unsent_idx ON email_outbox (email_id) WHERE status IN ('pending', 'sending');
+
+--Translation statistics of each book of the projects, kept up to date by projectstats.py, Date: 18-10-2026
+CREATE TABLE IF NOT EXISTS project_book_statistics (
+	project_id BIGINT REFERENCES autographamt_projects(project_id) ON DELETE CASCADE NOT NULL,
+	book_id INT NOT NULL,
+	all_tokens_count INT NOT NULL DEFAULT 0,
+	translated_tokens_count INT NOT NULL DEFAULT 0,
+	updated_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2),
+	PRIMARY KEY (project_id, book_id)
+);
+
+--Index of the books of each token in the token tables, and of the translations of a source and target, used by /v1/translatedbooks, Date: 18-10-2026
+CREATE INDEX IF NOT EXISTS translations_source_target_token_idx ON translations (source_id, target_id, token);
+DO $$
+DECLARE
+	token_table text;
+BEGIN
+	FOR token_table IN SELECT s.table_name || '_tokens' FROM sources s WHERE s.content_id=1 LOOP
+		IF to_regclass(quote_ident(token_table)) IS NOT NULL THEN
+			EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I (token, book_id)', token_table || '_token_idx', token_table);
+		END IF;
+	END LOOP;
+END $$;
+
+--Content version of the books of each bible, bumped on upload, used to cache the bible responses (contentcache.py), Date: 18-10-2026
+CREATE TABLE IF NOT EXISTS source_books (
+	source_id BIGINT REFERENCES sources(source_id) ON DELETE CASCADE NOT NULL,
+	book_id INT NOT NULL,
+	version INT NOT NULL DEFAULT 1,
+	updated_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP(2),
+	PRIMARY KEY (source_id, book_id)
+);
+
+--Number of chapters of the books of each bible, the navigation index used by getChapter, Date: 18-10-2026
+ALTER TABLE source_books ADD COLUMN IF NOT EXISTS chapter_count INT;
+
+--Books of the bibles uploaded before source_books, with their chapter counts, Date: 18-10-2026
+DO $$
+DECLARE
+	src RECORD;
+BEGIN
+	FOR src IN SELECT s.source_id, s.table_name FROM sources s WHERE s.content_id=1 LOOP
+		IF to_regclass(quote_ident(src.table_name)) IS NOT NULL THEN
+			EXECUTE format('INSERT INTO source_books (source_id, book_id, chapter_count) SELECT DISTINCT ON (book_id) %s, book_id,
+				coalesce(jsonb_array_length(json_text->''chapters''), 0) FROM %I ORDER BY book_id ON CONFLICT (source_id, book_id)
+					DO UPDATE SET chapter_count=excluded.chapter_count WHERE source_books.chapter_count IS NULL',
+				src.source_id, src.table_name);
+		END IF;
+	END LOOP;
+END $$;
@@ -0,0 +1,160 @@
+import time
+import threading
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolExhaustedError(PoolError):
+	'''Raised when no connection could be checked out within the pool timeout.'''
+	pass
+
+
+class ConnectionPool(object):
+	'''
+	A thread safe pool of PostgreSQL connections, meant to be created once per
+	(gunicorn) worker process.
+	 - keeps at least `minconn` and at most `maxconn` connections open
+	 - connections idle for more than `check_idle` seconds are pinged before being handed out
+	 - connections older than `max_lifetime` seconds are closed and replaced
+	 - a checkout waits at most `timeout` seconds for a free connection before failing
+	'''
+
+	def __init__(self, minconn, maxconn, max_lifetime=3600, check_idle=30, timeout=5, **connect_kwargs):
+		self.minconn = int(minconn)
+		self.maxconn = int(maxconn)
+		self.max_lifetime = float(max_lifetime)
+		self.check_idle = float(check_idle)
+		self.timeout = float(timeout)
+		self._connect_kwargs = connect_kwargs
+		self._cond = threading.Condition()
+		self._idle = []       # [(conn, created_at, last_used)], most recently used last
+		self._in_use = {}     # id(conn) -> created_at
+		self._opening = 0     # slots reserved for connections being opened
+		self._stats = {
+			"checkouts": 0,
+			"waits": 0,
+			"waitSeconds": 0.0,
+			"exhausted": 0,
+			"opened": 0,
+			"recycled": 0,
+			"broken": 0,
+			"peakInUse": 0,
+		}
+		for _ in range(self.minconn):
+			self._idle.append(self._connect())
+
+	def _connect(self):
+		conn = psycopg2.connect(**self._connect_kwargs)
+		now = time.time()
+		with self._cond:
+			self._stats["opened"] += 1
+		return (conn, now, now)
+
+	def _size(self):
+		return len(self._idle) + len(self._in_use) + self._opening
+
+	def _is_usable(self, conn, last_used):
+		if conn.closed:
+			return False
+		if time.time() - last_used < self.check_idle:
+			return True
+		try:
+			cursor = conn.cursor()
+			cursor.execute("select 1")
+			cursor.close()
+			conn.rollback()
+			return True
+		except psycopg2.Error:
+			return False
+
+	def getconn(self):
+		'''Checks out a healthy connection, opening or waiting for one if required.'''
+		deadline = time.time() + self.timeout
+		waited = False
+		while True:
+			with self._cond:
+				entry = None
+				if self._idle:
+					entry = self._idle.pop()
+				elif self._size() < self.maxconn:
+					self._opening += 1
+				else:
+					remaining = deadline - time.time()
+					if remaining <= 0:
+						self._stats["exhausted"] += 1
+						raise PoolExhaustedError("connection pool exhausted (%s connections in use)" % len(self._in_use))
+					if not waited:
+						self._stats["waits"] += 1
+						waited = True
+					start = time.time()
+					self._cond.wait(remaining)
+					self._stats["waitSeconds"] += time.time() - start
+					continue
+			if entry is None:
+				try:
+					entry = self._connect()
+				finally:
+					with self._cond:
+						self._opening -= 1
+			conn, created_at, last_used = entry
+			if time.time() - created_at > self.max_lifetime:
+				self._discard(conn, "recycled")
+				continue
+			if not self._is_usable(conn, last_used):
+				self._discard(conn, "broken")
+				continue
+			with self._cond:
+				self._in_use[id(conn)] = created_at
+				self._stats["checkouts"] += 1
+				self._stats["peakInUse"] = max(self._stats["peakInUse"], len(self._in_use))
+			return conn
+
+	def putconn(self, conn):
+		'''Returns a connection to the pool, rolling back any transaction left open.'''
+		with self._cond:
+			created_at = self._in_use.pop(id(conn), None)
+		if created_at is None:
+			return
+		if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+			try:
+				conn.rollback()
+			except psycopg2.Error:
+				pass
+		if conn.closed or conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+			self._discard(conn, "broken")
+			return
+		if time.time() - created_at > self.max_lifetime:
+			self._discard(conn, "recycled")
+			return
+		with self._cond:
+			self._idle.append((conn, created_at, time.time()))
+			self._cond.notify()
+
+	def _discard(self, conn, reason):
+		try:
+			conn.close()
+		except psycopg2.Error:
+			pass
+		with self._cond:
+			self._stats[reason] += 1
+			self._cond.notify()
+
+	def closeall(self):
+		with self._cond:
+			idle, self._idle = self._idle, []
+		for conn, _, _ in idle:
+			conn.close()
+
+	def stats(self):
+		'''Returns the pool counters, used to size the workers against max_connections.'''
+		with self._cond:
+			stats = dict(self._stats)
+			stats.update({
+				"minSize": self.minconn,
+				"maxSize": self.maxconn,
+				"inUse": len(self._in_use),
+				"idle": len(self._idle),
+			})
+		stats["waitSeconds"] = round(stats["waitSeconds"], 3)
+		return stats
@@ -0,0 +1,82 @@
+'''
+Renders the translation draft of a USFM text, translating the text between the USFM
+markers with a TranslationLexicon and keeping the markers and punctuations as they are.
+
+The punctuations in a text segment are replaced by placeholder words before it is
+translated, so that phrases are never looked up across a punctuation, and are put back
+after translation. The placeholder tells how the punctuation was spaced:
+	uuuQQQuuu	space on both sides
+	QQQuuu		space after it
+	uuuQQQ		space before it
+	QQQ			attached on both sides
+'''
+import re
+
+usfmMarker = re.compile(r'\\\w+\d?\*?\s?')
+punctuations = r'[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]'
+
+# the kinds of punctuation, in the order they are replaced:
+# (pattern, placeholder, placeholder pattern, what replaces the placeholder pattern)
+# Two placeholders can share the space between them. When a punctuation put back ends with a
+# space, that space is left in place (by the look ahead) for the next placeholder to match
+punctuationKinds = [
+	(re.compile(r'\s' + punctuations + r'\s'), ' uuuQQQuuu ', re.compile(r' uuuQQQuuu(?= )'), lambda comp: " " + comp),
+	(re.compile(punctuations + r'\s'), ' QQQuuu ', re.compile(r' QQQuuu(?= )'), lambda comp: comp),
+	(re.compile(r'\s' + punctuations), ' uuuQQQ ', re.compile(r' uuuQQQ '), lambda comp: " " + comp),
+	(re.compile(punctuations), ' QQQ ', re.compile(r' QQQ '), lambda comp: comp),
+]
+multiSpace = re.compile(r'\s+')
+blankPattern = re.compile(r'\s+$')
+
+
+def mask_punctuations(wordSeq, comps):
+	'''Replaces the punctuations in a text segment with placeholders, kind by kind,
+	and adds the punctuations replaced to the list of their kind in comps.'''
+	for (pattern, placeholder, _, _), kindComps in zip(punctuationKinds, comps):
+		def mask(match):
+			kindComps.append(match.group(0))
+			return placeholder
+		wordSeq = pattern.sub(mask, wordSeq)
+	return wordSeq
+
+
+def restore_punctuations(line, comps):
+	'''Puts the punctuations back in place of the placeholders, with one pass over the line per kind.
+	The n-th placeholder of a kind gets the n-th punctuation of that kind.'''
+	for (_, _, placeholderPattern, putBack), kindComps in zip(punctuationKinds, comps):
+		if not kindComps:
+			continue
+		kindComps = iter(kindComps)
+		def restore(match):
+			comp = next(kindComps, None)
+			if comp is None:
+				return match.group(0)
+			return putBack(comp)
+		line = placeholderPattern.sub(restore, line)
+	return line
+
+
+def render_line(line, lexicon):
+	markers = usfmMarker.findall(line)
+	if not markers:
+		# the text of a line without any marker is not part of the draft
+		return ''
+	comps = [[] for _ in punctuationKinds]
+	translatedSeq = []
+	for wordSeq in usfmMarker.split(line):
+		cleanWordSeq = mask_punctuations(wordSeq, comps)
+		if not blankPattern.match(cleanWordSeq) and cleanWordSeq != '':
+			translatedSeq.append(lexicon.translate_text(cleanWordSeq))
+	usfmWordsList = []
+	for i, marker in enumerate(markers):
+		usfmWordsList.append(marker)
+		if i < len(translatedSeq):
+			usfmWordsList.append(translatedSeq[i])
+	usfmWordsList += translatedSeq[len(markers):]
+	outputLine = restore_punctuations(" ".join(usfmWordsList), comps)
+	return multiSpace.sub(' ', outputLine)
+
+
+def render_draft(usfmText, lexicon):
+	'''Returns the translation draft of a USFM text, line by line.'''
+	return "\n".join(render_line(line, lexicon) for line in usfmText.split('\n'))
@@ -0,0 +1,74 @@
+'''
+Streaming exports of whole sources. The books are read one at a time from a server side
+cursor and written out as they come, either as the members of a JSON object or as the files
+of a tar or zip archive, so that at most one book is in memory and the response starts at once.
+'''
+import io
+import json
+import time
+import tarfile
+import zipfile
+
+ARCHIVE_FORMATS = ('tar', 'zip')
+ARCHIVE_MIMETYPES = {'tar': 'application/x-tar', 'zip': 'application/zip'}
+
+
+def iter_rows(connection, query, params=None, name='source_export'):
+	'''Yields the rows of the query one by one, from a server side cursor.'''
+	cursor = connection.cursor(name=name)
+	cursor.itersize = 1
+	try:
+		cursor.execute(query, params)
+		for row in cursor:
+			yield row
+	finally:
+		cursor.close()
+		connection.rollback()
+
+
+def json_object(items):
+	'''Yields the JSON text of an object with the (key, value) items, one member at a time.'''
+	separator = '{'
+	for key, value in items:
+		yield separator + json.dumps(str(key)) + ': ' + json.dumps(value)
+		separator = ', '
+	yield '}' if separator == ', ' else '{}'
+
+
+class _Chunks(object):
+	'''A write only file, whose content written so far is taken out with drain().'''
+
+	def __init__(self):
+		self._chunks = []
+
+	def write(self, data):
+		self._chunks.append(bytes(data))
+		return len(data)
+
+	def flush(self):
+		pass
+
+	def drain(self):
+		data = b''.join(self._chunks)
+		self._chunks = []
+		return data
+
+
+def archive(files, archiveFormat):
+	'''Yields the bytes of a tar or zip archive of the (file name, text) files.'''
+	chunks = _Chunks()
+	if archiveFormat == 'zip':
+		with zipfile.ZipFile(chunks, 'w', zipfile.ZIP_DEFLATED) as zipFile:
+			for name, text in files:
+				zipFile.writestr(name, text.encode('utf-8'))
+				yield chunks.drain()
+	else:
+		with tarfile.open(fileobj=chunks, mode='w|') as tarFile:
+			for name, text in files:
+				data = text.encode('utf-8')
+				info = tarfile.TarInfo(name)
+				info.size = len(data)
+				info.mtime = time.time()
+				tarFile.addfile(info, io.BytesIO(data))
+				yield chunks.drain()
+	yield chunks.drain()
@@ -0,0 +1,165 @@
+'''
+Background jobs of the API, kept in the `tokenization_jobs` table and run by a
+worker process, so that the API workers never tokenize a book while a request waits.
+The worker also sends the emails of the `email_outbox` table (see mailer.py).
+Run the worker from the `agmt` folder (the folder of main.py):
+	python jobs.py [tokenize|mail]
+Without an argument the worker does both; as a tokenization can take minutes, a
+separate `mail` worker keeps the emails from waiting behind it.
+More than one worker can be run; each job (or email) is taken by only one of them.
+A job that fails is run again, up to `AGMT_JOB_MAX_ATTEMPTS` times in all, and then stays
+failed until it is retried through the API (POST /v1/tokenization/<sourceId>).
+'''
+import os
+import sys
+import time
+import logging
+import traceback
+import psycopg2
+import phrases
+import mailer
+
+log = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# a job that has been running for longer than this (seconds) is taken as abandoned
+# by a worker that died, and is run again
+job_timeout = int(os.environ.get("AGMT_JOB_TIMEOUT", "3600"))
+poll_interval = float(os.environ.get("AGMT_JOB_POLL_INTERVAL", "2"))
+max_attempts = int(os.environ.get("AGMT_JOB_MAX_ATTEMPTS", "3"))
+
+
+def split_table_name(table_name):
+	'''Returns the language code and version (version_revision) of a <lang>_<version>_<revision>_bible table.'''
+	languageCode = table_name.split('_')[0]
+	version = table_name[len(languageCode) + 1:-len('_bible')]
+	return languageCode.lower(), version.lower()
+
+
+def enqueue_tokenization(cursor, sourceId, bookId):
+	'''Adds a job to tokenize a book, unless there already is one pending or running for it.
+	The job is added in the transaction of the cursor, the caller commits it.'''
+	cursor.execute("insert into tokenization_jobs (source_id, book_id) values (%s, %s) \
+		on conflict (source_id, book_id) where status in ('pending', 'running') do nothing",
+		(int(sourceId), int(bookId)))
+
+
+def get_tokenization_jobs(cursor, sourceId, bookIds):
+	'''Returns the latest job of each of the books, as {book_id: (status, message, created_at, finished_at)}'''
+	cursor.execute("select distinct on (book_id) book_id, status, message, created_at, finished_at \
+		from tokenization_jobs where source_id=%s and book_id = any(%s) order by book_id, job_id desc",
+		(int(sourceId), list(bookIds)))
+	return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def retry_failed(cursor, sourceId, bookIds):
+	'''Adds a job for each of the books whose latest job failed. Returns the ids of these books.'''
+	bookJobs = get_tokenization_jobs(cursor, sourceId, bookIds)
+	failedBooks = [bookId for bookId in bookIds if bookId in bookJobs and bookJobs[bookId][0] == FAILED]
+	for bookId in failedBooks:
+		enqueue_tokenization(cursor, sourceId, bookId)
+	return failedBooks
+
+
+def claim_job(connection):
+	'''Marks the oldest pending (or abandoned) job as running and returns it, or None if there is none.'''
+	cursor = connection.cursor()
+	# an abandoned job that has been run as many times as allowed has failed
+	cursor.execute("update tokenization_jobs set status='failed', message='Abandoned after %s attempts', \
+		finished_at=now() where status='running' and started_at < now() - %s * interval '1 second' \
+			and attempts >= %s", (max_attempts, job_timeout, max_attempts))
+	cursor.execute("update tokenization_jobs set status='running', started_at=now(), attempts=attempts+1 \
+		where job_id = (select job_id from tokenization_jobs where status='pending' or \
+			(status='running' and started_at < now() - %s * interval '1 second') \
+				order by job_id limit 1 for update skip locked) \
+		returning job_id, source_id, book_id, attempts", (job_timeout,))
+	job = cursor.fetchone()
+	connection.commit()
+	cursor.close()
+	return job
+
+
+def finish_job(connection, jobId, status, message=None):
+	cursor = connection.cursor()
+	cursor.execute("update tokenization_jobs set status=%s, message=%s, finished_at=now() where job_id=%s",
+		(status, message, jobId))
+	connection.commit()
+	cursor.close()
+
+
+def run_tokenization(connection, sourceId, bookId):
+	cursor = connection.cursor()
+	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
+	rst = cursor.fetchone()
+	cursor.close()
+	if not rst:
+		raise ValueError("Source %s does not exist" % sourceId)
+	languageCode, version = split_table_name(rst[0])
+	phrases.tokenize(connection, languageCode, version, bookId)
+
+
+def run_next_job(connection):
+	'''Runs one job. Returns False if there was no job to run.'''
+	job = claim_job(connection)
+	if not job:
+		return False
+	jobId, sourceId, bookId, attempts = job
+	log.info("Tokenizing book %s of source %s (job %s)", bookId, sourceId, jobId)
+	try:
+		run_tokenization(connection, sourceId, bookId)
+	except Exception as ex:
+		log.error("Tokenization job %s failed: %s", jobId, ex)
+		traceback.print_exc()
+		connection.rollback()
+		# run again by the next worker free, unless it has failed too many times
+		finish_job(connection, jobId, PENDING if attempts < max_attempts else FAILED, str(ex))
+		return True
+	finish_job(connection, jobId, DONE)
+	log.info("Tokenization job %s done", jobId)
+	return True
+
+
+def connect():
+	return psycopg2.connect(dbname=os.environ.get("AGMT_POSTGRES_DATABASE", "postgres"),
+		user=os.environ.get("AGMT_POSTGRES_USER", "postgres"),
+		password=os.environ.get("AGMT_POSTGRES_PASSWORD", "secret"),
+		host=os.environ.get("AGMT_POSTGRES_HOST", "localhost"),
+		port=os.environ.get("AGMT_POSTGRES_PORT", "5432"))
+
+
+def run_worker(tokenize=True, mail=True):
+	connection = None
+	transport = mailer.get_transport() if mail else None
+	while True:
+		try:
+			if connection is None or connection.closed:
+				connection = connect()
+			busy = False
+			if tokenize and run_next_job(connection):
+				busy = True
+			if mail and mailer.send_pending(connection, transport):
+				busy = True
+			if not busy:
+				time.sleep(poll_interval)
+		except psycopg2.OperationalError as ex:
+			log.error("Database error in the job worker: %s", ex)
+			connection = None
+			time.sleep(poll_interval)
+		except Exception as ex:
+			# keeps the worker running, the job or email is taken again later
+			log.error("Error in the job worker: %s", ex)
+			traceback.print_exc()
+			if connection is not None and not connection.closed:
+				connection.rollback()
+			time.sleep(poll_interval)
+
+
+if __name__ == '__main__':
+	logging.basicConfig(stream=sys.stdout, format='%(asctime)s|%(levelname)-8s: %(message)s')
+	log.setLevel(os.environ.get("AGMT_LOGGING_LEVEL", "INFO"))
+	kinds = sys.argv[1:] or ['tokenize', 'mail']
+	run_worker(tokenize='tokenize' in kinds, mail='mail' in kinds)
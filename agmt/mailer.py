@@ -0,0 +1,177 @@
+'''
+Emails of the API, sent through the `email_outbox` table: the endpoints add the emails to the
+outbox in the transaction of the change they notify about, and the job worker (jobs.py) sends
+them with the transport set by AGMT_MAIL_TRANSPORT, retrying the failed ones with a backoff.
+	sendinblue	the Sendinblue API, with AGMT_SENDINBLUE_KEY (default)
+	smtp		an SMTP server, AGMT_SMTP_HOST, AGMT_SMTP_PORT, AGMT_SMTP_USER, AGMT_SMTP_PASSWORD
+	file		appends the emails as json lines to AGMT_MAIL_FILE, for tests and development
+'''
+import os
+import json
+import logging
+import smtplib
+from collections import namedtuple
+from email.mime.text import MIMEText
+from email.utils import formataddr
+import requests
+
+log = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+from_email = os.environ.get("AGMT_MAIL_FROM", "noreply@autographamt.in")
+batch_size = int(os.environ.get("AGMT_MAIL_BATCH_SIZE", "50"))
+max_attempts = int(os.environ.get("AGMT_MAIL_MAX_ATTEMPTS", "8"))
+# seconds before the first retry, doubled on each attempt up to max_retry_delay
+retry_delay = int(os.environ.get("AGMT_MAIL_RETRY_DELAY", "30"))
+max_retry_delay = int(os.environ.get("AGMT_MAIL_MAX_RETRY_DELAY", "3600"))
+# an email being sent for longer than this (seconds) is taken as abandoned by a worker that died
+send_timeout = int(os.environ.get("AGMT_MAIL_SEND_TIMEOUT", "600"))
+
+Email = namedtuple('Email', ['email_id', 'to_email', 'from_email', 'from_name', 'subject', 'html', 'attempts'])
+
+
+def queue_email(cursor, toEmail, subject, html, fromName="Autographa MT"):
+	'''Adds an email to the outbox. It is added in the transaction of the cursor,
+	so it is only sent if the caller commits.'''
+	cursor.execute("insert into email_outbox (to_email, from_email, from_name, subject, html) \
+		values (%s, %s, %s, %s, %s)", (toEmail, from_email, fromName, subject, html))
+
+
+class SendinblueTransport(object):
+	url = "https://api.sendinblue.com/v2.0/email"
+
+	def __init__(self, key):
+		self.key = key
+		self.session = requests.Session()
+
+	def send_batch(self, emails):
+		'''Sends the emails, returns the error of each (None if it was sent).'''
+		errors = []
+		for email in emails:
+			payload = {
+				"to": {email.to_email: ""},
+				"from": [email.from_email, email.from_name],
+				"subject": email.subject,
+				"html": email.html,
+				}
+			try:
+				resp = self.session.post(self.url, data=json.dumps(payload), headers={"api-key": self.key}, timeout=30)
+				resp.raise_for_status()
+				errors.append(None)
+			except requests.RequestException as ex:
+				errors.append(str(ex))
+		return errors
+
+
+class SmtpTransport(object):
+
+	def __init__(self, host, port=587, user=None, password=None, starttls=True):
+		self.host = host
+		self.port = port
+		self.user = user
+		self.password = password
+		self.starttls = starttls
+
+	def send_batch(self, emails):
+		'''Sends the emails over one connection, returns the error of each (None if it was sent).'''
+		try:
+			server = smtplib.SMTP(self.host, self.port, timeout=30)
+			if self.starttls:
+				server.starttls()
+			if self.user:
+				server.login(self.user, self.password)
+		except (smtplib.SMTPException, OSError) as ex:
+			return [str(ex)] * len(emails)
+		errors = []
+		try:
+			for email in emails:
+				message = MIMEText(email.html, 'html', 'utf-8')
+				message['Subject'] = email.subject
+				message['From'] = formataddr((email.from_name, email.from_email))
+				message['To'] = email.to_email
+				try:
+					server.sendmail(email.from_email, [email.to_email], message.as_string())
+					errors.append(None)
+				except (smtplib.SMTPException, OSError) as ex:
+					errors.append(str(ex))
+		finally:
+			try:
+				server.quit()
+			except (smtplib.SMTPException, OSError):
+				pass
+		return errors + ["connection closed"] * (len(emails) - len(errors))
+
+
+class FileTransport(object):
+
+	def __init__(self, path):
+		self.path = path
+
+	def send_batch(self, emails):
+		with open(self.path, 'a', encoding='utf-8') as emailFile:
+			for email in emails:
+				emailFile.write(json.dumps(email._asdict()) + '\n')
+		return [None] * len(emails)
+
+
+def get_transport():
+	'''The transport set by AGMT_MAIL_TRANSPORT'''
+	name = os.environ.get("AGMT_MAIL_TRANSPORT", "sendinblue")
+	if name == "sendinblue":
+		return SendinblueTransport(os.environ.get("AGMT_SENDINBLUE_KEY"))
+	if name == "smtp":
+		return SmtpTransport(os.environ.get("AGMT_SMTP_HOST", "localhost"),
+			int(os.environ.get("AGMT_SMTP_PORT", "587")),
+			os.environ.get("AGMT_SMTP_USER"), os.environ.get("AGMT_SMTP_PASSWORD"),
+			os.environ.get("AGMT_SMTP_STARTTLS", "true").lower() == "true")
+	if name == "file":
+		return FileTransport(os.environ.get("AGMT_MAIL_FILE", "../logs/emails.jsonl"))
+	raise ValueError("Unknown mail transport %s" % name)
+
+
+def claim_emails(connection, limit):
+	'''Marks up to `limit` emails due to be sent (or abandoned while sending) as being sent and returns them.'''
+	cursor = connection.cursor()
+	cursor.execute("update email_outbox set status='sending', attempts=attempts+1, claimed_at=now() \
+		where email_id in (select email_id from email_outbox where (status='pending' and next_attempt_at <= now()) or \
+			(status='sending' and claimed_at < now() - %s * interval '1 second') \
+				order by email_id limit %s for update skip locked) \
+		returning email_id, to_email, from_email, from_name, subject, html, attempts", (send_timeout, limit))
+	emails = [Email(*row) for row in cursor.fetchall()]
+	connection.commit()
+	cursor.close()
+	return emails
+
+
+def backoff(attempts):
+	'''Seconds to wait before sending again an email that failed `attempts` times'''
+	return min(retry_delay * 2 ** (attempts - 1), max_retry_delay)
+
+
+def send_pending(connection, transport, limit=None):
+	'''Sends one batch of emails. Returns the number of emails taken from the outbox.'''
+	emails = claim_emails(connection, limit or batch_size)
+	if not emails:
+		return 0
+	errors = transport.send_batch(emails)
+	cursor = connection.cursor()
+	for email, error in zip(emails, errors):
+		if error is None:
+			cursor.execute("update email_outbox set status='sent', sent_at=now(), last_error=null \
+				where email_id=%s", (email.email_id,))
+		elif email.attempts >= max_attempts:
+			log.error("Giving up sending email %s to %s: %s", email.email_id, email.to_email, error)
+			cursor.execute("update email_outbox set status='failed', last_error=%s where email_id=%s",
+				(error, email.email_id))
+		else:
+			log.warning("Sending email %s failed (attempt %s): %s", email.email_id, email.attempts, error)
+			cursor.execute("update email_outbox set status='pending', last_error=%s, \
+				next_attempt_at=now() + %s * interval '1 second' where email_id=%s",
+				(error, backoff(email.attempts), email.email_id))
+	connection.commit()
+	cursor.close()
+	return len(emails)
@@ -13,24 +13,40 @@
 import os
 import uuid
 from functools import wraps
+import time
 import datetime
 from datetime import timedelta
 import re
 import json
 import logging
+import threading
 import traceback
 import flask
 from flask import Flask, request, session, redirect, jsonify, make_response
 from flask import g
 from flask_cors import CORS, cross_origin
+from werkzeug.middleware.proxy_fix import ProxyFix
 import jwt
-import requests
-import scrypt
 import psycopg2
 from psycopg2 import sql
 from psycopg2.extras import execute_values
 from random import randint
 import phrases
+import dbpool
+import catalog
+import search
+import jobs
+import draft
+import principals
+import passwords
+import mailer
+import translations
+import projectstats
+import contentcache
+import references
+import versification
+import exports
+import artifacts
 from functools import reduce
 import traceback
 from logging.handlers import RotatingFileHandler
@@ -44,8 +60,12 @@ log.addHandler(handler)
 
 app = Flask(__name__)
 CORS(app)
+# the number of proxies (like nginx) in front of the API, which add the client address to X-Forwarded-For.
+# Only the addresses they add are trusted, the ones before them being set by the client
+proxy_hops = int(os.environ.get("AGMT_PROXY_HOPS", "1"))
+if proxy_hops:
+	app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops)
 
-sendinblue_key = os.environ.get("AGMT_SENDINBLUE_KEY")
 jwt_hs256_secret = os.environ.get("AGMT_HS256_SECRET", "x709myFlW5")
 postgres_host = os.environ.get("AGMT_POSTGRES_HOST", "localhost")
 postgres_port = os.environ.get("AGMT_POSTGRES_PORT", "5432")
@@ -56,74 +76,249 @@ postgres_database = os.environ.get("AGMT_POSTGRES_DATABASE", "postgres") # vacha
 host_api_url = os.environ.get("AGMT_HOST_API_URL", "localhost:8000")
 host_ui_url = os.environ.get("AGMT_HOST_UI_URL","autographamt.com")
 system_email = os.environ.get("MTV2_EMAIL_ID", "autographamt@gmail.com")
+docs_url = os.environ.get("AGMT_DOCS_URL", "http://docs.vachanengine.org/")
+
+db_pool_min = int(os.environ.get("AGMT_DB_POOL_MIN", "1"))
+db_pool_max = int(os.environ.get("AGMT_DB_POOL_MAX", "10"))
+db_pool_max_lifetime = int(os.environ.get("AGMT_DB_POOL_MAX_LIFETIME", "3600"))
+db_pool_check_idle = int(os.environ.get("AGMT_DB_POOL_CHECK_IDLE", "30"))
+db_pool_timeout = int(os.environ.get("AGMT_DB_POOL_TIMEOUT", "5"))
+
+catalog_ttl = int(os.environ.get("AGMT_CATALOG_TTL", "60"))
+sourceCatalog = catalog.SourceCatalog(ttl=catalog_ttl)
+lexicon_cache_size = int(os.environ.get("AGMT_LEXICON_CACHE_SIZE", "16"))
+translationLexicons = phrases.TranslationLexiconCache(maxsize=lexicon_cache_size)
+principal_cache_ttl = int(os.environ.get("AGMT_PRINCIPAL_CACHE_TTL", "30"))
+principalCache = principals.PrincipalCache(ttl=principal_cache_ttl)
+
+hash_workers = int(os.environ.get("AGMT_HASH_WORKERS", "2"))
+hash_max_pending = int(os.environ.get("AGMT_HASH_MAX_PENDING", "8"))
+hash_timeout = int(os.environ.get("AGMT_HASH_TIMEOUT", "10"))
+passwordHasher = passwords.PasswordHasher(workers=hash_workers, max_pending=hash_max_pending, timeout=hash_timeout)
+login_max_email_failures = int(os.environ.get("AGMT_LOGIN_MAX_EMAIL_FAILURES", "5"))
+login_max_address_failures = int(os.environ.get("AGMT_LOGIN_MAX_ADDRESS_FAILURES", "20"))
+login_failure_window = int(os.environ.get("AGMT_LOGIN_FAILURE_WINDOW", "300"))
+loginThrottle = passwords.LoginThrottle(max_email_failures=login_max_email_failures,
+	max_address_failures=login_max_address_failures, window=login_failure_window)
+authLatency = passwords.LatencyRecorder()
+content_cache_size = int(os.environ.get("AGMT_CONTENT_CACHE_SIZE", "256"))
+content_cache_mb = int(os.environ.get("AGMT_CONTENT_CACHE_MB", "128"))
+content_max_age = int(os.environ.get("AGMT_CONTENT_MAX_AGE", "60"))
+contentCache = contentcache.ResponseCache(maxsize=content_cache_size, max_bytes=content_cache_mb * 1024 * 1024)
+artifactStore = artifacts.ArtifactStore(os.environ.get("AGMT_ARTIFACT_DIR"))
+bcv_map_path = os.environ.get("AGMT_BCV_MAP", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DB", "bcv_map.csv"))
+versificationLoader = versification.VersificationLoader(bcv_map_path)
+
+_db_pool = None
+_db_pool_pid = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+	"""Returns the connection pool of this worker process, creating it on first use.
+	The pool is re-created after a fork, so that gunicorn workers never share sockets.
+	"""
+	global _db_pool, _db_pool_pid
+	if _db_pool is None or _db_pool_pid != os.getpid():
+		with _db_pool_lock:
+			if _db_pool is None or _db_pool_pid != os.getpid():
+				_db_pool = dbpool.ConnectionPool(db_pool_min, db_pool_max,
+					max_lifetime=db_pool_max_lifetime, check_idle=db_pool_check_idle,
+					timeout=db_pool_timeout, dbname=postgres_database, user=postgres_user,
+					password=postgres_password, host=postgres_host, port=postgres_port)
+				_db_pool_pid = os.getpid()
+	return _db_pool
 
 def get_db():                                                                      #--------------To open database connection-------------------#
-	"""Opens a new database connection if there is none yet for the
+	"""Checks out a pooled database connection if there is none yet for the
 	current application context.
 	"""
 	if not hasattr(g, 'db'):
-		g.db = psycopg2.connect(dbname=postgres_database, user=postgres_user,
-			password=postgres_password,	host=postgres_host, port=postgres_port)
+		g.db = get_db_pool().getconn()
 	return g.db
 
 @app.teardown_appcontext                                              #-----------------Close database connection----------------#
 def close_db(error):
-	"""Closes the database again at the end of the request."""
+	"""Returns the database connection to the pool at the end of the request."""
 	if hasattr(g, 'db'):
-		g.db.close()
+		get_db_pool().putconn(g.db)
+		del g.db
 
-def getLid(bcv):
-	connection = get_db()
-	cursor = connection.cursor()
-	bcv = str(bcv)
-	length = len(bcv)
-	book = int(bcv[-length:-6])
-	chapter = int(bcv[-6:-3])
-	verse = int(bcv[-3:])
-	cursor.execute("SELECT ID FROM bcv_lid_map WHERE Book = %s AND Chapter \
-	= %s AND Verse = %s", (book, chapter, verse))
-	lid_rst = cursor.fetchone()
-	if lid_rst:
-		lid = int(lid_rst[0])
-	else:
-		return 'Invalid BCV'
-	cursor.close()
-	return lid
+@app.errorhandler(dbpool.PoolExhaustedError)
+def db_pool_exhausted_handler(error):
+	log.error("Database connection pool exhausted: %s", error)
+	return '{"success":false, "message":"Server busy. Try again later."}', 503
+
+def getVersification():
+	'''Returns the versification of the Bible, loaded once per worker.'''
+	return versificationLoader.get(get_db)
 
 def getBibleBookIds():
 	'''
-	Returns a tuple of two dictionarys of the books of the Bible, bookcode has bible book codes
-	as the key and bookname has bible book names as the key.
+	Returns a dictionary of the books of the Bible, with book ids as the key and
+	book codes as the value.
 	'''
-	bookIdDict = {}
-	connection  = get_db()
-	cursor = connection.cursor()
-	cursor.execute("SELECT book_id, book_name, book_code FROM bible_books_look_up Order by book_id")
-	rst = cursor.fetchall()
-	for book_id, book_name, book_code in rst:
-		bookIdDict[int(book_id)] = book_code
-	cursor.close()
-	return bookIdDict
+	return {book.book_id: book.book_code for book in sourceCatalog.get_books(get_db())}
+
+def getSource(sourceId):
+	'''Returns the catalog entry of a source, or None if the source id is not valid.'''
+	return sourceCatalog.get_source(get_db(), sourceId)
 
-# pass the URL with http, if URL will have SSL then will return the same otherwise wihtout SSL URL will return
-def return_url(url):
-	r = requests.get(url)
-	required_url = r.url
-	return required_url
+def getBibleBook(book):
+	'''Returns the catalog entry of a bible book, from its book id or book code.'''
+	return sourceCatalog.get_book(get_db(), book)
+
+def getSourceBooks(source):
+	'''The navigation index of a bible, (book_id, chapter_count, version) of its books, read once per request.'''
+	if not hasattr(g, 'sourceBooks'):
+		g.sourceBooks = {}
+	if source.source_id not in g.sourceBooks:
+		g.sourceBooks[source.source_id] = contentcache.source_books(get_db(), source)
+	return g.sourceBooks[source.source_id]
+
+def bibleContentEtag(source, key, bookId=None):
+	'''
+	The ETag of the response with the key (path and url params) of a bible read endpoint, from
+	the version of the content it is made from: a book, or all the books of the bible if bookId
+	is None. None if there is no content.
+	'''
+	version = contentcache.content_version(getSourceBooks(source), bookId)
+	if version is None:
+		return None
+	return contentcache.make_etag(key, (version, source.status))
+
+def artifactName(endpoint, source, book, contentFormat, kwargs, sourceArg, bookArg):
+	'''
+	The name in the artifact store of the response of an endpoint, from the source, the book (or
+	None for all the books) and the format. None when the response is not to be stored: the url
+	has params, or names the source or book otherwise than by its id or book code, so that each
+	(source, book, format) has a single response in the store.
+	'''
+	if request.args or contentFormat not in ("usfm", "json") or kwargs[sourceArg] != str(source.source_id):
+		return None
+	if book is None:
+		return "%s.all.%s" % (endpoint, contentFormat)
+	if kwargs[bookArg] not in (book.book_code, str(book.book_id)):
+		return None
+	return "%s.%s.%s" % (endpoint, kwargs[bookArg], contentFormat)
+
+def cachedBibleContent(bookArg=None, sourceArg="sourceId", artifactFormatArg=None):
+	'''
+	Caches the responses of a bible read endpoint by the version of the content they are made
+	from: the book in the url param `bookArg` (when given), or all the books of the bible. The
+	responses have a strong ETag, and a request with the same content in If-None-Match is
+	answered 304. Error responses are not cached.
+	With artifactFormatArg, the url param of the format, the responses are also kept in the
+	artifact store, compressed, and sent in the content encoding the client accepts.
+	'''
+	def decorator(f):
+		@wraps(f)
+		def wrapper(**kwargs):
+			source = getSource(kwargs[sourceArg])
+			if not source or source.content_type != 'bible':
+				return f(**kwargs)
+			book = bookId = None
+			if bookArg and kwargs[bookArg] is not None:
+				book = kwargs[bookArg]
+				book = getBibleBook(int(book) if book.isdigit() else book)
+				if not book:
+					return f(**kwargs)
+				bookId = book.book_id
+			key = (request.path, tuple(sorted(request.args.items(multi=True))))
+			etag = bibleContentEtag(source, key, bookId)
+			if etag is None:
+				return f(**kwargs)
+			name = None
+			if artifactFormatArg and artifactStore.enabled:
+				name = artifactName(f.__name__, source, book, kwargs[artifactFormatArg], kwargs, sourceArg, bookArg)
+			useArtifacts = name is not None
+			encoding = artifactStore.negotiate(request.accept_encodings) if useArtifacts else None
+			# each content encoding is a different representation, with its own ETag
+			representationEtag = etag + "-" + encoding if encoding else etag
+			if request.if_none_match.contains(representationEtag):
+				response = make_response('', 304)
+			else:
+				body = contentCache.get(key, etag) if encoding is None else None
+				data = body
+				if data is None and useArtifacts:
+					data = artifactStore.read(source.source_id, name, etag, encoding)
+				if data is None:
+					body = contentCache.get(key, etag) if encoding else None
+					if body is None:
+						body = f(**kwargs)
+						if not isinstance(body, str) or body.startswith('{"success"'):
+							return body
+						contentCache.put(key, source.source_id, etag, body)
+					data = artifactStore.write(source.source_id, name, etag, body)[encoding] if useArtifacts else body
+				response = make_response(data)
+				if encoding:
+					response.headers["Content-Encoding"] = encoding
+			if useArtifacts:
+				response.vary.add("Accept-Encoding")
+			response.set_etag(representationEtag)
+			response.headers["Cache-Control"] = "public, max-age=%s" % content_max_age
+			return response
+		return wrapper
+	return decorator
+
+def storeBookArtifacts(source, bookCode, bookId):
+	'''Stores the usfm and json responses of a book just uploaded in the artifact store.'''
+	if not artifactStore.enabled:
+		return
+	for contentFormat in ("usfm", "json"):
+		key = ("/v1/bibles/%s/books/%s/%s" % (source.source_id, bookCode, contentFormat), ())
+		body = getBook.__wrapped__(sourceId=str(source.source_id), bookCode=bookCode, contentFormat=contentFormat)
+		if not body.startswith('{"success"'):
+			artifactStore.write(source.source_id, "getBook.%s.%s" % (bookCode, contentFormat),
+				bibleContentEtag(source, key, bookId), body)
 
 @app.route('/', methods=['GET'])
 def index():
  return jsonify({"message": "OK: I am live...url: http://autographamt.com/ "}), 200
 
+@app.route('/v1/metrics', methods=['GET'])
+def getMetrics():
+	'''Returns the runtime counters of the worker process that served the request.'''
+	return json.dumps({
+		"pid": os.getpid(),
+		"dbPool": get_db_pool().stats(),
+		"auth": {
+			"latency": authLatency.stats(),
+			"hasher": passwordHasher.stats(),
+			"throttle": loginThrottle.stats()
+		},
+		"contentCache": contentCache.stats(),
+		"artifacts": artifactStore.stats()
+	})
+
+@app.errorhandler(passwords.HasherBusyError)
+def hasher_busy_handler(error):
+	return '{"success":false, "message":"Server is busy. Try again in a while."}', 429, {"Retry-After": "1"}
+
+def clientAddress():
+	'''The address of the client, as forwarded by the trusted proxies in front of the API (see ProxyFix above).'''
+	return request.remote_addr
+
 @app.route("/v1/auth", methods=["POST"])                    #-------------------For login---------------------#
 def auth():
+	start = time.perf_counter()
+	try:
+		return login()
+	finally:
+		authLatency.record(time.perf_counter() - start)
+
+def login():
 	email = request.form["email"]
 	password = request.form["password"]
+	address = clientAddress()
+	if loginThrottle.is_blocked(email, address):
+		logging.warning('User: \'%s\' login attempt from %s throttled' % (email, address))
+		return '{"success":false, "message":"Too many failed login attempts. Try again later."}', 429
 	connection = get_db()
 	cursor = connection.cursor()
 	cursor.execute("SELECT email_id FROM autographamt_users WHERE  email_id = %s", (email,))
 	est = cursor.fetchone()
 	if not est:
+		loginThrottle.failed(email, address)
 		logging.warning('Unregistered user \'%s\' login attempt unsuccessful' % email)
 		return '{"success":false, "message":"This email is not registered"}'
 	cursor.execute("SELECT u.password_hash, u.password_salt, r.role_name, u.first_name, u.last_name,status FROM \
@@ -137,12 +332,13 @@ def auth():
 		return '{"success":false, "message":"User account is not active."}'
 	password_hash = rst[0].hex()
 	password_salt = bytes.fromhex(rst[1].hex())
-	password_hash_new = scrypt.hash(password, password_salt).hex()
+	password_hash_new = passwordHasher.hash(password, password_salt).hex()
 	role = rst[2]
 	firstName = rst[3]
 	lastName = rst[4]
 
 	if password_hash == password_hash_new:
+		loginThrottle.succeeded(email)
 		try:
 			access_token = jwt.encode({
 				'sub': email,
@@ -157,6 +353,7 @@ def auth():
 			pass
 		logging.warning('User: \'' + str(email) + '\' logged in successfully')
 		return '{"accessToken": "%s"}\n' % (access_token.decode('utf-8'),)
+	loginThrottle.failed(email, address)
 	logging.warning('User: \'' + str(email) + '\' login attempt unsuccessful: Incorrect Password')
 	return '{"success":false, "message":"Incorrect Password"}'
 
@@ -166,37 +363,28 @@ def new_registration():
 	lastName = request.form['lastName']
 	email = request.form['email']
 	password = request.form['password']
-	headers = {"api-key": sendinblue_key}
-	url = "https://api.sendinblue.com/v2.0/email"
 	verification_code = str(uuid.uuid4()).replace("-", "")
-	documentation_url = return_url('http://docs.vachanengine.org/')
 	body = '''Hello %s,<br/><br/>Thanks for your interest to use the AutographaMT web service. <br/>
 	You need to confirm your email by opening this link:
 
 	https://%s/v1/verifications/%s
 
 	<br/><br/>The documentation for accessing the API is available at %s''' % \
-			(firstName, host_api_url, verification_code, documentation_url)
-	payload = {
-		"to": {email: ""},
-		"from": ["noreply@autographamt.in", "Autographa MT"],
-		"subject": "AutographaMT - Please verify your email address",
-		"html": body,
-		}
+			(firstName, host_api_url, verification_code, docs_url)
 	connection = get_db()
-	password_salt = str(uuid.uuid4()).replace("-", "")
-	password_hash = scrypt.hash(password, password_salt)
 	cursor = connection.cursor()
 	cursor.execute("SELECT user_id,status FROM autographamt_users WHERE email_id = %s", (email,))
 	rst = cursor.fetchone()
 	if not rst:
+		password_salt = str(uuid.uuid4()).replace("-", "")
+		password_hash = passwordHasher.hash(password, password_salt)
 		cursor.execute("INSERT INTO autographamt_users (first_name, last_name, email_id, \
 			verification_code, password_hash, password_salt, created_at_date,status) \
 				VALUES (%s, %s, %s, %s, %s, %s, current_timestamp,true)", \
 					(firstName, lastName, email, verification_code, password_hash, password_salt))
+		mailer.queue_email(cursor, email, "AutographaMT - Please verify your email address", body)
 		cursor.close()
 		connection.commit()
-		resp = requests.post(url, data=json.dumps(payload), headers=headers)
 		return '{"success":true, "message":"Verification Email has been sent to your email id"}'
 	else:
 		if rst[1] == False:
@@ -217,28 +405,19 @@ def reset_password():
 		active = rst[1]
 		if not active:
 			return '{"success":false, "message":"User account is deactivated."}'
-		headers = {"api-key": sendinblue_key}
-		url = "https://api.sendinblue.com/v2.0/email"
 		# totp = pyotp.TOTP('base32secret3232')       # python otp module
 		# verification_code = totp.now()
 		verification_code = randint(100001,999999)
-		documentation_url = return_url('http://docs.vachanengine.org/')
 		body = '''Hi,<br/><br/>Your request for resetting the password has been recieved. <br/>
 		Your temporary password is %s. Use this to create a new password at %s .
 
 		<br/><br/>The documentation for accessing the API is available at %s''' % \
-				(verification_code, host_ui_url, documentation_url)
-		payload = {
-			"to": {email: ""},
-			"from": ["noreply@autographamt.in", "AutographaMT"],
-			"subject": "AutographaMT - Password reset verification mail",
-			"html": body,
-			}
+				(verification_code, host_ui_url, docs_url)
 		cursor.execute("UPDATE autographamt_users SET verification_code= %s WHERE email_id = %s", \
 			(verification_code, email))
+		mailer.queue_email(cursor, email, "AutographaMT - Password reset verification mail", body, "AutographaMT")
 		cursor.close()
 		connection.commit()
-		resp = requests.post(url, data=json.dumps(payload), headers=headers)
 		return '{"success":true, "message":"Link to reset password has been sent to the registered mail ID"}\n'
 
 @app.route("/v1/forgotpassword", methods=["POST"])    #--------------To set the new password-------------------#
@@ -255,7 +434,7 @@ def reset_password2():
 	else:
 		email = rst[0]
 		password_salt = str(uuid.uuid4()).replace("-", "")
-		password_hash = scrypt.hash(password, password_salt)
+		password_hash = passwordHasher.hash(password, password_salt)
 		cursor.execute("UPDATE autographamt_users SET verification_code = %s, password_hash = %s, \
 			password_salt = %s WHERE email_id = %s", (temp_password, password_hash, password_salt, email))
 		cursor.close()
@@ -298,7 +477,11 @@ def check_token(f):
 			algorithm = 'HS256'
 			leeway = timedelta(seconds=10)
 			try:
-				decoded = jwt.decode(token, jwt_hs256_secret, options=options, algorithms=[algorithm], leeway=leeway)
+				decoded = principalCache.get_claims(token)
+				if decoded is None:
+					decoded = jwt.decode(token, jwt_hs256_secret, options=options, algorithms=[algorithm], leeway=leeway)
+					principalCache.put_claims(token, decoded)
+				request.token = token
 				request.email = decoded['sub']
 				request.role = decoded['role']
 				request.app = decoded['app']
@@ -322,14 +505,17 @@ def new_registration2(code):
 	connection.commit()
 	return redirect("https://%s/" % (host_ui_url))
 
+def getPrincipal():
+	'''Returns the user (Principal) of the access token of the request, or None if not registered'''
+	principal = principalCache.get_principal(request.token)
+	if principal is None:
+		principal = principals.load_principal(get_db(), request.email)
+		if principal:
+			principalCache.put_principal(request.token, principal)
+	return principal
+
 def checkAuth():
-	email = request.email
-	connection = get_db()
-	cursor = connection.cursor()
-	cursor.execute("select role_id from autographamt_users where email_id=%s", (email,))
-	roleId = cursor.fetchone()[0]
-	cursor.close()
-	return roleId
+	return getPrincipal().role_id
 
 
 @app.route("/v1/autographamt/organisations", methods=["GET"])
@@ -339,9 +525,7 @@ def autographamtOrganisations():
 		role = checkAuth()
 		connection = get_db()
 		cursor = connection.cursor()
-		email = request.email
-		cursor.execute("select user_id from autographamt_users where email_id=%s", (email,))
-		userId = cursor.fetchone()[0]
+		userId = getPrincipal().user_id
 		if role == 3:
 			connection = get_db()
 			cursor = connection.cursor()
@@ -384,13 +568,11 @@ def createOrganisations():
 	organisationAddress = req["organisationAddress"].strip()
 	organisationPhone = req["organisationPhone"]
 	organisationEmail = req["organisationEmail"].strip()
-	email = request.email
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
 
-		cursor.execute("select user_id from autographamt_users where email_id=%s", (email,))
-		userId = cursor.fetchone()[0]
+		userId = getPrincipal().user_id
 		cursor.execute("select status from autographamt_organisations where organisation_name=%s and \
 			organisation_email=%s", (organisationName, organisationEmail))
 		rst = cursor.fetchone()
@@ -398,29 +580,17 @@ def createOrganisations():
 			cursor.execute("insert into autographamt_organisations (organisation_name, \
 				organisation_address, organisation_phone, organisation_email, user_id, status) values (%s,%s,%s,%s,%s,true) ", \
 					(organisationName, organisationAddress, organisationPhone, organisationEmail, userId))
+			# email notification
+			cursor.execute("SELECT email_id from autographamt_users where role_id=3")
+			all_super_admins = cursor.fetchall()
+			body = '''Hello Super Admin,<br/><br/>
+			A new organization request has come for, %s. Please check and approve.<br/><br/>
+			AutographaMT'''%(organisationName)
+			for row in all_super_admins:
+				mailer.queue_email(cursor, row[0], "AutographaMT - New Organisation Request", body)
 			connection.commit()
-			# send email notification
-			try:
-				cursor.execute("SELECT email_id from autographamt_users where role_id=3")
-				all_super_admins = cursor.fetchall()
-				cursor.close()
-				headers = {"api-key": sendinblue_key}
-				url = "https://api.sendinblue.com/v2.0/email"
-				body = '''Hello Super Admin,<br/><br/>
-				A new organization request has come for, %s. Please check and approve.<br/><br/>
-				AutographaMT'''%(organisationName)
-				for row in all_super_admins:
-					email = row[0]
-					payload = {
-						"to": {email: ""},
-						"from": ["noreply@autographamt.in", "Autographa MT"],
-						"subject": "AutographaMT - New Organisation Request",
-						"html": body,
-						}
-					resp = requests.post(url, data=json.dumps(payload), headers=headers)
-			except Exception as e:
-				print(e)
-				return '{"success":false, "message":"'+str(e)+'"}'
+			cursor.close()
+			principalCache.invalidate_user(user_id=userId)
 			return '{"success":true, "message":"Organisation request sent"}'
 		else:
 			status = rst[0]
@@ -476,11 +646,7 @@ def getProjects():
 		cursor = connection.cursor()
 		role = checkAuth()
 		if role == 2:
-			email = request.email
-			cursor.execute("select user_id from autographamt_users where email_id=%s", (email,))
-			userId = cursor.fetchone()[0]
-			cursor.execute("select organisation_id from autographamt_organisations where user_id=%s", (userId,))
-			organisationIds = [org[0] for org in cursor.fetchall()]
+			organisationIds = getPrincipal().organisations
 			rst = []
 			for orgId in organisationIds:
 				cursor.execute("select p.project_id, p.project_name, p.source_id, p.target_id,  \
@@ -626,16 +792,13 @@ def createAssignments():
 	books = "|".join(books)
 	cursor.execute("update autographamt_assignments set books=%s where user_id=%s and \
 		project_id=%s", (books, userId, projectId))
-	connection.commit()
-	# send email notification
+	# email notification
 	try:
 		cursor.execute("SELECT first_name, email_id from autographamt_users where user_id=%s",(userId,))
 		name, email = cursor.fetchone()
 		cursor.execute("SELECT project_name from autographamt_projects where project_id=%s",(projectId,))
 		project = cursor.fetchone()[0]
-		cursor.close()
-		headers = {"api-key": sendinblue_key}
-		url = "https://api.sendinblue.com/v2.0/email"
+		body = None
 		if action == "assign":
 			body = '''Hello %s,<br/><br/>
 			Your books assignment has changed to, %s, in project, %s.<br/><br/>
@@ -644,13 +807,10 @@ def createAssignments():
 			body = '''Hello %s,<br/><br/>
 			You have been added to the project, %s.<br/><br/>
 			AutographaMT'''%(name, project)
-		payload = {
-			"to": {email: ""},
-			"from": ["noreply@autographamt.in", "Autographa MT"],
-			"subject": "AutographaMT - New work assignment",
-			"html": body,
-			}
-		resp = requests.post(url, data=json.dumps(payload), headers=headers)
+		if body:
+			mailer.queue_email(cursor, email, "AutographaMT - New work assignment", body)
+		connection.commit()
+		cursor.close()
 	except Exception as e:
 		print(e)
 		return '{"success":false, "message":'+str(e)+'}'
@@ -726,12 +886,10 @@ def updateProjectTokenTranslations():
 		if "" in senses_list:
 			senses_list.remove("")
 		senses = "|".join(senses_list)
-		email = request.email
 		# userId=6
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select user_id from autographamt_users where email_id=%s", (email,))
-		userId = cursor.fetchone()[0]
+		userId = getPrincipal().user_id
 		cursor.execute("select assignment_id from autographamt_assignments where user_id=%s and \
 			project_id=%s", (userId, projectId))
 		assignmentExists = cursor.fetchone()
@@ -761,7 +919,10 @@ def updateProjectTokenTranslations():
 			cursor.execute("insert into translations_history (token, translation, source_id, target_id, \
 				user_id, senses) values (%s, %s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
 					userId, senses))
+			projectstats.add_translated_tokens(cursor, projectId, \
+				sourceCatalog.get_source(connection, sourceId).table_name + "_tokens", [token])
 			connection.commit()
+			translationLexicons.invalidate(projectId)
 			cursor.close()
 			return '{"success":true, "message":"Translation has been inserted"}'
 		else:
@@ -780,6 +941,7 @@ def updateProjectTokenTranslations():
 				user_id, senses) values (%s, %s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
 					userId, senses))
 			connection.commit()
+			translationLexicons.invalidate(projectId)
 			cursor.close()
 			return '{"success":true, "message":"Translation has been updated"}'
 	except Exception as ex:
@@ -801,11 +963,9 @@ def bulkUpdateProjectTokenTranslations():
 		req = request.get_json(True)
 		projectId = req["projectId"]
 		tokenTranslations = req["tokenTranslations"]
-		email = request.email
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select user_id from autographamt_users where email_id=%s", (email,))
-		userId = cursor.fetchone()[0]
+		userId = getPrincipal().user_id
 		cursor.execute("select assignment_id from autographamt_assignments where user_id=%s and \
 			project_id=%s", (userId, projectId))
 		assignmentExists = cursor.fetchone()
@@ -823,95 +983,11 @@ def bulkUpdateProjectTokenTranslations():
 			return '{"success":false, "message":"Source does not exist"}'
 		if not (tokenTranslations):
 			return '{"success":false, "message":"There is no data in excel"}'
-		warning = ''
-		empty_translation = 0
-		empty_senses = 0
-		empty_tokenName = 0
-		for item in tokenTranslations:
-			if (("token" not in item) and ("translation" not in item) and ("senses" not in item)):  #if all fields are empty
-				pass
-			elif("token" not in item):  # if token is empty
-				empty_tokenName += 1
-			elif(("translation" not in item) and ("senses" in item) and ("token" in item)): # if translation is empty
-				empty_translation += 1
-			elif(("token" in item) and ("translation" not in item) and ("senses" not in item)): # if only token is available
-				empty_senses += 1
-				empty_translation += 1
-			elif (("token" in item) and ("translation" in item) and ("senses" in item)):   #if all fields are filled
-				token = item['token']
-				translation = item['translation']
-				senses = item['senses']
-				logging.warning('senses \'%s\'' % senses)
-				splitSense = senses.split(',')
-				logging.warning('splitSense \'%s\'' % splitSense)
-				if "" in splitSense:
-					splitSense.remove("")
-				cursor.execute("select t.token, t.translation, t.senses from translations t left join \
-					translation_projects_look_up p on t.translation_id=p.translation_id where p.project_id=%s and \
-					token=%s",(projectId, token))
-				rst = cursor.fetchone()
-				if not rst:
-					senses = '|'.join(splitSense)
-					cursor.execute("insert into translations (token, translation, source_id, target_id, \
-						user_id, senses) values (%s, %s, %s, %s, %s, %s) returning translation_id", (token, translation, sourceId, targetLanguageId, \
-							userId, senses))
-					translationId = cursor.fetchone()[0]
-					cursor.execute("insert into translation_projects_look_up (translation_id, project_id) values \
-						(%s, %s)", (translationId, projectId))
-					cursor.execute("insert into translations_history (token, translation, source_id, target_id, \
-						user_id, senses) values (%s, %s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
-							userId, senses))
-				else:
-					dbSenses = []
-					if rst[2] != None:
-							logging.warning('rst[2] \'%s\'' % rst[2])
-							dbSenses = rst[2].split("|")
-							logging.warning('dbSenses \'%s\'' % dbSenses)
-					for sense in splitSense:
-						if sense not in dbSenses:
-							dbSenses.append(sense)
-					senses = "|".join(dbSenses)
-					cursor.execute("update translations set translation=%s, user_id=%s, senses=%s where source_id=%s and \
-							target_id=%s and token=%s",(translation, userId, senses, sourceId, targetLanguageId, token))
-					cursor.execute("insert into translations_history (token, translation, source_id, target_id, \
-							user_id, senses) values (%s, %s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
-								userId, senses))
-			
-			elif(("token" in item) and ("translation" in item) and ("senses" not in item)): # if only senses are not available
-				empty_senses += 1
-				token = item['token']
-				translation = item['translation']
-				cursor.execute("select t.token, t.translation from translations t left join \
-					translation_projects_look_up p on t.translation_id=p.translation_id where p.project_id=%s and \
-					token=%s",(projectId, token))
-				rst = cursor.fetchone()
-				if not rst:
-					# senses = '|'.join(splitSense)
-					cursor.execute("insert into translations (token, translation, source_id, target_id, \
-						user_id) values (%s, %s, %s, %s, %s) returning translation_id", (token, translation, sourceId, targetLanguageId, \
-							userId))
-					translationId = cursor.fetchone()[0]
-					cursor.execute("insert into translation_projects_look_up (translation_id, project_id) values \
-						(%s, %s)", (translationId, projectId))
-					cursor.execute("insert into translations_history (token, translation, source_id, target_id, \
-						user_id) values (%s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
-							userId))
-				else:
-					# dbSenses = []
-					# if rst[2] != "":
-					# 		dbSenses = rst[2].split("|")
-					# for sense in splitSense:
-					# 	if sense not in dbSenses:
-					# 		dbSenses.append(sense)
-					# senses = "|".join(dbSenses)
-					cursor.execute("update translations set translation=%s, user_id=%s where source_id=%s and \
-							target_id=%s and token=%s",(translation, userId, sourceId, targetLanguageId, token))
-					cursor.execute("insert into translations_history (token, translation, source_id, target_id, \
-							user_id) values (%s, %s, %s, %s, %s)", (token, translation, sourceId, targetLanguageId, \
-								userId))
-			else:
-				pass
+		empty_tokenName, empty_translation, empty_senses = translations.save_bulk_translations(cursor, \
+			projectId, sourceId, targetLanguageId, userId, tokenTranslations, \
+				sourceCatalog.get_source(connection, sourceId).table_name + "_tokens")
 		connection.commit()
+		translationLexicons.invalidate(projectId)
 		cursor.close()
 		return '{"success":true, "message":"Translations have been added.\\nEmpty token(s)  '+str(empty_tokenName)+' \\nEmpty translation(s)  '+str(empty_translation)+'\\nEmpty sense(s)  '+str(empty_senses)+'"}'
 	except Exception as ex:
@@ -925,14 +1001,12 @@ def bulkUpdateProjectTokenTranslations():
 def getUserProjects():
 	connection = get_db()
 	cursor = connection.cursor()
-	email = request.email
-	cursor.execute("select user_id from autographamt_users where email_id=%s", (email,))
-	userId = cursor.fetchone()
-	if not userId:
+	principal = getPrincipal()
+	if not principal:
 		cursor.close()
 		return '{"success":false, "message":"Unregistered User"}'
 	else:
-		userId = userId[0]
+		userId = principal.user_id
 		cursor.execute("select p.project_id, p.project_name, o.organisation_name, a.books, \
 			p.source_id, p.target_id, v.version_code, v.version_description, v.revision, p.status \
 				from autographamt_assignments a left join autographamt_projects p on \
@@ -982,15 +1056,10 @@ def organisationApprovals():
 				organisation_id=%s", (verified, organisationId))
 			if roleId < 3:
 				cursor.execute("update autographamt_users set role_id=2 where user_id=%s", (userId,))
-			# cursor
-			connection.commit()
-			# send email notification
+			# email notification
 			try:
 				cursor.execute("SELECT organisation_name from autographamt_organisations where organisation_id=%s",(organisationId,))
 				org_name = cursor.fetchone()[0]
-				cursor.close()
-				headers = {"api-key": sendinblue_key}
-				url = "https://api.sendinblue.com/v2.0/email"
 				if verified:
 					body = '''Hello %s,<br/><br/>
 					Your request to create organization,%s, has been approved.<br/><br/>
@@ -999,16 +1068,13 @@ def organisationApprovals():
 					body = '''Hello %s,<br/><br/>
 					Your request to create organization,%s, has not been approved.<br/><br/>
 					AutographaMT'''%(name, org_name)
-				payload = {
-					"to": {email: ""},
-					"from": ["noreply@autographamt.in", "Autographa MT"],
-					"subject": "AutographaMT - New Organisation",
-					"html": body,
-					}
-				resp = requests.post(url, data=json.dumps(payload), headers=headers)
+				mailer.queue_email(cursor, email, "AutographaMT - New Organisation", body)
+				connection.commit()
+				cursor.close()
 			except Exception as e:
 				print(e)
 				return '{"success":false, "message":'+str(e)+'}'
+			principalCache.invalidate_user(user_id=userId)
 			return '{"success":true, "message":"Role Updated"}'
 		else:
 			# cursor.close()
@@ -1028,43 +1094,24 @@ def getProjectStatistics(projectId):
 		if not rst:
 			return '{"sucess":false, "message":"Invalid project id"}'
 		tableName = rst[0] + "_tokens"
-		bookDict = {}
-		cursor.execute("select book_id, book_name, book_code from bible_books_look_up")
-		for b_id, b_name, b_code in cursor.fetchall():
-			bookDict[b_id] = {
-				"name": b_name,
-				"code": b_code
-			}
-		cursor.execute("select book_id, token from " + tableName)
-		bookWiseTokens = {}
-		for book_id, token in cursor.fetchall():
-			if book_id in bookWiseTokens:
-				bookWiseTokens[book_id] = bookWiseTokens[book_id] + [token]
-			else:
-				bookWiseTokens[book_id] = [token]
-		cursor.execute("select t.token from translations t left join translation_projects_look_up tl on \
-			t.translation_id=tl.translation_id where tl.project_id=%s", (projectId,))
-		translatedTokens = [item[0] for item in cursor.fetchall()]
-		projectStatistics = {}
+		bookStatistics = projectstats.get_statistics(cursor, projectId, tableName)
+		connection.commit()
 		cursor.close()
+		bookDict = {book.book_id: book for book in sourceCatalog.get_books(connection)}
+		projectStatistics = {}
 		pendingPercentageList = []
 		completedPercentageList = []
-		for key in bookWiseTokens.keys():
-			bookCode = bookDict[key]["code"]
-			bookName = bookDict[key]["name"]
-			bookTokenList = bookWiseTokens[key]
-			translatedTokensInBook = set(bookTokenList) & set(translatedTokens)
-			unTranslatedTokenList = set(bookTokenList) - translatedTokensInBook
-			pendingPercentage = float("{0:.2f}".format(len(unTranslatedTokenList) / len(bookTokenList) * 100))
-			completedPercentage = float("{0:.2f}".format(len(translatedTokensInBook) / len(bookTokenList) * 100))
+		for bookId, allTokensCount, translatedTokensCount in bookStatistics:
+			pendingPercentage = float("{0:.2f}".format((allTokensCount - translatedTokensCount) / allTokensCount * 100))
+			completedPercentage = float("{0:.2f}".format(translatedTokensCount / allTokensCount * 100))
 			pendingPercentageList.append(pendingPercentage)
 			completedPercentageList.append(completedPercentage)
-			projectStatistics[bookCode] = {
-				"allTokensCount": len(bookTokenList),
-				"translatedTokensCount": len(translatedTokensInBook),
+			projectStatistics[bookDict[bookId].book_code] = {
+				"allTokensCount": allTokensCount,
+				"translatedTokensCount": translatedTokensCount,
 				"completed": completedPercentage,
 				"pending": pendingPercentage,
-				"bookName": bookName,
+				"bookName": bookDict[bookId].book_name,
 			}
 		if not projectStatistics:
 			pendingTokensStatus = 0
@@ -1100,6 +1147,7 @@ def userApproval():
 		cursor = connection.cursor()
 		cursor.execute("update autographamt_users set role_id=%s where user_id=%s", (roleId, userId))
 		connection.commit()
+		principalCache.invalidate_user(user_id=userId)
 		cursor.close()
 		return '{"success":true, "message":"Role Updated"}'
 	else:
@@ -1111,13 +1159,12 @@ def available_books(sourceId):
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select table_name,content_type from sources as s left join content_types c on s.content_id=c.content_id where source_id=%s", (sourceId,))
-		rst = cursor.fetchone()
-		if not rst:
+		source = getSource(sourceId)
+		if not source:
 			return '{"success":false, "message":"No data available"}'
-		tablename = rst[0]
-		if rst[1] != 'bible':
-			return json.dumps({'success':False,'message':"Source is "+rst[1]+" not Bible"})
+		tablename = source.table_name
+		if source.content_type != 'bible':
+			return json.dumps({'success':False,'message':"Source is "+source.content_type+" not Bible"})
 		cursor.execute(sql.SQL("select l.book_code from {} as u left join bible_books_look_up as l \
 			on u.book_id=l.book_id").format(sql.Identifier(tablename)))
 		rst = cursor.fetchall()
@@ -1173,6 +1220,56 @@ def availableProjectBooks(projectId, userId):
 		print(ex1)
 		return '{"success":false, "message":"Server side error"}'
 
+def queueTokenization(connection, sourceId, bookIds):
+	'''Adds tokenization jobs for the books without tokens. Returns the status of each book:
+	"done" if it has been tokenized (and has no tokens), "pending" or "failed" if the last
+	tokenization failed. A failed book is not queued again, the worker has already retried it;
+	it is retried through POST /v1/tokenization/<sourceId>.'''
+	cursor = connection.cursor()
+	bookJobs = jobs.get_tokenization_jobs(cursor, sourceId, bookIds)
+	status = {}
+	for bookId in bookIds:
+		jobStatus = bookJobs[bookId][0] if bookId in bookJobs else None
+		if jobStatus is None:
+			jobs.enqueue_tokenization(cursor, sourceId, bookId)
+		if jobStatus in (jobs.DONE, jobs.FAILED):
+			status[bookId] = jobStatus
+		else:
+			status[bookId] = jobs.PENDING
+	connection.commit()
+	cursor.close()
+	return status
+
+def tokenizationPendingResponse(bookIds):
+	bookMap = getBibleBookIds()
+	return json.dumps({"success":False, "status":jobs.PENDING, "books":[bookMap[bookId] for bookId in bookIds],
+		"message":"Tokens are being generated for the book(s). Try again later"}), 202
+
+@app.route("/v1/tokenization/<sourceId>", methods=["POST"])
+@check_token
+def retryTokenization(sourceId):
+	'''Queues again the books (json list books, 3 letter codes) whose tokenization failed. Admins only.'''
+	if checkAuth() < 2:
+		return '{"success":false, "message":"UnAuthorized"}'
+	req = request.get_json(True)
+	source = getSource(sourceId)
+	if not source:
+		return '{"success":false, "message":"Invalid source Id"}'
+	bookIds = []
+	for book in req.get("books", []):
+		bibleBookData = getBibleBook(book)
+		if not bibleBookData:
+			return '{"success":false, "message":"Invalid book code, '+book+'. The 3 letter code expected."}'
+		bookIds.append(bibleBookData.book_id)
+	connection = get_db()
+	cursor = connection.cursor()
+	retried = jobs.retry_failed(cursor, source.source_id, bookIds)
+	connection.commit()
+	cursor.close()
+	bookMap = getBibleBookIds()
+	return json.dumps({"success":True, "books":[bookMap[bookId] for bookId in retried],
+		"message":"%s book(s) queued for tokenization" % len(retried)})
+
 @app.route("/v1/tokenlist/<sourceId>", methods=["GET"])
 def getTokenLists(sourceId):
 	only_words = bool(request.args.get("only_words", False))
@@ -1180,41 +1277,77 @@ def getTokenLists(sourceId):
 	log.info("comes to getTokenLists for "+str(books))
 	if len(books) == 0:
 		return '{"success":false, "message":"No books selected for tokens request"}'
+	source = getSource(sourceId)
+	if not source:
+		return '{"success":false, "message":"Invalid source Id"}'
+	bookIds = []
+	for book in books:
+		bibleBookData = getBibleBook(book)
+		if not bibleBookData:
+			return '{"success":false, "message":"Invalid book code, '+book+'. The 3 letter code expected."}'
+		bookIds.append(bibleBookData.book_id)
 	connection = get_db()
 	cursor = connection.cursor()
-	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-	rst = cursor.fetchone()
+	tablename = source.table_name + '_tokens'
+	rows = []
+	if projectstats.token_table_exists(cursor, tablename):
+		# the tokens of all the books, in the order of the books asked for
+		cursor.execute(sql.SQL("select k.book_id, k.token from {} k join unnest(%s::int[]) with ordinality \
+			as b (book_id, ord) on k.book_id=b.book_id order by b.ord, k.token collate \"C\"").format( \
+				sql.Identifier(tablename)), (bookIds,))
+		rows = cursor.fetchall()
+	cursor.close()
+	tokenizedBooks = {bookId for bookId, _ in rows}
+	untokenized = [bookId for bookId in bookIds if bookId not in tokenizedBooks]
+	if untokenized:
+		log.info("comes here to tokenize books:"+str(untokenized))
+		status = queueTokenization(connection, source.source_id, untokenized)
+		if jobs.FAILED in status.values():
+			return '{"success":false, "message":"Phrases method error"}'
+		pending = [bookId for bookId in untokenized if status[bookId] == jobs.PENDING]
+		if pending:
+			return tokenizationPendingResponse(pending)
+	tokenList = []
+	seen = set()
+	for _, token in rows:
+		if token in seen or (only_words and " " in token):
+			continue
+		seen.add(token)
+		tokenList.append(token)
+	return json.dumps(tokenList)
+
+@app.route("/v1/tokenization/<sourceId>", methods=["GET"])
+def getTokenizationStatus(sourceId):
+	'''Status of the latest tokenization job of each of the books (query param books, 3 letter codes).
+	The status is one of pending, running, done and failed, or null if the book has never been queued.'''
+	books = request.args.getlist('books')
+	if len(books) == 0:
+		return '{"success":false, "message":"No books selected"}'
+	source = getSource(sourceId)
+	if not source:
+		return '{"success":false, "message":"Invalid source Id"}'
 	bookIds = []
 	for book in books:
-		cursor.execute("select book_id from bible_books_look_up where book_code=%s", (book.lower(),))
-		bookIds.append(cursor.fetchone()[0])
-	tablename = rst[0] + '_tokens'
-	tablename_parts = tablename.split('_')
-	languageCode = tablename_parts[0]
-	version = '_'.join(tablename_parts[1:-2])
-	tokenList = []
-	for bookId in bookIds:
-		this_book_tokens = []
-		cursor.execute(sql.SQL("select token from {} where book_id=%s").format(sql.Identifier(tablename)), (bookId,))
-		this_book_tokens = [item[0] for item in cursor.fetchall()]
-		if len(this_book_tokens)==0:
-			try:
-				log.info("comes here to tokenize book:"+str(bookId))
-				phrases.tokenize(connection, languageCode.lower(), version.lower() , bookId)
-				cursor.execute("select token from " + tablename + " where book_id=%s", (bookId,))
-				this_book_tokens = [item[0] for item in cursor.fetchall()]
-			except Exception as ex:
-				log.error(ex)
-				return '{"success":false, "message":"Phrases method error"}'
-		for item in this_book_tokens:
-			if only_words and " " in item:
-				continue
-			if item not in tokenList:
-				tokenList.append(item)
+		bibleBookData = getBibleBook(book)
+		if not bibleBookData:
+			return '{"success":false, "message":"Invalid book code, '+book+'. The 3 letter code expected."}'
+		bookIds.append(bibleBookData.book_id)
+	connection = get_db()
+	cursor = connection.cursor()
+	bookJobs = jobs.get_tokenization_jobs(cursor, source.source_id, bookIds)
 	cursor.close()
-	jsonOut = json.dumps(tokenList)
-	# print(jsonOut)
-	return jsonOut
+	bookMap = getBibleBookIds()
+	result = []
+	for bookId in bookIds:
+		status, message, createdAt, finishedAt = bookJobs.get(bookId, (None, None, None, None))
+		result.append({
+			"bookCode": bookMap[bookId],
+			"status": status,
+			"message": message,
+			"queuedAt": createdAt.isoformat() if createdAt else None,
+			"finishedAt": finishedAt.isoformat() if finishedAt else None
+		})
+	return json.dumps(result)
 
 @app.route("/v1/tokentranslationlist/<projectId>", methods=["GET"])
 @check_token
@@ -1237,21 +1370,30 @@ def getTokenTranslationList(projectId):
 	]
 	This format of array of arrays and comma seperated string for senses was chosen due to
 	the requirement from UI side (the xlsx npm module)
+	The list can be read in pages with the query params limit (number of tokens) and cursor
+	(the X-Next-Cursor header of the previous page, sent when there may be more tokens),
+	or streamed with stream=true, which keeps the memory used the same for any number of books.
 	'''
 	only_words = bool(request.args.get("only_words", False))
 	books = request.args.getlist('books')
+	stream = request.args.get("stream", "false").lower() == "true"
 	log.info("comes to getTokenLists for "+str(books))
 	if len(books) == 0:
 		return '{"success":false, "message":"No books selected for tokens request"}'
+	try:
+		limit = int(request.args["limit"]) if "limit" in request.args else None
+		if limit is not None and limit <= 0:
+			raise ValueError("Invalid limit")
+		after = translations.decode_page_cursor(request.args["cursor"]) if "cursor" in request.args else (0, '')
+	except ValueError:
+		return '{"success":false, "message":"Invalid limit or cursor"}'
 
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
 		projectId = int(projectId)
 
-		email = request.email
-		cursor.execute("select user_id from autographamt_users where email_id=%s", (email,))
-		userId = cursor.fetchone()[0]
+		userId = getPrincipal().user_id
 		cursor.execute("select books from autographamt_assignments where user_id=%s and \
 			project_id=%s", (userId, projectId))
 		assignments = cursor.fetchone()
@@ -1259,70 +1401,119 @@ def getTokenTranslationList(projectId):
 			if (not assignments) or (book.lower() not in assignments[0].split('|')):
 				return '{"success":false, "message":"UnAuthorized! You haven\'t been assigned the book/project('+book+')"}'
 
-		cursor.execute("select s.table_name from sources as s join autographamt_projects as p \
+		cursor.execute("select s.table_name, s.source_id, p.target_id from sources as s join autographamt_projects as p \
 		on s.source_id = p.source_id where p.project_id=%s", (projectId,))
-		source_table = cursor.fetchone()[0]
+		source_table, sourceId, targetId = cursor.fetchone()
 		tablename = source_table + '_tokens'
-		tokenList = {}
+		bookIds = []
 		for book in books:
-			cursor.execute("select book_id from bible_books_look_up where book_code=%s", (book.lower(),))
-			bookId_rst = cursor.fetchone()
-			if not bookId_rst:
+			bibleBookData = getBibleBook(book)
+			if not bibleBookData:
 				return '{"success":false, "message":"Invalid book code, '+book+'. The 3 letter code expected."}'
-			bookId = bookId_rst[0]
-			cursor.execute(sql.SQL("SELECT s.token, t.translation, t.senses, l.project_id FROM {} s \
-				LEFT JOIN translations t ON s.token = t.token \
-				LEFT JOIN translation_projects_look_up l ON t.translation_id = l.translation_id \
-				where s.book_id=%s;").format(sql.Identifier(tablename)), (bookId,))
-			tokens = cursor.fetchall()
-			if len(tokens)==0:
-				try:
-					languageCode = source_table.split('_')[0]
-					version = '_'.join(source_table.split('_')[1:3])
-					phrases.tokenize(connection, languageCode.lower(), version.lower() , bookId)
-					cursor.execute(sql.SQL("SELECT s.token, t.translation, t.senses, l.project_id FROM {} s \
-						LEFT JOIN translations t ON s.token = t.token \
-						LEFT JOIN translation_projects_look_up l ON t.translation_id = l.translation_id \
-						where s.book_id=%s;").format(sql.Identifier(tablename)), (bookId,))
-					tokens = cursor.fetchall()
-				except Exception as ex:
-					log.exception(ex)
+			bookIds.append(bibleBookData.book_id)
+		tokenizedBooks = set()
+		if projectstats.token_table_exists(cursor, tablename):
+			cursor.execute(sql.SQL("select distinct book_id from {} where book_id = any(%s)").format( \
+				sql.Identifier(tablename)), (bookIds,))
+			tokenizedBooks = {row[0] for row in cursor.fetchall()}
+		for book, bookId in zip(books, bookIds):
+			if bookId not in tokenizedBooks:
+				status = queueTokenization(connection, sourceId, [bookId])[bookId]
+				if status == jobs.FAILED:
 					return json.dumps({"success":False, "message":"Phrases method error"})
-			if len(tokens)==0:
+				if status == jobs.PENDING:
+					return tokenizationPendingResponse([bookId])
 				return json.dumps({"success":False, "message": "No tokens available for, "+book+". Check if bible books are uploaded."})
-			this_book_token_List = {}
-			for item in tokens:
-				if only_words and " " in item[0]:
-					continue
-				if item[3] == projectId:
-					senses = None
-					if item[2]:
-						senses = item[2].replace('|',',')
-						if senses[-1] == ',':
-							senses = senses[:-1]
-					this_book_token_List[item[0]] = [item[1], senses]
-				elif item[0] not in this_book_token_List:
-					this_book_token_List[item[0]] = [None, None]
-			for key in this_book_token_List:
-				if key not in tokenList:
-					tokenList[key] = this_book_token_List[key]
+		query = translations.token_translations_query(tablename, only_words)
+		params = (bookIds, projectId, sourceId, targetId, after[0], after[1], limit)
 		cursor.close()
-		result_list = [[key]+tokenList[key] for key in tokenList]
-		jsonOut = json.dumps(result_list)
-		return jsonOut
+		if stream:
+			return flask.Response(flask.stream_with_context(streamTokenTranslations(connection, query, params)), \
+				mimetype='application/json')
+		cursor = connection.cursor()
+		cursor.execute(query, params)
+		rows = cursor.fetchall()
+		cursor.close()
+		result_list = [translations.token_translation_row(*row[1:]) for row in rows]
+		headers = {}
+		if limit is not None and len(rows) == limit:
+			headers["X-Next-Cursor"] = translations.encode_page_cursor(rows[-1][0], rows[-1][1])
+		return json.dumps(result_list), 200, headers
 	except Exception as e:
 		print(e)
 		traceback.print_exc()
 		return json.dumps({"success":False, "message": "Server side error"})
 
+def streamTokenTranslations(connection, query, params, chunkSize=2000):
+	'''Yields the token translation list as a JSON array, in chunks read from a server side cursor'''
+	cursor = connection.cursor(name='token_translations')
+	try:
+		cursor.execute(query, params)
+		separator = '['
+		while True:
+			rows = cursor.fetchmany(chunkSize)
+			if not rows:
+				break
+			yield separator + ','.join(json.dumps(translations.token_translation_row(*row[1:])) for row in rows)
+			separator = ','
+		yield ']' if separator == ',' else '[]'
+	finally:
+		cursor.close()
+		connection.rollback()
+
+def isExportRequest():
+	'''Whether a whole source is asked for as a stream (stream=true) or as an archive of its books (archive=tar|zip).'''
+	return request.args.get("stream", "false").lower() == "true" or "archive" in request.args
+
+def exportSource(source, contentFormat, bookKey, prefix='', suffix=''):
+	'''
+	Returns a streamed response with all the books of a bible, in the format (usfm or json),
+	read one book at a time: the JSON object of the books keyed by bookKey(book id, book code),
+	between prefix and suffix, or with the url param archive (tar or zip) an archive with a file
+	per book. Returns an error response if the source is not a bible or has no books.
+	'''
+	# checked before the response starts, as an error in the stream would only truncate it
+	if source.content_type != 'bible':
+		return '{"success":false, "message":"Only bibles can be exported"}'
+	archiveFormat = request.args.get("archive")
+	if archiveFormat is not None and archiveFormat not in exports.ARCHIVE_FORMATS:
+		return '{"success":false, "message":"Invalid archive format. Use `tar` or `zip`"}'
+	connection = get_db()
+	cursor = connection.cursor()
+	cursor.execute(sql.SQL("select exists (select 1 from {})").format(sql.Identifier(source.table_name)))
+	hasBooks = cursor.fetchone()[0]
+	cursor.close()
+	if not hasBooks:
+		return '{"success":false, "message":"No Books uploaded yet"}'
+	bookIdDict = getBibleBookIds()
+	column = "usfm_text" if contentFormat == "usfm" else "json_text"
+	rows = exports.iter_rows(connection, sql.SQL("select book_id, {} from {} order by book_id").format(
+		sql.Identifier(column), sql.Identifier(source.table_name)))
+	if archiveFormat:
+		files = ((bookIdDict[bookId].lower() + "." + contentFormat,
+			content if contentFormat == "usfm" else json.dumps(content)) for bookId, content in rows)
+		response = flask.Response(flask.stream_with_context(exports.archive(files, archiveFormat)), \
+			mimetype=exports.ARCHIVE_MIMETYPES[archiveFormat])
+		response.headers["Content-Disposition"] = "attachment; filename=%s_%s.%s" % (source.table_name, \
+			contentFormat, archiveFormat)
+		return response
+	def generate():
+		yield prefix
+		for chunk in exports.json_object((bookKey(bookId, bookIdDict[bookId]), content) for bookId, content in rows):
+			yield chunk
+		yield suffix
+	return flask.Response(flask.stream_with_context(generate()), mimetype='application/json')
+
 def getConcordanceList(db_data):
 	concordance = []
-	for bookCode, bookName, chapter, verse, text in db_data:
+	bookMap = {bookData.book_id:bookData for bookData in sourceCatalog.get_books(get_db())}
+	for ref_id, text in db_data:
+		bookData = bookMap[ref_id // 1000000]
 		obj = {
-			"bookCode":bookCode,
-			"book":bookName,
-			"chapterNumber":chapter,
-			"verseNumber":verse,
+			"bookCode":bookData.book_code,
+			"book":bookData.book_name,
+			"chapterNumber":ref_id // 1000 % 1000,
+			"verseNumber":ref_id % 1000,
 			"verse": text
 		}
 		concordance.append(obj)
@@ -1334,24 +1525,24 @@ def generateConcordances(sourceId, book, token):
 	connection = get_db()
 	cursor = connection.cursor()
 	book = book.lower()
-	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-	tablename = cursor.fetchone()[0]+"_cleaned"
-	# try:
-	cursor.execute("select bb.book_code, bb.book_name, l.chapter, l.verse, b.verse from " + tablename + " b \
-	left join bcv_map l on b.ref_id=l.ref_id left join bible_books_look_up bb on l.book=bb.book_id \
-		where b.verse like '%" + token + "%' and bb.book_code='" + book +"' order by l.ref_id")
-	book_concordance = getConcordanceList(cursor.fetchall())
-	cursor.execute("select bb.book_code, bb.book_name, l.chapter, l.verse, b.verse from " + tablename + " b \
-	left join bcv_map l on b.ref_id=l.ref_id left join bible_books_look_up bb on l.book=bb.book_id \
-		where b.verse like '%" + token + "%' and bb.book_code!='" + book +"' order by l.ref_id \
-			limit 100")
-	all_books_concordance = getConcordanceList(cursor.fetchall())
+	source = getSource(sourceId)
+	if not source:
+		return '{"success":false, "message":"Invalid source Id"}'
+	tablename = source.table_name + "_cleaned"
+	bibleBookData = getBibleBook(book)
+	if bibleBookData:
+		book_concordance = getConcordanceList(search.token_occurrences(cursor, tablename, token, \
+			bibleBookData.book_id))
+		all_books_concordance = getConcordanceList(search.token_occurrences(cursor, tablename, token, \
+			bibleBookData.book_id, in_book=False, limit=100))
+	else:
+		book_concordance = []
+		all_books_concordance = getConcordanceList(search.token_occurrences(cursor, tablename, token, limit=100))
+	cursor.close()
 	return json.dumps({
 		book:book_concordance,
 		"all":all_books_concordance
 	})
-	# except Exception as ex:
-	#     return '{"success": false, "messsage":"%s"}' %(ex)
 
 
 @app.route("/v1/contenttypes", methods=["GET"])
@@ -1427,13 +1618,10 @@ def parsePunctuationsForDraft(text):
 	return content
 
 def parseDataForDBInsert(usfmData):
-	connection = get_db()
 	normalVersePattern = re.compile(r'\d+$')
 	splitVersePattern = re.compile(r'(\d+)(\w)$')
 	mergedVersePattern = re.compile(r'(\d+)-(\d+)$')
-	cursor = connection.cursor()
-	cursor.execute("select book_id, book_code from bible_books_look_up")
-	bookIdDict = {v.lower():k for k,v in cursor.fetchall()}
+	bookIdDict = {v.lower():k for k,v in getBibleBookIds().items()}
 	bookName = usfmData["book"]["bookCode"].lower()
 	chapterData = usfmData["chapters"]
 	dbInsertData = []
@@ -1547,6 +1735,7 @@ def createBibleSource():
 			log.debug("Create token bible table command: %s",create_token_bible_table_command)
 			cursor.execute(create_usfm_bible_table_command)
 			cursor.execute(create_clean_bible_table_command)
+			search.ensure_index(cursor, cleanTableName)
 			cursor.execute(create_token_bible_table_command)
 			cur2 = connection.cursor()
 			cur2.execute("select version_id from versions where version_code=%s and version_description=%s \
@@ -1560,6 +1749,7 @@ def createBibleSource():
 			cursor.execute('insert into sources (table_name, year, license, content_id, language_id, version_id,status) values \
 				(%s, %s, %s, %s, %s, %s,true)', (bibleTableName, year, license, contentId, languageId,version_id,))
 			connection.commit()
+			sourceCatalog.invalidate()
 			cursor.close()
 			log.info("Source Created successfully: %s",bibleTableName)
 			return '{"success": true, "message":"Source Created successfully"}'
@@ -1581,18 +1771,16 @@ def uploadSource():
 		parsedUsfmText = req["parsedUsfmText"]
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select s.table_name from sources as s where s.source_id=%s", (sourceId,))
-		rst = cursor.fetchone()
-		if not rst:
+		source = getSource(sourceId)
+		if not source:
 			log.warning("Exiting uploadSource: No source created: %s",sourceId)
 			return '{"success":false, "message":"No source created"}'
-		bibleTable = rst[0]
+		bibleTable = source.table_name
 		if "book" not in parsedUsfmText:
 			log.warning("'book' not found in parsedUsfmText")
 			return '{"success":false, "message":"parsedUsfmText not of the expected format"}'
 		bookCode = parsedUsfmText["book"]["bookCode"].lower()
-		cursor.execute("select book_id from bible_books_look_up where book_code=%s",(bookCode,))
-		bookId = cursor.fetchone()[0]
+		bookId = getBibleBook(bookCode).book_id
 		cursor.execute(sql.SQL("select * from {} where book_id=%s").format(sql.Identifier(bibleTable)),(bookId,))
 		rst = cursor.fetchone()
 		cursor.close()
@@ -1606,13 +1794,24 @@ def uploadSource():
 		cursor = connection.cursor()
 		execute_values(cursor,sql.SQL('insert into {} (ref_id, verse, cross_reference, foot_notes) values %s').format(sql.Identifier(cleanTableName)),
 			parsedDbData)
+		search.ensure_index(cursor, cleanTableName)
 		print("added in ",cleanTableName)
 		print("About to insert to ",bibleTable)
 		usfmJson = str(json.dumps(parsedUsfmText))
 		cursor.execute(sql.SQL('insert into {} (book_id,usfm_text,json_text) values (%s,%s,%s)').format(sql.Identifier(bibleTable)), (bookId, wholeUsfmText,usfmJson,))
 		print("Added to ",bibleTable)
+		jobs.enqueue_tokenization(cursor, sourceId, bookId)
+		contentcache.bump_book(cursor, source.source_id, bookId, len(parsedUsfmText.get("chapters", [])))
 		connection.commit()
 		cursor.close()
+		contentCache.invalidate_source(source.source_id)
+		artifactStore.remove_source(source.source_id)
+		g.pop('sourceBooks', None)
+		try:
+			storeBookArtifacts(source, bookCode, bookId)
+		except Exception as ex:
+			# the book is uploaded, its responses are stored by the first requests for them
+			log.error("Could not store the artifacts of %s in %s: %s", bookCode, bibleTable, ex)
 		log.info("Inserted %s into database",bookCode)
 		return '{"success":true, "message":"Inserted %s into database"}' %(bookCode)
 	except Exception as ex:
@@ -1678,9 +1877,7 @@ def getTransaltedTokensInfo():
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		email = request.email
-		cursor.execute("select user_id from autographamt_users where email_id=%s", (email,))
-		userId = cursor.fetchone()[0]
+		userId = getPrincipal().user_id
 		cursor.execute("select project_id from autographamt_assignments where user_id=%s", (userId,))
 		projectIds = [p[0] for p in cursor.fetchall()]
 		translationInfo = []
@@ -1705,35 +1902,24 @@ def getTransaltedTokensInfo():
 
 @app.route("/v1/translatedbooks/<sourceId>/<targetId>", methods=["GET"])
 def getTranslatedBooks(sourceId, targetId):
+	'''The codes of the books with at least one token translated to the target language'''
+	source = getSource(sourceId)
+	if not source:
+		return '{"success":false, "message":"Invalid source Id"}'
 	connection = get_db()
 	cursor = connection.cursor()
-	# cursor.execute("select t.to_name from tokentranslationslookup t left join \
-	#     languages l on t.language_id=l.language_id where l.language_id=%s \
-	#         and t.source_id=%s", (targetId, sourceId))
-	cursor.execute("select token, translation from translations where source_id=%s \
-		and target_id=%s", (sourceId, targetId))
-	tokenTranslations = {k:v for k, v in cursor.fetchall()}
-	tokenList = list(tokenTranslations.keys())
-	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-	rst = cursor.fetchone()[0]
-	tableName = rst + "_tokens"
-	#
-
-	cursor.execute(sql.SQL("select b.book_code, t.token from {} t left join bible_books_look_up b on t.book_id=b.book_id").format(sql.Identifier(tableName)))
-	rstAllTokens = cursor.fetchall()
-	bookWiseTokens = {}
-	for bookCode, token in rstAllTokens:
-		if bookCode not in bookWiseTokens:
-			bookWiseTokens[bookCode] = [token]
-		else:
-			# temp = bookWiseTokens[bookCode]
-			bookWiseTokens[bookCode] = bookWiseTokens[bookCode] + [token]
-			# bookWiseTokens[bookCode] = temp
-	translatedBooks = []
-	for key in bookWiseTokens.keys():
-		checkCommonTokens = set(tokenList) & set(bookWiseTokens[key])
-		if checkCommonTokens:
-			translatedBooks.append(key)
+	tableName = source.table_name + "_tokens"
+	if not projectstats.token_table_exists(cursor, tableName):
+		cursor.close()
+		return json.dumps([])
+	# the translations of the source and target are looked up in the token index of the token table
+	cursor.execute(sql.SQL("select distinct k.book_id from translations t join {} k on k.token=t.token \
+		where t.source_id=%s and t.target_id=%s order by k.book_id").format(sql.Identifier(tableName)), \
+			(source.source_id, targetId))
+	bookIds = [row[0] for row in cursor.fetchall()]
+	cursor.close()
+	bookMap = getBibleBookIds()
+	translatedBooks = [bookMap[bookId] for bookId in bookIds if bookId in bookMap]
 	return json.dumps(translatedBooks)
 
 
@@ -1788,13 +1974,8 @@ def downloadDraft():
 		cursor = connection.cursor()
 		cursor.execute("select source_id from autographamt_projects where project_id=%s", (projectId,))
 		sourceId = cursor.fetchone()[0]
-		usfmMarker = re.compile(r'\\\w+\d?\*?\s?')
-		nonLangComponentsTwoSpaces = re.compile(r'\s[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]\s')
-		nonLangComponentsTrailingSpace = re.compile(r'[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]\s')
-		nonLangComponentsFrontSpace = re.compile(r'\s[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]')
-		nonLangComponents = re.compile(r'[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]')
-
-		if phrases.loadPhraseTranslations(connection, projectId):
+		lexicon = translationLexicons.get(connection, projectId)
+		if lexicon:
 
 			cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
 			tablename = cursor.fetchone()[0]
@@ -1803,62 +1984,10 @@ def downloadDraft():
 					left join bible_books_look_up bl on bb.book_id=bl.book_id \
 					where bl.book_code = ANY(%s::text[])").format(sql.Identifier(tablename)),('{'+",".join(bookList)+'}',))
 			source_rst = cursor.fetchall()
-			# print(source_rst)
 
-			# usfmText = source_rst[0]['usfm'][bookCode]
 			finalDraftDict = {}
-			for row in source_rst:
-				usfm_text = row[0]
-				book = row[1]
-				usfmLineList = []
-				for line in usfm_text.split('\n'):
-					usfmWordsList = []
-					nonLangCompsTwoSpaces = []
-					nonLangCompsTrailingSpace = []
-					nonLangCompsFrontSpace = []
-					nonLangComps = []
-					markers_in_line = re.findall(usfmMarker,line)
-					translated_seq = []
-					for word_seq in re.split(usfmMarker,line):
-						nonLangCompsTwoSpaces += re.findall(nonLangComponentsTwoSpaces,word_seq)
-						clean_word_seq = re.sub(nonLangComponentsTwoSpaces,' uuuQQQuuu ',word_seq)
-						nonLangCompsTrailingSpace += re.findall(nonLangComponentsTrailingSpace,clean_word_seq)
-						clean_word_seq = re.sub(nonLangComponentsTrailingSpace,' QQQuuu ',clean_word_seq)
-						nonLangCompsFrontSpace += re.findall(nonLangComponentsFrontSpace,clean_word_seq)
-						clean_word_seq = re.sub(nonLangComponentsFrontSpace,' uuuQQQ ',clean_word_seq)
-						nonLangComps += re.findall(nonLangComponents,clean_word_seq)
-						clean_word_seq = re.sub(nonLangComponents,' QQQ ',clean_word_seq)
-						if not re.match(r'\s+$',clean_word_seq) and clean_word_seq!='':
-							translated_seq.append(phrases.translateText( clean_word_seq ))
-
-					for i,marker in enumerate(markers_in_line):
-						usfmWordsList.append(marker)
-						if i<len(translated_seq):
-							usfmWordsList.append(translated_seq[i])
-					if i+1<len(translated_seq):
-						usfmWordsList += translated_seq[i+1:]
-					outputLine = " ".join(usfmWordsList)
-					if 'bdit' in outputLine:
-						print('translated_seq:',translated_seq)
-						print(nonLangComps,nonLangCompsFrontSpace,nonLangCompsTrailingSpace,nonLangCompsTwoSpaces)
-					for comp in nonLangCompsTwoSpaces:
-						comp = comp.replace("\\", '\\\\')
-						outputLine = re.sub(r' uuuQQQuuu '," "+comp+" ",outputLine,1)
-					for comp in nonLangCompsTrailingSpace:
-						comp = comp.replace("\\", '\\\\')
-						outputLine = re.sub(r' QQQuuu ',comp+" ",outputLine,1)
-					for comp in nonLangCompsFrontSpace:
-						comp = comp.replace("\\", '\\\\')
-						outputLine = re.sub(r' uuuQQQ '," "+comp,outputLine,1)
-					for comp in nonLangComps:
-						comp = comp.replace("\\", '\\\\')
-						outputLine = re.sub(r' QQQ ',comp,outputLine,1)
-					outputLine = re.sub(r'\s+',' ',outputLine)
-					# print(outputLine)
-
-					usfmLineList.append(outputLine)
-				translatedUsfmText = "\n".join(usfmLineList)
-				finalDraftDict[book] = translatedUsfmText
+			for usfm_text, book in source_rst:
+				finalDraftDict[book] = draft.render_draft(usfm_text, lexicon)
 			return json.dumps({
 				"translatedUsfmText": finalDraftDict
 			})
@@ -1866,12 +1995,6 @@ def downloadDraft():
 			return '{"success": false, "message":"No translation available"}'
 	except Exception as e:
 		traceback.print_exc()
-		print("line:",line)
-		print(marker,'of',markers_in_line)
-		print('usfmWordsList:',usfmWordsList)
-		print('translated_seq:',translated_seq)
-		print('word_seq:',word_seq)
-		print('clean_word_seq:',clean_word_seq)
 		return json.dumps({'success':False, 'message':"Server error"})
 
 
@@ -1962,19 +2085,25 @@ def getAllTranslatedWords(sourceId, targetLanguageId):
 
 @app.route('/v1/sources/<sourceid>/<outputtype>', methods=["GET"], defaults={'bookid':None})
 @app.route('/v1/sources/<sourceid>/<outputtype>/<bookid>', methods=["GET"])
+@cachedBibleContent("bookid", sourceArg="sourceid", artifactFormatArg="outputtype")
 def getbookText(sourceid, outputtype, bookid):
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
 		outputtype = outputtype.lower()
 		bookIdDict = getBibleBookIds()
-		cursor.execute("select table_name from sources where source_id=%s and status=true", (sourceid,))
-		rst = cursor.fetchone()
-		if not rst:
+		source = getSource(sourceid)
+		if not source or not source.status:
 			return json.dumps({'success':False,'message':'Source not present.'})
 
-		tableName = rst[0]
+		tableName = source.table_name
 		returnObj = {}
+		if not bookid and isExportRequest():
+			if outputtype not in ('usfm', 'json'):
+				return json.dumps({'success':False,'message':'Unsupported type. Use "usfm" or "json"'})
+			bookKey = (lambda bookId, bookCode: bookId) if outputtype == 'usfm' else \
+				(lambda bookId, bookCode: bookCode.lower())
+			return exportSource(source, outputtype, bookKey)
 		if bookid:
 			cursor.execute(sql.SQL("select usfm_text, json_text from {} where book_id=%s").format(sql.Identifier(tableName)),(bookid,))
 			sourceContent = cursor.fetchone()
@@ -2016,29 +2145,30 @@ def getVerseInRange(sourceid, outputtype, bookid, chapterid):
 		cursor = connection.cursor()
 		outputtype = outputtype.lower()
 
-		cursor.execute("select table_name from sources where source_id=%s", (sourceid,))
-		rst = cursor.fetchone()
-		if not rst:
+		source = getSource(sourceid)
+		if not source:
 			return '{"success":false, "message":"Source File not available. Create source"}'
 
 		if outputtype == "clean":
-			tablename = rst[0] + '_cleaned'
-			cursor.execute(sql.SQL("select b.book_code, b.book_id, b.book_name,bcv.chapter,bcv.verse, t.verse from {} \
-				 t left join bcv_map bcv on t.ref_id=bcv.ref_id left join \
-					 bible_books_look_up b on b.book_id=bcv.book where bcv.book=%s \
-						 and bcv.chapter=%s order by bcv.ref_id").format(sql.Identifier(tablename)), (int(bookid), int(chapterid)))
-			cleanedText = cursor.fetchall()
+			tablename = source.table_name + '_cleaned'
+			bookData = getBibleBook(int(bookid))
+			if not bookData:
+				return json.dumps([])
+			start = versification.ref_id(bookData.book_id, int(chapterid), 0)
+			cursor.execute(sql.SQL("select ref_id, verse from {} where ref_id between %s and %s \
+				order by ref_id").format(sql.Identifier(tablename)), (start, start + 999))
+			bibleVersification = getVersification()
 			cleanedText = [{
-				"bookId":bookId,
-				"bookName": bookName,
-				"bookCode": bookCode,
-				"chapter":chapter,
-				"verse":verse,
+				"bookId":bookData.book_id,
+				"bookName": bookData.book_name,
+				"bookCode": bookData.book_code,
+				"chapter":versification.bcv(ref_id)[1],
+				"verse":versification.bcv(ref_id)[2],
 				"text": text
-			} for  bookCode, bookId, bookName,chapter,verse, text in cleanedText]
+			} for ref_id, text in cursor.fetchall() if bibleVersification.has_verse(ref_id)]
 			return json.dumps(cleanedText)
 		elif outputtype == "json":
-			tablename = rst[0]
+			tablename = source.table_name
 			cursor.execute(sql.SQL("select json_text from {} where book_id=%s").format(sql.Identifier(tablename)),(bookid,))
 			rst2 = cursor.fetchone()
 			if not rst2:
@@ -2078,6 +2208,7 @@ def removeUser():
 			else:
 				message += "User not present."
 			connection.commit()
+			principalCache.invalidate_user(email=userEmail)
 		else:
 			message += "UnAuthorized! Only a super admin can delete users."
 	except Exception as e:
@@ -2107,6 +2238,7 @@ def activateUser():
 				else:
 					cursor.execute("update autographamt_users set status=true where email_id=%s",(userEmail,))
 					connection.commit()
+					principalCache.invalidate_user(email=userEmail)
 					success = True
 					message = "User re-activated"
 			else:
@@ -2187,7 +2319,6 @@ def removeProject():
 	req = request.get_json(True)
 	projectId = req["projectId"]
 	role = checkAuth()
-	email = request.email
 	connection = get_db()
 	cursor = connection.cursor()
 	message = ""
@@ -2203,11 +2334,7 @@ def removeProject():
 				else:
 					message += "Project not present."
 		elif role == 2:
-			cursor.execute("select user_id from autographamt_users where email_id=%s",(email,))
-			userId = cursor.fetchone()[0]
-			cursor.execute("select organisation_id from autographamt_organisations where user_id=%s",(userId,))
-			orgIds = cursor.fetchall()
-			orgIds = [row[0] for row in orgIds]
+			orgIds = list(getPrincipal().organisations)
 			if orgIds:
 				cursor.execute("select * from autographamt_projects where project_id=%s and organisation_id= ANY(%s::int[])",(projectId,'{'+','.join(str(n) for n in orgIds)+'}',))
 				project = cursor.fetchone()
@@ -2232,7 +2359,6 @@ def activateProject():
 	req = request.get_json(True)
 	projectId = req["projectId"]
 	role = checkAuth()
-	email = request.email
 	connection = get_db()
 	cursor = connection.cursor()
 	message = ""
@@ -2253,11 +2379,7 @@ def activateProject():
 				else:
 					message = "Project not present."
 		elif role == 2:
-			cursor.execute("select user_id from autographamt_users where email_id=%s",(email,))
-			userId = cursor.fetchone()[0]
-			cursor.execute("select organisation_id from autographamt_organisations where user_id=%s",(userId,))
-			orgIds = cursor.fetchall()
-			orgIds = [row[0] for row in orgIds]
+			orgIds = list(getPrincipal().organisations)
 			if orgIds:
 				cursor.execute("select status from autographamt_projects where project_id=%s and organisation_id= ANY(%s::int[])",(projectId,'{'+','.join(str(n) for n in orgIds)+'}',))
 				row = cursor.fetchone()
@@ -2309,6 +2431,7 @@ def activateSource():
 			if status==False:
 				cursor.execute("update sources set status=true where source_id=%s",(sourceId,))
 				connection.commit()
+				sourceCatalog.invalidate()
 				return json.dumps({'success':True,'message':"Source re-activated."})
 			else:
 				return json.dumps({'success':False,'message':"Source already active."})
@@ -2408,6 +2531,7 @@ def delete_source(source_id):
 				if not rows:
 					cursor.execute("update sources set status=false where source_id=%s",(source_id,))
 					connection.commit()
+					sourceCatalog.invalidate()
 					return {"success":True, "message":"Source deactivated."}
 				else:
 					return {"success":False,"message":"Source is being used in project(s):"+','.join([r[0] for r in rows])}
@@ -2581,18 +2705,18 @@ def getBibles():
 def getBibleLanguages():
 	'''Return the list of bible languages.'''
 	connection = get_db()
-	cursor = connection.cursor()
-	cursor.execute("select distinct(language_id) from sources where content_id=1")
-	languageIds = [item[0] for item in cursor.fetchall()]
-	cursor.execute("select language_id, language_name, language_code from languages")
-	languagesDict = {
-		langId:{
-			"languageName":langName.capitalize(),
-			"languageCode":langCode,
-			"languageId": langId
-		} for langId, langName, langCode in cursor.fetchall()
-	}
-	languagesList = [languagesDict[x] for x in languageIds]
+	languageIds = []
+	for source in sourceCatalog.get_sources(connection):
+		if source.content_id == 1 and source.language_id not in languageIds:
+			languageIds.append(source.language_id)
+	languagesList = []
+	for languageId in languageIds:
+		language = sourceCatalog.get_language(connection, int(languageId))
+		languagesList.append({
+			"languageName":language.language_name.capitalize(),
+			"languageCode":language.language_code,
+			"languageId": language.language_id
+		})
 	return json.dumps(languagesList)
 
 @app.route("/v1/bibles/<sourceId>/books", methods=["GET"])
@@ -2600,22 +2724,20 @@ def getBibleBooks(sourceId):
 	'''Return the list of books in a Bible Language and Version.'''
 	connection = get_db()
 	cursor = connection.cursor()
-	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-	rst = cursor.fetchone()
-	if not rst:
+	source = getSource(sourceId)
+	if not source:
 		return json.dumps({"success": False, "message": "Invalid Source Id"})
-	cursor.execute("select book_id from "+rst[0])
+	cursor.execute(sql.SQL("select book_id from {}").format(sql.Identifier(source.table_name)))
 	bookLists = cursor.fetchall()
 	if not bookLists:
 		return json.dumps({"success": False, "message": "No Books uploaded yet"})
 	booksData = []
-	cursor.execute("select * from bible_books_look_up order by book_id")
 	booksDict = {}
-	for bibleBookID, bibleBookFullName, bibleBookCode in cursor.fetchall():
-		booksDict[bibleBookID] = {
-			"bibleBookID":bibleBookID,
-			"abbreviation": bibleBookCode,
-			"bibleBookFullName": bibleBookFullName.capitalize()
+	for book in sourceCatalog.get_books(connection):
+		booksDict[book.book_id] = {
+			"bibleBookID":book.book_id,
+			"abbreviation": book.book_code,
+			"bibleBookFullName": book.book_name.capitalize()
 		}
 	for book in bookLists:
 		if book[0] in booksDict:
@@ -2631,16 +2753,16 @@ def getBibleBooks(sourceId):
 	return json.dumps(bibleBooks)
 
 @app.route("/v1/bibles/<sourceId>/books-chapters", methods=["GET"])
+@cachedBibleContent()
 def getBibleBookChapters(sourceId):
 	'''Return the list of books and chapter Number in a Bible Language and Version.'''
 	connection = get_db()
 	cursor = connection.cursor()
-	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-	rst = cursor.fetchone()
-	if not rst:
+	source = getSource(sourceId)
+	if not source:
 		return json.dumps({"success": False, "message": "Invalid Source Id"})
 	cursor.execute( sql.SQL("select l.book_id,l.book_name,book_code,json_array_length(cast (json_text->'chapters' as json)) \
-		from {} b left join bible_books_look_up l on b.book_id=l.book_id").format(sql.Identifier(rst[0])))
+		from {} b left join bible_books_look_up l on b.book_id=l.book_id").format(sql.Identifier(source.table_name)))
 	bookLists = cursor.fetchall()
 	if not bookLists:
 		return json.dumps({"success": False, "message": "No Books uploaded yet"})
@@ -2661,20 +2783,28 @@ def getBibleBookChapters(sourceId):
 	return json.dumps(bibleBooks)
 
 @app.route("/v1/bibles/<sourceId>/<contentFormat>", methods=["GET"])
+@cachedBibleContent(artifactFormatArg="contentFormat")
 def getBible(sourceId, contentFormat):
-	'''Return the bible content for a particular Bible version and format.'''
+	'''
+	Return the bible content for a particular Bible version and format.
+	With stream=true the books are streamed one by one, and with archive=tar or zip the response
+	is an archive with a file per book.
+	'''
 	connection = get_db()
 	cursor = connection.cursor()
-	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-	rst = cursor.fetchone()
-	if not rst:
+	source = getSource(sourceId)
+	if not source:
 		return json.dumps({"success": False, "message": "Invalid Source Id"})
-	cursor.execute("select count(*) from "+rst[0])
+	if isExportRequest() and contentFormat.lower() in ('usfm', 'json'):
+		cursor.close()
+		return exportSource(source, contentFormat.lower(), lambda bookId, bookCode: bookCode,
+			prefix='{"sourceId": %s, "bibleContent": ' % json.dumps(sourceId), suffix='}')
+	cursor.execute(sql.SQL("select count(*) from {}").format(sql.Identifier(source.table_name)))
 	if not cursor.fetchone():
 		return json.dumps({"success": False, "message": "No Books uploaded yet"})
 	if contentFormat.lower() == 'usfm':
 		cursor.execute( sql.SQL("select l.book_code,b.usfm_text from {} b \
-			left join bible_books_look_up l on b.book_id=l.book_id").format(sql.Identifier(rst[0])))
+			left join bible_books_look_up l on b.book_id=l.book_id").format(sql.Identifier(source.table_name)))
 		bible_data = cursor.fetchall()
 		usfm_text = {}
 		for book,text in bible_data:
@@ -2682,7 +2812,7 @@ def getBible(sourceId, contentFormat):
 		usfmText = {"sourceId":sourceId,"bibleContent":usfm_text}
 	elif contentFormat.lower() == 'json':
 		cursor.execute( sql.SQL("select l.book_code,b.json_text from {} b \
-			left join bible_books_look_up l on b.book_id=l.book_id").format(sql.Identifier(rst[0])))
+			left join bible_books_look_up l on b.book_id=l.book_id").format(sql.Identifier(source.table_name)))
 		bible_data = cursor.fetchall()
 		json_text = {}
 		for book,text in bible_data:
@@ -2695,19 +2825,19 @@ def getBible(sourceId, contentFormat):
 
 
 @app.route("/v1/bibles/<sourceId>/books/<bookCode>/<contentFormat>", methods=["GET"])
+@cachedBibleContent("bookCode", artifactFormatArg="contentFormat")
 def getBook(sourceId,bookCode, contentFormat):
 	'''Return the content of a book in a particular version and format.'''
 	connection = get_db()
 	if contentFormat.lower() not in ["usfm","json"]:
 		return '{"success": false, "message":"Invalid Content Type"}'
 	cursor = connection.cursor()
-	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-	rst = cursor.fetchone()
-	if not rst[0]:
+	source = getSource(sourceId)
+	if not source:
 		return json.dumps({"success": False, "message": "Invalid Source Id"})
 	contentType="usfm_text" if contentFormat.lower() == "usfm" else "json_text"
 	cursor.execute( sql.SQL("select {} from {} b left join bible_books_look_up l \
-		on b.book_id=l.book_id where l.book_code=%s").format(sql.Identifier(contentType),sql.Identifier(rst[0])),[bookCode])
+		on b.book_id=l.book_id where l.book_code=%s").format(sql.Identifier(contentType),sql.Identifier(source.table_name)),[bookCode])
 	rst = cursor.fetchone()
 	if not rst[0]:
 		return json.dumps({"success": False, "message": "Book not uploaded"})
@@ -2717,19 +2847,19 @@ def getBook(sourceId,bookCode, contentFormat):
 	return json.dumps(usfmText)
 
 @app.route("/v1/bibles/<sourceId>/books/<biblebookCode>/chapters", methods=["GET"])
+@cachedBibleContent("biblebookCode")
 def getBibleChapters(sourceId, biblebookCode):
 	'''Return number of Chapters and chapter details for a book.'''
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-		rst = cursor.fetchone()
-		if not rst:
+		source = getSource(sourceId)
+		if not source:
 			return json.dumps({"success": False, "message": "Invalid Source Id"})
 
 		cursor.execute(sql.SQL("select book_name,json_array_length(cast (json_text->'chapters' as json)) \
 		from {} b left join bible_books_look_up l on b.book_id=l.book_id where book_code=%s").\
-			format(sql.Identifier(rst[0])),[biblebookCode.lower()])
+			format(sql.Identifier(source.table_name)),[biblebookCode.lower()])
 		bible_book_data = cursor.fetchone()
 		if not bible_book_data:
 			return '{"success":false, "message":"Book not uploaded"}'
@@ -2752,59 +2882,53 @@ def getBibleChapters(sourceId, biblebookCode):
 		return '{"success": false, "message":"%s"}' %(str(ex))
 
 @app.route("/v1/bibles/<sourceId>/books/<bookCode>/chapter/<chapterId>", methods=["GET"])
+# the previous and next chapters can be in other books
+@cachedBibleContent()
 def getChapter(sourceId,bookCode,chapterId):
 	'''Return the content of a given bible chapter.'''
 	connection = get_db()
-	cursor = connection.cursor()
 	bookCode=bookCode.lower()
-	cursor.execute("select book_id from bible_books_look_up where book_code=%s", (bookCode.lower(),))
-	bible_book_data = cursor.fetchone()
+	bible_book_data = getBibleBook(bookCode)
 	if not bible_book_data:
 		return '{"success":false, "message":"Invalid book code"}'
-	book_id = bible_book_data[0]
-	cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-	rst = cursor.fetchone()
-	if not rst:
+	book_id = bible_book_data.book_id
+	source = getSource(sourceId)
+	if not source:
 		return '{"success":false, "message":"Source doesn\'t exist"}'
-	table_name=rst[0]
-	cursor.execute(sql.SQL("select json_text->'chapters'->%s from {} where book_id=%s")\
-		.format(sql.Identifier(table_name)),[int(chapterId)-1,book_id])
-	chapter_content = cursor.fetchone()
-	if not chapter_content:
+	# the previous and next chapters are found in the navigation index of the bible
+	sourceBooks = getSourceBooks(source)
+	bookIds = [b_id for b_id, _, _ in sourceBooks]
+	if book_id not in bookIds:
 		return json.dumps({"success": False, "message": "Book not uploaded"})
+	position = bookIds.index(book_id)
+	chapter_count = sourceBooks[position][1] or 0
+	bookMap = getBibleBookIds()
 	#get data for next and previous chapters
 	prevChapter=int(chapterId)-1
 	previous={}
 	next={}
 	if(prevChapter > 0):
 		previous={"sourceId":sourceId, "bibleBookCode":bookCode, "chapterId":prevChapter}
-	else:
-		cursor.execute(sql.SQL("select book_code,json_array_length(cast (json_text->'chapters' as json)) from \
-			{} b left join bible_books_look_up l on b.book_id=l.book_id where b.book_id \
-				= (select max(book_id) from {} where book_id<%s)").format(sql.Identifier(table_name),sql.Identifier(table_name)),[bible_book_data[0]])
-		prev_book = cursor.fetchone()
-		if prev_book:
-			previous={"sourceId":sourceId, "bibleBookCode":prev_book[0], "chapterId":prev_book[1]}
-	#get chapter count and if next chapter less than chapter count return it else get next book
-	cursor.execute(sql.SQL("select json_array_length(cast (json_text->'chapters' as json)) from {} \
-		where book_id=%s").format(sql.Identifier(table_name)),[book_id])
-	chapter_count = cursor.fetchone()[0]
+	elif position > 0:
+		prev_book_id, prev_chapter_count, _ = sourceBooks[position - 1]
+		previous={"sourceId":sourceId, "bibleBookCode":bookMap[prev_book_id], "chapterId":prev_chapter_count}
 	nextChapter=int(chapterId)+1
 	if(nextChapter <= chapter_count):
 		next={"sourceId":sourceId, "bibleBookCode":bookCode, "chapterId":nextChapter}
-	else:
-		cursor.execute(sql.SQL("select book_code from bible_books_look_up where book_id = \
-			(select min(book_id) from {} where book_id>%s)").format(sql.Identifier(table_name)),[book_id])
-		next_book_id = cursor.fetchone()
-		if next_book_id:
-			next={"sourceId":sourceId, "bibleBookCode":next_book_id[0], "chapterId":1}
+	elif position + 1 < len(sourceBooks):
+		next={"sourceId":sourceId, "bibleBookCode":bookMap[sourceBooks[position + 1][0]], "chapterId":1}
 	chapterId=int(chapterId)-1
-	if (chapterId>=0 and chapterId<chapter_count):
-		usfmText = {"sourceId":sourceId,"bibleBookCode":bookCode,"chapterId":chapterId+1,
-			"previous":previous,"next":next,"chapterContent":chapter_content[0]}
-	else:
+	if not (chapterId>=0 and chapterId<chapter_count):
 		return json.dumps({"success": False, "message": "Invalid chapter id"})
+	cursor = connection.cursor()
+	cursor.execute(sql.SQL("select json_text->'chapters'->%s from {} where book_id=%s")\
+		.format(sql.Identifier(source.table_name)),[chapterId,book_id])
+	chapter_content = cursor.fetchone()
 	cursor.close()
+	if not chapter_content:
+		return json.dumps({"success": False, "message": "Book not uploaded"})
+	usfmText = {"sourceId":sourceId,"bibleBookCode":bookCode,"chapterId":chapterId+1,
+		"previous":previous,"next":next,"chapterContent":chapter_content[0]}
 	return json.dumps(usfmText)
 
 @app.route("/v1/bibles/<sourceId>/books/<biblebookCode>/chapters/<chapterId>/verses", methods=["GET"])
@@ -2813,19 +2937,16 @@ def getBibleVerses(sourceId, biblebookCode, chapterId):
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select book_id, book_name from bible_books_look_up \
-			where book_code=%s", (biblebookCode.lower(),))
-		bibleBookData = cursor.fetchone()
+		bibleBookData = getBibleBook(biblebookCode)
 		if not bibleBookData:
 			return '{"success":false, "message":"Invalid book code"}'
-		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-		tableName = cursor.fetchone()
-		if not tableName:
+		source = getSource(sourceId)
+		if not source:
 			return '{"success":false, "message":"Source doesn\'t exist"}'
 		startId = int(bibleBookData[0]) * 1000000 + (int(chapterId) * 1000)
 		endId = int(bibleBookData[0]) * 1000000 + ((int(chapterId) + 1) * 1000)
 		cursor.execute(sql.SQL("select ref_id from {} where ref_id > %s and ref_id < %s order by ref_id").\
-			format(sql.Identifier(tableName[0] + "_cleaned")), [startId, endId])
+			format(sql.Identifier(source.table_name + "_cleaned")), [startId, endId])
 		refIdsList = [x[0] for x in cursor.fetchall()]
 		verseList = []
 		for ref in refIdsList:
@@ -2856,19 +2977,16 @@ def getBibleVerseText(sourceId, bibleBookCode, chapterId, verseId):
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select book_id, book_name from bible_books_look_up \
-			where book_code=%s", (bibleBookCode.lower(),))
-		bibleBookData = cursor.fetchone()
+		bibleBookData = getBibleBook(bibleBookCode)
 		if not bibleBookData:
 			return '{"success":false, "message":"Invalid book code"}'
-		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-		tableName = cursor.fetchone()
-		if not tableName:
+		source = getSource(sourceId)
+		if not source:
 			return '{"success":false, "message":"Source doesn\'t exist"}'
 		bookId = bibleBookData[0]
 		ref_id = int(str(bookId).zfill(2) + chapterId.zfill(3) + verseId.zfill(3))
 		cursor.execute(sql.SQL("select verse from {} where ref_id=%s").\
-			format(sql.Identifier(tableName[0] + "_cleaned")), [ref_id])
+			format(sql.Identifier(source.table_name + "_cleaned")), [ref_id])
 		verse = cursor.fetchone()
 		if not verse:
 			return '{"success": false, "message":"No verse found"}'
@@ -2895,19 +3013,16 @@ def getBibleVerses2(sourceId, chapterId):
 			bookCode, chapterNumber = chapterId.split('.')
 		except:
 			return '{"success": false, "message":"Invalid Chapter id format."}'
-		cursor.execute("select book_id, book_name from bible_books_look_up \
-			where book_code=%s", (bookCode.lower(),))
-		bibleBookData = cursor.fetchone()
+		bibleBookData = getBibleBook(bookCode)
 		if not bibleBookData:
 			return '{"success":false, "message":"Invalid book code"}'
-		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-		tableName = cursor.fetchone()
-		if not tableName:
+		source = getSource(sourceId)
+		if not source:
 			return '{"success":false, "message":"Source doesn\'t exist"}'
 		startId = int(bibleBookData[0]) * 1000000 + (int(chapterNumber) * 1000)
 		endId = int(bibleBookData[0]) * 1000000 + ((int(chapterNumber) + 1) * 1000)
 		cursor.execute(sql.SQL("select ref_id from {} where ref_id > %s and ref_id < %s order by ref_id").\
-			format(sql.Identifier(tableName[0] + "_cleaned")), [startId, endId])
+			format(sql.Identifier(source.table_name + "_cleaned")), [startId, endId])
 		refIdsList = [x[0] for x in cursor.fetchall()]
 		verseList = []
 		for ref in refIdsList:
@@ -2942,19 +3057,16 @@ def getBibleVerseText2(sourceId, verseId):
 			bookCode, chapterNumber, verseNumber = verseId.split('.')
 		except:
 			return '{"success": false, "message":"Invalid Verse id format."}'
-		cursor.execute("select book_id, book_name from bible_books_look_up \
-			where book_code=%s", (bookCode.lower(),))
-		bibleBookData = cursor.fetchone()
+		bibleBookData = getBibleBook(bookCode)
 		if not bibleBookData:
 			return '{"success":false, "message":"Invalid book code"}'
-		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-		tableName = cursor.fetchone()
-		if not tableName:
+		source = getSource(sourceId)
+		if not source:
 			return '{"success":false, "message":"Source doesn\'t exist"}'
 		bookId = bibleBookData[0]
 		ref_id = int(str(bookId).zfill(2) + chapterNumber.zfill(3) + verseNumber.zfill(3))
 		cursor.execute(sql.SQL("select verse from {} where ref_id=%s").\
-			format(sql.Identifier(tableName[0] + "_cleaned")), [ref_id])
+			format(sql.Identifier(source.table_name + "_cleaned")), [ref_id])
 		verse = cursor.fetchone()
 		if not verse:
 			return '{"success": false, "message":"No verse found"}'
@@ -2971,6 +3083,102 @@ def getBibleVerseText2(sourceId, verseId):
 	except Exception as ex:
 		return '{"success":false, "message":"%s"}' %(str(ex))
 
+@app.route("/v1/bibles/<sourceId>/verses", methods=["GET"])
+@cachedBibleContent()
+def getBibleVersesText(sourceId):
+	'''
+	Return the verses of a list of references, for a given Bible, with one query.
+	Query param references: comma separated references, each a book, chapter(s) or verse(s),
+	like jhn.3.16-18,rom.8,gen.1.1-2.3,jud
+	'''
+	referenceList = references.split_references(request.args.get("references", ""))
+	if not referenceList:
+		return '{"success":false, "message":"No references given"}'
+	if len(referenceList) > references.MAX_REFERENCES:
+		return '{"success":false, "message":"Too many references, at most %s can be read at once"}' \
+			% references.MAX_REFERENCES
+	source = getSource(sourceId)
+	if not source or source.content_type != 'bible':
+		return '{"success":false, "message":"Invalid source Id"}'
+	try:
+		ranges = [references.parse_reference(reference, getBibleBook) for reference in referenceList]
+	except references.InvalidReferenceError as ex:
+		return json.dumps({"success": False, "message": str(ex)})
+	try:
+		cursor = get_db().cursor()
+		rows = references.get_verses(cursor, source.table_name + "_cleaned", ranges)
+		cursor.close()
+	except Exception as ex:
+		log.error("Exception in getBibleVersesText: %s", ex)
+		get_db().rollback()
+		return '{"success":false, "message":"Server error"}'
+	bookMap = {book.book_id: book for book in sourceCatalog.get_books(get_db())}
+	result = [{"reference": reference, "verses": []} for reference in referenceList]
+	for position, ref_id, verse in rows:
+		book = bookMap[ref_id // 1000000]
+		chapterNumber = ref_id // 1000 % 1000
+		verseNumber = ref_id % 1000
+		result[position - 1]["verses"].append({
+			"bibleBookCode": book.book_code,
+			"chapterNumber": chapterNumber,
+			"verseNumber": verseNumber,
+			"reference": book.book_name.title() + " %s:%s" % (chapterNumber, verseNumber),
+			"verseContent": {
+				"text": verse
+			}
+		})
+	return json.dumps({"sourceId": sourceId, "references": result})
+
+@app.route("/v1/bibles/parallel", methods=["GET"])
+def getParallelBibles():
+	'''
+	Return the verses of several Bibles side by side, aligned by verse.
+	Query params: sources, the comma separated source ids (at most 10), and either reference,
+	one reference like jhn.3 or jhn.3.16-4.3, or startRefId and endRefId. At most 20000 verses
+	are read over all the sources, that is a whole book for a few sources.
+	Each verse has the text of each source, in the order of the sources: null if the source
+	does not have the verse, and "" if the verse is merged in a previous verse of the source.
+	'''
+	sourceIds = [sourceId.strip() for sourceId in request.args.get("sources", "").split(",") if sourceId.strip()]
+	if not sourceIds:
+		return '{"success":false, "message":"No sources given"}'
+	if len(sourceIds) > 10:
+		return '{"success":false, "message":"At most 10 sources can be compared"}'
+	sources = []
+	for sourceId in sourceIds:
+		source = getSource(sourceId)
+		if not source or source.content_type != 'bible':
+			return '{"success":false, "message":"Invalid source Id, '+sourceId+'"}'
+		sources.append(source)
+	try:
+		if "reference" in request.args:
+			start, end = references.parse_reference(request.args["reference"], getBibleBook)
+		elif "startRefId" in request.args and "endRefId" in request.args:
+			start, end = int(request.args["startRefId"]), int(request.args["endRefId"])
+		else:
+			return '{"success":false, "message":"Give a reference, or startRefId and endRefId"}'
+	except ValueError as ex:
+		return json.dumps({"success": False, "message": str(ex)})
+	if getVersification().verses_between(start, end) * len(sources) > references.MAX_PARALLEL_VERSES:
+		return '{"success":false, "message":"Too many verses. At most %s verses (times the number of sources) can be compared"}' \
+			% references.MAX_PARALLEL_VERSES
+	cursor = get_db().cursor()
+	rows = references.get_parallel_verses(cursor, [source.table_name + "_cleaned" for source in sources], start, end)
+	cursor.close()
+	bookMap = getBibleBookIds()
+	verses = []
+	for ref_id, position, text in rows:
+		if not verses or verses[-1]["refId"] != ref_id:
+			verses.append({
+				"refId": ref_id,
+				"bibleBookCode": bookMap.get(ref_id // 1000000),
+				"chapterNumber": ref_id // 1000 % 1000,
+				"verseNumber": ref_id % 1000,
+				"texts": [None] * len(sources)
+			})
+		verses[-1]["texts"][position] = text
+	return json.dumps({"sources": [source.source_id for source in sources], "verses": verses})
+
 def getContentId(cursor,contentType):
 	'''Get content type id for given content type name'''
 	cursor.execute("select content_id from content_types where content_type=%s", (contentType,))
@@ -3048,6 +3256,7 @@ def addCommentarySource():
 			execute_values(cursor,sql.SQL('insert into {} (book_id, chapter, verse, commentary) values %s').format(sql.Identifier(tableName)),
 				commentaryData)
 			connection.commit()
+			sourceCatalog.invalidate()
 			cursor.close()
 			return '{"success": true, "message":"Commentary added successfully"}'
 		else:
@@ -3123,33 +3332,25 @@ def getCommentaryChapter(sourceId,bookCode,chapterId):
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select s.metadata->'Copyright' from sources s where source_id=%s and content_id \
-			in(select content_id from content_types where content_type = 'commentary')", (sourceId,))
-		rst = cursor.fetchone()
-		if not rst:
+		source = getSource(sourceId)
+		if not source or source.content_type != 'commentary':
 			return '{"success":false, "message":"Invalid commentary sourceId"}'
-		if rst[0] and rst[0] =="True":
+		if source.metadata and source.metadata.get("Copyright") == "True":
 			#If copyright commentary then check if authorised
 			authorised = checkAuthorised(cursor,request.args.get('key'))
 			if not authorised:
 				return '{"success":false, "message":"Not authorised"}'
 		bookCode=bookCode.lower()
 		#Get bible book id
-		cursor.execute("select book_id from bible_books_look_up where book_code=%s", (bookCode.lower(),))
-		bible_book_data = cursor.fetchone()
+		bible_book_data = getBibleBook(bookCode)
 		if not bible_book_data:
 			return '{"success":false, "message":"Invalid book code"}'
-		book_id = bible_book_data[0]
+		book_id = bible_book_data.book_id
 		#Validate chapter
-		cursor.execute("select count(*) from bcv_map where book=%s and chapter=%s;", (book_id,chapterId,))
-		rst = cursor.fetchone()
-		if not rst[0]:
+		if not chapterId.isdigit() or not getVersification().has_chapter(book_id, int(chapterId)):
 			return '{"success":false, "message":"Invalid chapter"}'
 		#Get commentary table
-		cursor.execute("select table_name from sources where source_id=%s and content_id in(select \
-			content_id from content_types where content_type = 'commentary')", (sourceId,))
-		rst = cursor.fetchone()
-		table_name=rst[0]
+		table_name=source.table_name
 		#Get commentary
 		cursor.execute(sql.SQL("select verse,commentary from {} where book_id=%s and chapter=%s \
 			order by verse").format(sql.Identifier(table_name)),[book_id,int(chapterId)])
@@ -3220,6 +3421,7 @@ def addDictionarySource():
 			execute_values(cursor,sql.SQL('insert into {} (keyword, wordforms, strongs, definition, translationhelp, seealso, \
 				ref, examples) values %s').format(sql.Identifier(tableName)),dictionaryData)
 			connection.commit()
+			sourceCatalog.invalidate()
 			cursor.close()
 			return '{"success": true, "message":"Dictionary added successfully"}'
 		else:
@@ -3295,12 +3497,10 @@ def getDictionaryWords(sourceId):
 		connection = get_db()
 		cursor = connection.cursor()
 		#Get dictionary table
-		cursor.execute("select table_name from sources where source_id=%s and content_id in(select \
-			content_id from content_types where content_type = 'translation_words')", (sourceId,))
-		rst = cursor.fetchone()
-		if not rst:
+		source = getSource(sourceId)
+		if not source or source.content_type != 'translation_words':
 			return '{"success":false, "message":"Invalid dictionary sourceId"}'
-		table_name=rst[0]
+		table_name=source.table_name
 		#Get dictionary
 		cursor.execute(sql.SQL("select id,wordforms from {} order by keyword")
 			.format(sql.Identifier(table_name)))
@@ -3326,12 +3526,10 @@ def getDictionaryWord(sourceId,wordId):
 		connection = get_db()
 		cursor = connection.cursor()
 		#Get dictionary table
-		cursor.execute("select table_name from sources where source_id=%s and content_id in(select \
-			content_id from content_types where content_type = 'translation_words')", (sourceId,))
-		rst = cursor.fetchone()
-		if not rst:
+		source = getSource(sourceId)
+		if not source or source.content_type != 'translation_words':
 			return '{"success":false, "message":"Invalid dictionary sourceId"}'
-		table_name=rst[0]
+		table_name=source.table_name
 		#Get dictionary
 		cursor.execute(sql.SQL("select * from {} where id=%s")
 			.format(sql.Identifier(table_name)),[int(wordId)])
@@ -3398,6 +3596,7 @@ def addInfographicSource():
 			execute_values(cursor,sql.SQL('insert into {} (book_id, title, file_name) values %s').
 				format(sql.Identifier(tableName)),infographicData)
 			connection.commit()
+			sourceCatalog.invalidate()
 			cursor.close()
 			return '{"success": true, "message":"Infographics added successfully"}'
 		else:
@@ -3708,33 +3907,48 @@ def getBookNames():
 
 @app.route("/v1/search/<sourceId>", methods=["GET"])
 def searchBible(sourceId):
-	'''Fetch the bible verses with the given keyword in the specified sourceId clear text bible'''
+	'''Fetch the bible verses with the given keyword in the specified sourceId clear text bible.
+	The verses are ranked by relevance. A keyword within double quotes is searched as a phrase.
+	Optional query params: book (book code), chapter, offset and limit'''
 	try:
 		connection = get_db()
 		cursor = connection.cursor()
-		cursor.execute("select table_name from sources where source_id=%s", (sourceId,))
-		tableName = cursor.fetchone()
-		if not tableName:
+		source = getSource(sourceId)
+		if not source:
 			return '{"success":false, "message":"Invalid source Id"}'
 		keyword = request.args.get('keyword')
-		if not keyword:
+		if not keyword or not keyword.strip('" '):
 			return '{"success":false, "message":"Keyword empty"}'
-		cursor.execute("select book_id,book_code from bible_books_look_up")
-		rst = cursor.fetchall()
-		bookMap={}
-		for book_id,book_code in rst:
-			bookMap[str(book_id)]=book_code
-		cursor.execute(sql.SQL("select ref_id,verse from {} where verse ~* {}").\
-			format(sql.Identifier(tableName[0] + "_cleaned"),sql.Literal(keyword)))
-		rst = cursor.fetchall()
-		if not rst:
+		bookId = None
+		chapter = None
+		if request.args.get('book'):
+			bibleBookData = getBibleBook(request.args.get('book'))
+			if not bibleBookData:
+				return '{"success":false, "message":"Invalid book code"}'
+			bookId = bibleBookData.book_id
+		try:
+			if request.args.get('chapter'):
+				if bookId is None:
+					return '{"success":false, "message":"Book required for chapter filter"}'
+				chapter = int(request.args.get('chapter'))
+			offset = int(request.args.get('offset', 0))
+			limit = int(request.args.get('limit', search.DEFAULT_LIMIT))
+		except ValueError:
+			return '{"success":false, "message":"Invalid chapter, offset or limit"}'
+		if offset < 0 or limit < 1 or limit > search.MAX_LIMIT:
+			return '{"success":false, "message":"offset should be positive and limit between 1 and %s"}' % (search.MAX_LIMIT)
+		cleanTableName = source.table_name + "_cleaned"
+		total, rst = search.search_verses(cursor, cleanTableName, keyword, bookId, chapter, offset, limit)
+		cursor.close()
+		if not total:
 			return '{"success":false, "message":"Keyword not found in bible"}'
+		bookMap = getBibleBookIds()
 		result =[]
 		for ref_id,verse in rst:
-			ref = str(ref_id)
-			bookCode = bookMap[ref[-8:-6]]
-			result.append({'bookCode':bookCode,'chapter':int(ref[-6:-3]),'verse': int(ref[-3:]),'text':verse})
-		searchResult = {'sourceId':sourceId,'keyword':keyword,'result':result}
+			result.append({'bookCode':bookMap[ref_id // 1000000],'chapter':ref_id // 1000 % 1000,
+				'verse': ref_id % 1000,'text':verse})
+		searchResult = {'sourceId':sourceId,'keyword':keyword,'total':total,'offset':offset,
+			'limit':limit,'result':result}
 		return json.dumps(searchResult)
 	except Exception as ex:
 		traceback.print_exc()
@@ -3766,6 +3980,7 @@ def addmetadata():
 		metadata.update(newMetadata)
 		cursor.execute(sql.SQL("update sources set metadata=%s where source_id=%s"),(json.dumps(metadata),int(sourceId)))
 		connection.commit()
+		sourceCatalog.invalidate()
 		cursor.close()
 		log.info("Metadata Updated Successfully to SourceId: %s",sourceId)
 		return '{"success":true, "message":"Metadata Updated"}'
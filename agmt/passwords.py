@@ -0,0 +1,163 @@
+import os
+import time
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import scrypt
+
+
+class HasherBusyError(Exception):
+	'''Raised when the password hashing pool already has as many requests as it can queue.'''
+	pass
+
+
+class PasswordHasher(object):
+	'''
+	Runs scrypt in a pool of `workers` processes, so that hashing passwords does not take the
+	CPU of the threads serving the other requests. At most `max_pending` hashes (running and
+	queued) are accepted at a time, beyond that hash() fails right away with HasherBusyError. A hash
+	that takes longer than `timeout` seconds also fails with HasherBusyError, and the pool, which
+	may be stuck, is replaced, as is a pool one of whose processes died.
+	The pool is created on first use in each (gunicorn) worker process.
+	'''
+
+	def __init__(self, workers=2, max_pending=8, timeout=10):
+		self.workers = workers
+		self.max_pending = max_pending
+		self.timeout = timeout
+		self._slots = threading.BoundedSemaphore(max_pending)
+		self._lock = threading.Lock()
+		self._executor = None
+		self._pid = None
+		self._stats = {"hashed": 0, "rejected": 0, "timedOut": 0, "broken": 0}
+
+	def _get_executor(self):
+		with self._lock:
+			if self._executor is None or self._pid != os.getpid():
+				# spawned, not forked, processes as the API workers run threads
+				self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+				self._pid = os.getpid()
+			return self._executor
+
+	def _reset_executor(self):
+		with self._lock:
+			if self._executor is not None and self._pid == os.getpid():
+				self._executor.shutdown(wait=False)
+			self._executor = None
+
+	def hash(self, password, salt):
+		'''Returns scrypt.hash(password, salt), computed in the pool.'''
+		if not self._slots.acquire(blocking=False):
+			with self._lock:
+				self._stats["rejected"] += 1
+			raise HasherBusyError("password hashing pool is busy")
+		try:
+			try:
+				future = self._get_executor().submit(scrypt.hash, password, salt)
+			except BrokenProcessPool:
+				self._reset_executor()
+				future = self._get_executor().submit(scrypt.hash, password, salt)
+			try:
+				result = future.result(self.timeout)
+			except FutureTimeoutError:
+				future.cancel()
+				self._reset_executor()
+				with self._lock:
+					self._stats["timedOut"] += 1
+				raise HasherBusyError("password hashing timed out")
+			except BrokenProcessPool:
+				# a process of the pool died while hashing, the next hash gets a new pool
+				self._reset_executor()
+				with self._lock:
+					self._stats["broken"] += 1
+				raise HasherBusyError("password hashing pool failed")
+			with self._lock:
+				self._stats["hashed"] += 1
+			return result
+		finally:
+			self._slots.release()
+
+	def stats(self):
+		with self._lock:
+			return dict(self._stats, workers=self.workers, maxPending=self.max_pending)
+
+
+class LoginThrottle(object):
+	'''
+	Counts the failed logins of each email and of each client address in a sliding window
+	of `window` seconds. An email or an address with too many failures is refused without
+	checking its password, until its oldest failure leaves the window.
+	'''
+
+	def __init__(self, max_email_failures=5, max_address_failures=20, window=300, maxsize=100000):
+		self.limits = {"email": max_email_failures, "address": max_address_failures}
+		self.window = window
+		self.maxsize = maxsize
+		self._lock = threading.Lock()
+		self._failures = {}    # (kind, key) -> deque of failure times
+		self._stats = {"throttled": 0}
+
+	def _recent(self, kind, key, now):
+		failures = self._failures.get((kind, key))
+		if failures is None:
+			return 0
+		while failures and failures[0] < now - self.window:
+			failures.popleft()
+		if not failures:
+			del self._failures[(kind, key)]
+			return 0
+		return len(failures)
+
+	def is_blocked(self, email, address):
+		now = time.time()
+		with self._lock:
+			blocked = self._recent("email", email, now) >= self.limits["email"] or \
+				self._recent("address", address, now) >= self.limits["address"]
+			if blocked:
+				self._stats["throttled"] += 1
+			return blocked
+
+	def failed(self, email, address):
+		now = time.time()
+		with self._lock:
+			for kind, key in (("email", email), ("address", address)):
+				self._failures.setdefault((kind, key), deque(maxlen=self.limits[kind])).append(now)
+			if len(self._failures) > self.maxsize:
+				# forget the emails and addresses without any failure left in the window
+				for kindKey in [k for k, failures in self._failures.items() if failures[-1] < now - self.window]:
+					del self._failures[kindKey]
+
+	def succeeded(self, email):
+		with self._lock:
+			self._failures.pop(("email", email), None)
+
+	def stats(self):
+		with self._lock:
+			return dict(self._stats, tracked=len(self._failures))
+
+
+class LatencyRecorder(object):
+	'''Keeps the durations of the last `size` calls, to report their percentiles.'''
+
+	def __init__(self, size=1000):
+		self._lock = threading.Lock()
+		self._samples = deque(maxlen=size)
+		self._count = 0
+
+	def record(self, seconds):
+		with self._lock:
+			self._samples.append(seconds)
+			self._count += 1
+
+	def stats(self):
+		with self._lock:
+			samples = sorted(self._samples)
+			count = self._count
+		result = {"count": count}
+		if samples:
+			for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+				result[name + "Ms"] = round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 1)
+			result["maxMs"] = round(samples[-1] * 1000, 1)
+		return result
@@ -1,8 +1,10 @@
-import psycopg2, re
+import psycopg2, re, io, csv, json, threading
+from collections import OrderedDict
 from psycopg2 import sql
 import spacy
 from spacy.matcher import Matcher
 from gensim.models.phrases import Phrases
+import projectstats
 
 # the puctuations that are removed from text for getting a clean text
 # "-" is left out intentionally in this list because, it is ofter used in text to show compund words
@@ -260,6 +262,124 @@ def extract_phrases_rulebased(conn,lang,version,start=None,end=None):
 
 
 
+#############Phrase models #######################
+
+# the phrases found in the whole text of a bible, for the algos that use the whole text
+def extract_phrases(conn,lang,version,algo):
+	if (algo == 'gensim'):
+		phrases = extract_phrases_gensim(conn,lang,version)
+	elif( algo == 'ngram'):
+		phrases = extract_phrases_naivestat(conn,lang,version)
+	elif ( algo == 'gensim-ngram'):
+		phrases = extract_phrases_gensim(conn,lang,version)
+		phrases2 = extract_phrases_naivestat(conn,lang,version)
+		for i,ph in enumerate(phrases2):
+			if ph not in phrases:
+				phrases[ph] = phrases2[ph]
+			if i > 250:
+				break
+	return phrases
+
+# a hash of the cleaned text of a bible, which changes when a book is uploaded
+def cleaned_text_hash(conn,source_table):
+	cursor = conn.cursor()
+	cursor.execute(sql.SQL("select md5(coalesce(string_agg(ref_id::text || ' ' || coalesce(verse, ''), E'\\n' \
+		order by ref_id), '')) from {};").format(sql.Identifier(source_table)))
+	content_hash = cursor.fetchone()[0]
+	cursor.close()
+	return content_hash
+
+# returns the phrases of the bible for the algo. The phrases are saved in the phrase_models table
+# along with the hash of the text they were found in, and are found again
+# only if the text has changed since, that is after a book has been uploaded
+def get_phrases(conn,lang,version,algo):
+	source_table = lang+'_'+version+'_bible_cleaned'
+	content_hash = cleaned_text_hash(conn,source_table)
+	cursor = conn.cursor()
+	cursor.execute("select exists (select * from information_schema.tables where table_name= %s)",('phrase_models',))
+	tableExists = cursor.fetchone()[0]
+	if not tableExists:
+		cursor.execute("CREATE TABLE IF NOT EXISTS phrase_models(source_table TEXT NOT NULL, algo TEXT NOT NULL, \
+			content_hash TEXT NOT NULL, phrases JSONB NOT NULL, created_at timestamp with time zone \
+				DEFAULT CURRENT_TIMESTAMP(2), PRIMARY KEY (source_table, algo))")
+		conn.commit()
+	cursor.execute("select phrases from phrase_models where source_table=%s and algo=%s and content_hash=%s",
+		(source_table,algo,content_hash))
+	rst = cursor.fetchone()
+	if rst:
+		cursor.close()
+		return rst[0]
+	phrases = extract_phrases(conn,lang,version,algo)
+	cursor.execute("insert into phrase_models (source_table, algo, content_hash, phrases) values (%s,%s,%s,%s) \
+		on conflict (source_table, algo) do update set content_hash=excluded.content_hash, \
+			phrases=excluded.phrases, created_at=CURRENT_TIMESTAMP(2)",
+		(source_table,algo,content_hash,json.dumps(phrases,default=float)))
+	conn.commit()
+	cursor.close()
+	return phrases
+
+
+#############Phrase matching #######################
+
+# marks the node of the phrase trie where a phrase ends
+_phrase_end = None
+
+# the phrase tries built by tokenize, by (lang, version), along with the set of phrases each was built from
+phrase_tries = {}
+
+# builds a trie of words from the phrases of at least min_words words. By default single words
+# are not put in the trie, as every word that is not part of a phrase becomes a token anyway
+def build_phrase_trie(phrases,min_words=2):
+	trie = {}
+	for ph in phrases:
+		words = ph.split(' ')
+		if len(words) < min_words:
+			continue
+		node = trie
+		for w in words:
+			node = node.setdefault(w,{})
+		node[_phrase_end] = True
+	return trie
+
+# returns the phrase trie for the phrases of a (lang, version), building it only if the phrases have changed
+def get_phrase_trie(lang,version,phrases):
+	phrase_set = frozenset(phrases)
+	cached = phrase_tries.get((lang,version))
+	if cached and cached[0] == phrase_set:
+		return cached[1]
+	trie = build_phrase_trie(phrase_set)
+	phrase_tries[(lang,version)] = (phrase_set,trie)
+	return trie
+
+# finds the phrases (of min_words to max_words words) in a list of words, longest first and then
+# from left to right, skipping the ones that overlap with a phrase already taken.
+# returns the (start, length) of the phrases taken and the flags of the words that are part of them
+def match_phrases(trie,words,min_words=2,max_words=None):
+	N = len(words)
+	if max_words is None:
+		max_words = N
+	matches = []
+	for i in range(N):
+		node = trie
+		for j in range(i,min(N,i+max_words)):
+			node = node.get(words[j])
+			if node is None:
+				break
+			if _phrase_end in node and j-i+1 >= min_words:
+				matches.append((j-i+1,i))
+	matches.sort(key=lambda m:(-m[0],m[1]))
+	taken = [False]*N
+	phrases_taken = []
+	for n,i in matches:
+		if any(taken[i:i+n]):
+			continue
+		for index in range(i,i+n):
+			taken[index] = True
+		phrases_taken.append((i,n))
+	return phrases_taken,taken
+
+
+
 # The method can identify phrases from all the available text for the specified lang and version
 # Then generate the tokens(if possible phrases, other wise words)
 # for the selected Book.
@@ -278,28 +398,16 @@ def tokenize(conn,lang,version,book_id,algo='gensim-ngram'):
 	print(lang, version, book_id)
 	start_refid = book_id * 1000000
 	end_refid = start_refid + 1000000
-	if (algo == 'gensim'):
-		phrases = extract_phrases_gensim(conn,lang,version)
-	elif( algo == 'ngram'):
-		phrases = extract_phrases_naivestat(conn,lang,version)
-		# print(phrases.keys())
-		# return
-	elif( algo == 'rule-based'):
+	if( algo == 'rule-based'):
 		phrases = extract_phrases_rulebased(conn,lang,version,start=start_refid,end=end_refid)
 	elif( algo == 'single-word'):
 		phrases = {}
-	elif ( algo == 'gensim-ngram'):
-		phrases = extract_phrases_gensim(conn,lang,version)
-		phrases2 = extract_phrases_naivestat(conn,lang,version)
-		for i,ph in enumerate(phrases2):
-			if ph not in phrases:
-				phrases[ph] = phrases2[ph]
-			if i > 250:
-				break
+	else:
+		phrases = get_phrases(conn,lang,version,algo)
 	print('stop words')
-	stop_words = []
+	stop_words = set()
 	if lang == 'hi' or lang == 'hin':
-		stop_words = hi_stop_words
+		stop_words = set(hi_stop_words)
 
 	cursor = conn.cursor()
 	tw_table = lang+'_tw'
@@ -334,49 +442,47 @@ def tokenize(conn,lang,version,book_id,algo='gensim-ngram'):
 	if not tableExists:
 		cursor.execute(sql.SQL("CREATE TABLE {}(book_id INT NOT NUll, token TEXT NOT NULL)").format(sql.Identifier(token_table)))
 		conn.commit()
-	else:
-		# in the assumption that tokenization would always be done for one book at a time
-		cursor.execute(sql.SQL("DELETE FROM {} WHERE book_id=%s ;").format(sql.Identifier(token_table)),(book_id,))
-		conn.commit()		
+	# the books a token is in, used to find the books with translated tokens
+	cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} (token, book_id)").format(
+		sql.Identifier(token_table+'_token_idx'),sql.Identifier(token_table)))
+	conn.commit()
 
-	tokens = []
+	trie = get_phrase_trie(lang,version,phrases)
+	tokens = set()
 	for row in verses:
 		ref_id = row[0]
 		word_split_text = row[1]
-		N = len(word_split_text)
-		taken = [False for i in range(N)]
-		for n in range(N,1,-1):
-			for i in range(N-n+1):
-				chunk = word_split_text[i:i+n]
-				if ' '.join(chunk) in phrases:
-					taken_check = False
-					for index in range(i,i+n):
-						if taken[index]:
-							taken_check = True
-							break
-					if taken_check == False:
-						for index in range(i,i+n):
-							taken[index] = True
-						phrase = ' '.join(word_split_text[i:i+n])
-						if phrase not in tokens: 
-							tokens.append(phrase)
+		phrases_taken,taken = match_phrases(trie,word_split_text)
+		tokens.update(' '.join(word_split_text[i:i+n]) for i,n in phrases_taken)
 		for i,flag in enumerate(taken):
 			if not flag:
 				word_token = word_split_text[i]
-				if word_token not in stop_words and word_token not in tokens:
-					tokens.append(word_token)
+				if word_token not in stop_words:
+					tokens.add(word_token)
 
 	sorted_tokens = sorted(tokens)
 	tokens = []
 	for tok in sorted_tokens:
 		if not any(char.isdigit() for char in tok):
 			tokens.append(tok)
-	for tok in tokens:
-		cursor.execute(sql.SQL("INSERT INTO {} (book_id, token) VALUES(%s,%s)").format(sql.Identifier(token_table)),(book_id,tok))
-		# print(tok)
+	save_tokens(cursor,token_table,book_id,tokens)
+	projectstats.refresh_book(cursor,token_table,book_id)
 	conn.commit()
 	cursor.close()
 
+# replaces the tokens of a book, in the transaction of the cursor, so that the
+# readers see either the old or the new tokens of the book and never a part of them.
+# the rows are streamed to the table with a single COPY
+def save_tokens(cursor,token_table,book_id,tokens):
+	# in the assumption that tokenization would always be done for one book at a time
+	cursor.execute(sql.SQL("DELETE FROM {} WHERE book_id=%s ;").format(sql.Identifier(token_table)),(book_id,))
+	buf = io.StringIO()
+	writer = csv.writer(buf,quoting=csv.QUOTE_NONNUMERIC)
+	for tok in tokens:
+		writer.writerow((book_id,tok))
+	buf.seek(0)
+	cursor.copy_expert(sql.SQL("COPY {} (book_id, token) FROM STDIN WITH (FORMAT csv)").format(sql.Identifier(token_table)),buf)
+
 
 
 ##############################################################################
@@ -388,66 +494,77 @@ def tokenize(conn,lang,version,book_id,algo='gensim-ngram'):
 
 ################################ Draft Generation ############################
 
-tokenTranslatedDict = {}
-
-def loadPhraseTranslations(conn, projectId):
-	global tokenTranslatedDict
+# the token translations of a project, which translates a text by replacing the
+# longest phrases (and words) having a translation with their translation
+class TranslationLexicon(object):
+	def __init__(self,translations):
+		self.translations = translations
+		self.trie = build_phrase_trie(translations,min_words=1)
+
+	# the phrases are looked up from N-1 words down to single words, N being the number of
+	# words in the text, so a text of one word is not translated
+	def translate_text(self,text_snippet):
+		words_in_text = re.split(r"\s",text_snippet)
+		N = len(words_in_text)
+		phrases_taken,taken = match_phrases(self.trie,words_in_text,min_words=1,max_words=N-1)
+		translation = list(words_in_text)
+		for i,n in phrases_taken:
+			translation[i] = self.translations[' '.join(words_in_text[i:i+n])]
+			for pos in range(i+1,i+n):
+				translation[pos] = ''
+		translation = " ".join(translation)
+		return translation
+
+# pulls the token translations of a project from DB
+# returns a TranslationLexicon, or None if the project has no translations
+def load_translation_lexicon(conn, projectId):
 	cursor = conn.cursor()
-	# cursor.execute("select token, translation from translations where source_id=%s \
-    #     and target_id=%s", (sourceId, targetLanguageId))
-	# rst = cursor.fetchall()
 	cursor.execute("select t.token, t.translation from translations t left join \
-        translation_projects_look_up l on t.translation_id=l.translation_id where l.project_id=%s \
-        ", (projectId,))
-
+		translation_projects_look_up l on t.translation_id=l.translation_id where l.project_id=%s \
+		", (projectId,))
 	rst = cursor.fetchall()
+	cursor.close()
 	if rst:
-		tokenTranslatedDict = {k:v for k,v in rst}
-		return True
+		return TranslationLexicon({k:v for k,v in rst})
 	else:
 		print("!!!!Error: token translations not obtained!!!")
-		return False
-
-
-def getNgrams(sent,n):
-	ngrams = []
-	for i in range(len(sent)):
-		if i+n <= len(sent)+1:
-			ngrams.append(sent[i:i+n-1])
-	return ngrams
-
-
-
-def translateText(text_snippet):
-	words_in_text = re.split(r"\s",text_snippet)
-
-
-	taken = [0 for word in words_in_text]
-	translation = ['NULL' for word in words_in_text]
-
-	N = len(words_in_text)
-	for n in range(N,1,-1):
-		nPhrases = getNgrams(words_in_text, n)
-		for i,phrase in enumerate(nPhrases):
-			not_taken = True
-			phrase_text = " ".join(phrase)
-			for pos in range(i,i+len(phrase)):
-				if taken[pos] == 1:
-					not_taken = False
-					break
-			if not_taken and phrase_text in tokenTranslatedDict:
-				translated_phrase = tokenTranslatedDict[phrase_text]
-				translation[i] = translated_phrase
-				taken[i] = 1
-				for pos in range(i+1,i+len(phrase)):
-					translation[pos] = ''
-					taken[pos] = 1
-	for index,value in enumerate(taken):
-		if value == 0:
-			translation[index] = words_in_text[index]
-	translation = " ".join(translation)
-	return translation
-
+		return None
+
+# a least recently used cache of the TranslationLexicon of projects.
+# every write to translations adds a row to translations_history, so the latest
+# translations_history id of the source and target language of a project tells
+# if its lexicon is still current, even when the write was done by another worker
+class TranslationLexiconCache(object):
+	def __init__(self,maxsize=16):
+		self.maxsize = maxsize
+		self._lock = threading.Lock()
+		self._lexicons = OrderedDict()
+
+	def invalidate(self,projectId):
+		with self._lock:
+			self._lexicons.pop(int(projectId),None)
+
+	def get(self,conn,projectId):
+		projectId = int(projectId)
+		cursor = conn.cursor()
+		cursor.execute("select max(h.translation_id) from autographamt_projects p join translations_history h \
+			on h.source_id=p.source_id and h.target_id=p.target_id where p.project_id=%s",(projectId,))
+		stamp = cursor.fetchone()[0]
+		cursor.close()
+		with self._lock:
+			cached = self._lexicons.get(projectId)
+			if cached and cached[0] == stamp:
+				self._lexicons.move_to_end(projectId)
+				return cached[1]
+		lexicon = load_translation_lexicon(conn,projectId)
+		if lexicon is None:
+			return None
+		with self._lock:
+			self._lexicons[projectId] = (stamp,lexicon)
+			self._lexicons.move_to_end(projectId)
+			while len(self._lexicons) > self.maxsize:
+				self._lexicons.popitem(last=False)
+		return lexicon
 
 
 
@@ -464,9 +581,9 @@ if __name__ == '__main__':
 	# add_rules_toDB(db,"hi","rules_to_DB_draft2.txt")
 
 
-	loadPhraseTranslations(db,1,2)
+	lexicon = load_translation_lexicon(db,1)
 
-	print(translateText('1 3 2 1 2 5 4 0 5'))
-	print(translateText(' '))
-	print(translateText('   '))
+	print(lexicon.translate_text('1 3 2 1 2 5 4 0 5'))
+	print(lexicon.translate_text(' '))
+	print(lexicon.translate_text('   '))
 	db.close()
\ No newline at end of file
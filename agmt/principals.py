@@ -0,0 +1,85 @@
+import time
+import hmac
+import threading
+from collections import namedtuple, OrderedDict
+
+Principal = namedtuple('Principal', ['user_id', 'email', 'role_id', 'status', 'organisations'])
+
+
+class PrincipalCache(object):
+	'''
+	A per worker cache of the access tokens seen, keyed by the token signature, with
+	 - the claims of the token, once its signature has been verified (kept until the token expires)
+	 - the user the token was issued to (Principal), kept for `ttl` seconds
+	The endpoints that change the role, status or organisations of a user call invalidate_user(),
+	other workers see the change after at most `ttl` seconds.
+	'''
+
+	def __init__(self, ttl=30, maxsize=10000):
+		self.ttl = ttl
+		self.maxsize = maxsize
+		self._lock = threading.Lock()
+		self._entries = OrderedDict()    # signature -> [token, claims, principal, principal loaded at]
+
+	@staticmethod
+	def signature(token):
+		return token.rsplit('.', 1)[-1]
+
+	def _entry(self, token):
+		entry = self._entries.get(self.signature(token))
+		# the signature is only a key, the whole token has to match
+		if entry is None or not hmac.compare_digest(entry[0], token):
+			return None
+		if entry[1].get('exp') is not None and entry[1]['exp'] < time.time():
+			self._entries.pop(self.signature(token), None)
+			return None
+		return entry
+
+	def get_claims(self, token):
+		'''The claims of a token verified before (and not yet expired), or None.'''
+		with self._lock:
+			entry = self._entry(token)
+			return entry[1] if entry else None
+
+	def put_claims(self, token, claims):
+		with self._lock:
+			self._entries[self.signature(token)] = [token, claims, None, None]
+			while len(self._entries) > self.maxsize:
+				self._entries.popitem(last=False)
+
+	def get_principal(self, token):
+		with self._lock:
+			entry = self._entry(token)
+			if entry and entry[2] and time.time() - entry[3] < self.ttl:
+				return entry[2]
+		return None
+
+	def put_principal(self, token, principal):
+		with self._lock:
+			entry = self._entry(token)
+			if entry:
+				entry[2] = principal
+				entry[3] = time.time()
+
+	def invalidate_user(self, user_id=None, email=None):
+		'''Drops the cached principal of a user (by id or email), for all their tokens.'''
+		with self._lock:
+			for entry in self._entries.values():
+				principal = entry[2]
+				if principal and ((user_id is not None and principal.user_id == int(user_id)) or \
+					(email is not None and principal.email == email)):
+					entry[2] = None
+
+
+def load_principal(conn, email):
+	'''Returns the Principal for the user with the email, or None if there is no such user.'''
+	cursor = conn.cursor()
+	cursor.execute("select u.user_id, u.role_id, u.status, array_remove(array_agg(o.organisation_id \
+		order by o.organisation_id), null) from autographamt_users u left join autographamt_organisations o \
+			on o.user_id=u.user_id where u.email_id=%s group by u.user_id, u.role_id, u.status", (email,))
+	rst = cursor.fetchone()
+	cursor.close()
+	if not rst:
+		return None
+	userId, roleId, status, organisations = rst
+	return Principal(userId, email, roleId, status, tuple(organisations))
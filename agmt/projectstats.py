@@ -0,0 +1,78 @@
+'''
+Translation statistics of the projects, kept per book in the `project_book_statistics` table:
+the number of tokens of the book and how many of them the project has translated.
+ - refresh_book() recomputes a book for all the projects of a source, after it is tokenized
+ - add_translated_tokens() counts the tokens a project translated for the first time
+ - get_statistics() reads the statistics of a project, first computing the books it has none for
+All of them run in the transaction of the cursor given.
+'''
+from psycopg2 import sql
+
+
+def token_table_exists(cursor, tokenTable):
+	cursor.execute("select to_regclass(quote_ident(%s)) is not null", (tokenTable,))
+	return cursor.fetchone()[0]
+
+
+def refresh_book(cursor, tokenTable, bookId):
+	'''Recomputes the statistics of a book for each project of the source of the token table.'''
+	sourceTable = tokenTable[:-len('_tokens')]
+	cursor.execute(sql.SQL("insert into project_book_statistics (project_id, book_id, all_tokens_count, \
+		translated_tokens_count) select p.project_id, %s, (select count(*) from {tokens} k where k.book_id=%s), \
+			(select count(distinct k.token) from {tokens} k join translations t on t.token=k.token join \
+				translation_projects_look_up l on t.translation_id=l.translation_id where k.book_id=%s and \
+					l.project_id=p.project_id) from autographamt_projects p join sources s on \
+						p.source_id=s.source_id where s.table_name=%s on conflict (project_id, book_id) do update \
+		set all_tokens_count=excluded.all_tokens_count, translated_tokens_count=excluded.translated_tokens_count, \
+			updated_at=now()").format(tokens=sql.Identifier(tokenTable)), (bookId, bookId, bookId, sourceTable))
+
+
+def missing_books(cursor, projectId, tokenTable):
+	'''The ids of the books uploaded to the source of the token table that the project has no statistics for.'''
+	sourceTable = tokenTable[:-len('_tokens')]
+	cursor.execute(sql.SQL("select b.book_id from {source} b where not exists (select 1 from \
+		project_book_statistics s where s.project_id=%s and s.book_id=b.book_id) order by b.book_id").format(
+			source=sql.Identifier(sourceTable)), (projectId,))
+	return [bookId for (bookId,) in cursor.fetchall()]
+
+
+def backfill_project(cursor, projectId, tokenTable, bookIds):
+	'''
+	Computes the statistics of some books of a project, the books not tokenized yet having no
+	tokens. The books that already have statistics are left as they are.
+	'''
+	sourceTable = tokenTable[:-len('_tokens')]
+	cursor.execute(sql.SQL("insert into project_book_statistics (project_id, book_id, all_tokens_count, \
+		translated_tokens_count) select %(project)s, b.book_id, count(k.token), count(distinct k.token) filter \
+			(where tr.token is not null) from {source} b left join {tokens} k on k.book_id=b.book_id left join \
+				(select distinct t.token from translations t join translation_projects_look_up l on \
+					t.translation_id=l.translation_id where l.project_id=%(project)s) tr on tr.token=k.token \
+		where b.book_id = any(%(books)s) group by b.book_id on conflict (project_id, book_id) do nothing").format(
+			source=sql.Identifier(sourceTable), tokens=sql.Identifier(tokenTable)),
+		{'project': projectId, 'books': list(bookIds)})
+
+
+def add_translated_tokens(cursor, projectId, tokenTable, tokens):
+	'''Adds tokens the project did not have a translation for, to the translated count of their books.'''
+	if not tokens or not token_table_exists(cursor, tokenTable):
+		return
+	cursor.execute(sql.SQL("update project_book_statistics s set translated_tokens_count= \
+		s.translated_tokens_count + c.translated, updated_at=now() from (select book_id, count(distinct token) \
+			as translated from {tokens} where token = any(%s) group by book_id) c where s.project_id=%s and \
+				s.book_id=c.book_id").format(tokens=sql.Identifier(tokenTable)), (list(tokens), projectId))
+
+
+def get_statistics(cursor, projectId, tokenTable):
+	'''Returns (book_id, all tokens count, translated tokens count) of the tokenized books of a project.'''
+	query = "select book_id, all_tokens_count, translated_tokens_count from project_book_statistics \
+		where project_id=%s order by book_id"
+	cursor.execute(query, (projectId,))
+	rows = cursor.fetchall()
+	if token_table_exists(cursor, tokenTable):
+		# the books uploaded before the statistics were kept, or before the project was created
+		bookIds = missing_books(cursor, projectId, tokenTable)
+		if bookIds:
+			backfill_project(cursor, projectId, tokenTable, bookIds)
+			cursor.execute(query, (projectId,))
+			rows = cursor.fetchall()
+	return [row for row in rows if row[1] > 0]
@@ -0,0 +1,80 @@
+import re
+from psycopg2 import sql
+
+# the most references (or ranges) accepted in one request
+MAX_REFERENCES = 200
+# the most verses read in one parallel text request, over all its sources
+MAX_PARALLEL_VERSES = 20000
+
+# <book>[.<chapter>[.<verse>]][-[<chapter>.]<chapter or verse>]
+reference_pattern = re.compile(r'^([0-9a-z]+)(?:\.(\d+)(?:\.(\d+))?)?(?:-(\d+)(?:\.(\d+))?)?$')
+
+
+class InvalidReferenceError(ValueError):
+	pass
+
+# splits a list of references, separated by commas or semicolons, like "jhn.3.16-18,rom.8"
+def split_references(text):
+	return [ref.strip() for ref in re.split(r'[,;]', text) if ref.strip()]
+
+# returns the inclusive ref_id range of a reference, one of
+#   jhn          the book
+#   jhn.3        a chapter            jhn.3-4        chapters
+#   jhn.3.16     a verse              jhn.3.16-18    verses of a chapter
+#   jhn.3.16-4.3 verses across chapters
+# get_book returns the book (with a book_id) for a book code, or None
+def parse_reference(reference, get_book):
+	match = reference_pattern.match(reference.lower())
+	if not match:
+		raise InvalidReferenceError("Invalid reference, %s" % reference)
+	book_code, chapter, verse, end_first, end_second = match.groups()
+	if any(int(number) > 999 for number in (chapter, verse, end_first, end_second) if number is not None):
+		raise InvalidReferenceError("Invalid reference, %s" % reference)
+	book = get_book(book_code)
+	if not book:
+		raise InvalidReferenceError("Invalid book code in reference, %s" % reference)
+	base = book.book_id * 1000000
+	if chapter is None:
+		if end_first is not None:
+			raise InvalidReferenceError("Invalid reference, %s" % reference)
+		return base, base + 999999
+	chapter = int(chapter)
+	if verse is None:
+		# chapters: the end is a chapter, and cannot have a verse
+		if end_second is not None:
+			raise InvalidReferenceError("Invalid reference, %s" % reference)
+		end_chapter = int(end_first) if end_first is not None else chapter
+		start, end = base + chapter * 1000, base + end_chapter * 1000 + 999
+	else:
+		verse = int(verse)
+		if end_first is None:
+			end_chapter, end_verse = chapter, verse
+		elif end_second is None:
+			end_chapter, end_verse = chapter, int(end_first)
+		else:
+			end_chapter, end_verse = int(end_first), int(end_second)
+		start, end = base + chapter * 1000 + verse, base + end_chapter * 1000 + end_verse
+	if end < start:
+		raise InvalidReferenceError("Invalid reference, %s" % reference)
+	return start, end
+
+# returns [(position of the range, ref_id, verse)] of the verses in each of the ranges [(start, end)],
+# in the order of the ranges and of the verses in each range, read with a single query
+def get_verses(cursor, clean_table, ranges):
+	if not ranges:
+		return []
+	cursor.execute(sql.SQL("select r.ord, c.ref_id, c.verse from unnest(%s::int[], %s::int[]) with ordinality \
+		as r (start_id, end_id, ord) join {} c on c.ref_id between r.start_id and r.end_id order by r.ord, c.ref_id").\
+			format(sql.Identifier(clean_table)), ([start for start, _ in ranges], [end for _, end in ranges]))
+	return cursor.fetchall()
+
+# returns [(ref_id, position of the table, verse)] of the verses of several cleaned tables in a
+# ref_id range, read with a single query, in the order of the ref_ids and then of the tables
+def get_parallel_verses(cursor, clean_tables, start, end):
+	if not clean_tables:
+		return []
+	selects = [sql.SQL("select ref_id, {} as position, verse from {} where ref_id between %(start)s and %(end)s").\
+		format(sql.Literal(position), sql.Identifier(table)) for position, table in enumerate(clean_tables)]
+	cursor.execute(sql.SQL("{} order by ref_id, position").format(sql.SQL(" union all ").join(selects)),
+		{'start': start, 'end': end})
+	return cursor.fetchall()
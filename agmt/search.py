@@ -0,0 +1,81 @@
+from psycopg2 import sql
+
+# the text search configuration used for the verse index. 'simple' only lower cases the words
+# and does no stemming or stop word removal, so it works the same for every language and script
+TS_CONFIG = 'simple'
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def index_name(clean_table):
+	return clean_table + '_verse_fts_idx'
+
+# creates (if not already present) the GIN full text index on the verses of a
+# <lang>_<version>_<revision>_bible_cleaned table. Postgres keeps the index up to date
+# on every insert, so it only has to be created once per table. It is created when a source is
+# created or a book uploaded (and by db_changes.sql for the tables before), never when reading,
+# as creating it blocks the writes to the table
+def ensure_index(cursor, clean_table):
+	cursor.execute("select to_regclass(quote_ident(%s)) is not null", (index_name(clean_table),))
+	if cursor.fetchone()[0]:
+		return
+	cursor.execute(sql.SQL("create index if not exists {} on {} using gin (to_tsvector({}, coalesce(verse, '')))").\
+		format(sql.Identifier(index_name(clean_table)), sql.Identifier(clean_table), sql.Literal(TS_CONFIG)))
+
+# a keyword within double quotes is searched as a phrase (the words next to each other in that order),
+# otherwise all the words in the keyword have to be present in the verse, in any order
+def parse_query(keyword):
+	keyword = keyword.strip()
+	if len(keyword) > 1 and keyword.startswith('"') and keyword.endswith('"'):
+		return 'phraseto_tsquery', keyword[1:-1].strip()
+	return 'plainto_tsquery', keyword
+
+# the ref_id range to be searched for an optional book id and chapter
+def ref_id_range(book_id=None, chapter=None):
+	if book_id is None:
+		return None
+	if chapter is None:
+		return book_id*1000000, book_id*1000000 + 999999
+	return book_id*1000000 + chapter*1000, book_id*1000000 + chapter*1000 + 999
+
+# returns the total number of matching verses and one page of [(ref_id, verse)],
+# the best ranked verses first and verses of the same rank in bible order
+def search_verses(cursor, clean_table, keyword, book_id=None, chapter=None, offset=0, limit=DEFAULT_LIMIT):
+	query_function, text = parse_query(keyword)
+	document = sql.SQL("to_tsvector({}, coalesce(verse, ''))").format(sql.Literal(TS_CONFIG))
+	query = sql.SQL("{}({}, %(text)s)").format(sql.SQL(query_function), sql.Literal(TS_CONFIG))
+	condition = sql.SQL("{} @@ {}").format(document, query)
+	params = {'text': text, 'offset': offset, 'limit': limit}
+	ref_range = ref_id_range(book_id, chapter)
+	if ref_range:
+		condition = sql.SQL("{} and ref_id between %(start)s and %(end)s").format(condition)
+		params['start'], params['end'] = ref_range
+	cursor.execute(sql.SQL("select count(*) from {} where {}").format(sql.Identifier(clean_table), condition), params)
+	total = cursor.fetchone()[0]
+	if total == 0 or offset >= total:
+		return total, []
+	cursor.execute(sql.SQL("select ref_id, verse from {} where {} order by ts_rank({}, {}) desc, ref_id \
+		offset %(offset)s limit %(limit)s").format(sql.Identifier(clean_table), condition, document, query), params)
+	return total, cursor.fetchall()
+
+# the verses (ref_id, verse) containing a token or phrase, in bible order. The token is matched
+# as a substring (case sensitive), also inside longer words, as the tokens of phrases.tokenize are
+# not always whole words of the text search parser, so the full text index is not used here.
+# With a book id, either the verses of that book (in_book=True) or at most `limit` verses of all
+# the other books are returned
+def token_occurrences(cursor, clean_table, token, book_id=None, in_book=True, limit=None):
+	condition = sql.SQL("strpos(verse, %(token)s) > 0")
+	params = {'token': token}
+	if book_id is not None:
+		params['start'], params['end'] = ref_id_range(book_id)
+		if in_book:
+			condition = sql.SQL("{} and ref_id between %(start)s and %(end)s").format(condition)
+		else:
+			condition = sql.SQL("{} and ref_id not between %(start)s and %(end)s").format(condition)
+	query = sql.SQL("select ref_id, verse from {} where {} order by ref_id").format(sql.Identifier(clean_table), condition)
+	if limit:
+		query = sql.SQL("{} limit %(limit)s").format(query)
+		params['limit'] = limit
+	cursor.execute(query, params)
+	return cursor.fetchall()
@@ -0,0 +1,157 @@
+'''
+The token translations of the projects.
+
+Bulk saving (from an excel sheet) uses a fixed number of statements whatever the number of
+tokens: the translations the project already has are read with one query, the changes are
+worked out here in the order of the rows, and the new translations, the updates and the
+history are written with one statement each.
+
+The token translation list of some books is read with one query scoped to the project, which
+can be read in pages (keyset, on the book position and token) or through a server side cursor.
+'''
+import json
+import base64
+import binascii
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+import projectstats
+
+# rows sent per statement by execute_values
+page_size = 1000
+
+
+def classify_rows(tokenTranslations):
+	'''
+	Returns the rows to save, as (token, translation, senses list or None when the row has no senses),
+	and the counts of rows with an empty token, translation and senses. Rows without a token
+	or a translation are only counted.
+	'''
+	rows = []
+	emptyTokens = emptyTranslations = emptySenses = 0
+	for item in tokenTranslations:
+		if "token" not in item:
+			if "translation" in item or "senses" in item:
+				emptyTokens += 1
+		elif "translation" not in item:
+			emptyTranslations += 1
+			if "senses" not in item:
+				emptySenses += 1
+		elif "senses" in item:
+			splitSense = item["senses"].split(',')
+			if "" in splitSense:
+				splitSense.remove("")
+			rows.append((item["token"], item["translation"], splitSense))
+		else:
+			emptySenses += 1
+			rows.append((item["token"], item["translation"], None))
+	return rows, emptyTokens, emptyTranslations, emptySenses
+
+
+def plan_changes(rows, existing):
+	'''
+	Works out the changes of saving the rows one after the other, as the one by one
+	translation API would, from the senses of the translations the project has (existing,
+	{token: senses}). Returns
+	 - inserts: {token: (translation, senses)}, the first row of each token the project does not have
+	 - updates: {token: [translation, senses, whether the senses are set]}, the final state of
+	   each token changed by a row after its insert (or a row of an existing token)
+	 - history: (token, translation, senses) for each row
+	'''
+	senses = dict(existing)
+	inserts = {}
+	updates = {}
+	history = []
+	for token, translation, splitSense in rows:
+		if token not in senses:
+			senses[token] = '|'.join(splitSense) if splitSense is not None else None
+			inserts[token] = (translation, senses[token])
+			history.append((token, translation, senses[token]))
+			continue
+		update = updates.setdefault(token, [None, None, False])
+		update[0] = translation
+		if splitSense is None:
+			history.append((token, translation, None))
+			continue
+		dbSenses = senses[token].split('|') if senses[token] is not None else []
+		for sense in splitSense:
+			if sense not in dbSenses:
+				dbSenses.append(sense)
+		senses[token] = "|".join(dbSenses)
+		update[1] = senses[token]
+		update[2] = True
+		history.append((token, translation, senses[token]))
+	return inserts, updates, history
+
+
+def save_bulk_translations(cursor, projectId, sourceId, targetId, userId, tokenTranslations, tokenTable):
+	'''Saves the translations of the rows of an excel sheet, in the transaction of the cursor,
+	and counts the new ones in the project statistics (tokenTable is the token table of the source).
+	Returns the counts of rows with an empty token, translation and senses.'''
+	rows, emptyTokens, emptyTranslations, emptySenses = classify_rows(tokenTranslations)
+	if not rows:
+		return emptyTokens, emptyTranslations, emptySenses
+	cursor.execute("select distinct on (t.token) t.token, t.senses from translations t join \
+		translation_projects_look_up p on t.translation_id=p.translation_id where p.project_id=%s and \
+		t.token = any(%s) order by t.token, t.translation_id", (projectId, list({row[0] for row in rows})))
+	inserts, updates, history = plan_changes(rows, cursor.fetchall())
+	if inserts:
+		translationIds = execute_values(cursor, "insert into translations (token, translation, source_id, target_id, \
+			user_id, senses) values %s returning translation_id",
+			[(token, translation, sourceId, targetId, userId, senses) for token, (translation, senses) in inserts.items()],
+			page_size=page_size, fetch=True)
+		execute_values(cursor, "insert into translation_projects_look_up (translation_id, project_id) values %s",
+			[(translationId, projectId) for (translationId,) in translationIds], page_size=page_size)
+		projectstats.add_translated_tokens(cursor, projectId, tokenTable, list(inserts))
+	if updates:
+		execute_values(cursor, "update translations t set translation=v.translation, user_id=%s, \
+			senses=case when v.set_senses then v.senses else t.senses end from (values %%s) \
+				as v (token, translation, senses, set_senses) where t.source_id=%s and t.target_id=%s \
+					and t.token=v.token" % (int(userId), int(sourceId), int(targetId)),
+			[(token, translation, senses, setSenses) for token, (translation, senses, setSenses) in updates.items()],
+			template="(%s, %s::text, %s::text, %s::boolean)", page_size=page_size)
+	execute_values(cursor, "insert into translations_history (token, translation, source_id, target_id, \
+		user_id, senses) values %s", [(token, translation, sourceId, targetId, userId, senses) \
+			for token, translation, senses in history], page_size=page_size)
+	return emptyTokens, emptyTranslations, emptySenses
+
+
+def token_translations_query(tokenTable, onlyWords=False):
+	'''
+	The query for the tokens of some books (the first parameter, an array of book ids) with
+	their translation in a project, as (book position, token, translation, senses), in the order
+	of the books and of the tokens in each book. A token is listed once, with the first book it is in.
+	The next parameters are the project id, its source and target ids, the (book position, token)
+	to start after and the number of rows (null for all).
+	'''
+	return sql.SQL("select k.ord, k.token, pt.translation, pt.senses from (select k.token, min(b.ord) as ord \
+		from {tokens} k join unnest(%s::int[]) with ordinality as b (book_id, ord) on k.book_id=b.book_id " +
+		("where position(' ' in k.token) = 0 " if onlyWords else "") + "group by k.token) k \
+		left join lateral (select t.translation, t.senses from translations t join translation_projects_look_up l \
+			on t.translation_id=l.translation_id where l.project_id=%s and t.source_id=%s and t.target_id=%s \
+				and t.token=k.token order by t.translation_id desc limit 1) pt on true \
+		where (k.ord, k.token collate \"C\") > (%s, %s) order by k.ord, k.token collate \"C\" limit %s").format(
+			tokens=sql.Identifier(tokenTable))
+
+
+def token_translation_row(token, translation, senses):
+	'''The row of a token in the token translation list: [token, translation, comma separated senses]'''
+	if senses:
+		senses = senses.replace('|', ',')
+		if senses[-1] == ',':
+			senses = senses[:-1]
+	else:
+		senses = None
+	return [token, translation, senses]
+
+
+def encode_page_cursor(position, token):
+	return base64.urlsafe_b64encode(json.dumps([position, token]).encode('utf-8')).decode('ascii')
+
+
+def decode_page_cursor(pageCursor):
+	'''Returns the (book position, token) of a cursor. Raises ValueError if it is not valid.'''
+	try:
+		position, token = json.loads(base64.urlsafe_b64decode(pageCursor.encode('ascii')).decode('utf-8'))
+		return int(position), str(token)
+	except (TypeError, ValueError, UnicodeError, binascii.Error):
+		raise ValueError("Invalid cursor")
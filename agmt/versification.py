@@ -0,0 +1,99 @@
+'''
+The versification of the Bible: the verses of each chapter of each book, as in the `bcv_map`
+table. It never changes, so it is read once per worker, from the `DB/bcv_map.csv` file the
+table is seeded from or, if the file is not there, from the table, and kept in memory.
+
+A verse is identified by its ref_id (book*1000000 + chapter*1000 + verse) or by its lid, the
+position of the verse in the Bible (1 for gen.1.1), which is the id of the `bcv_lid_map` table.
+'''
+import csv
+import bisect
+import threading
+
+
+def ref_id(book, chapter, verse):
+	return book * 1000000 + chapter * 1000 + verse
+
+
+def bcv(refId):
+	'''The (book, chapter, verse) of a ref_id.'''
+	return refId // 1000000, refId // 1000 % 1000, refId % 1000
+
+
+class Versification(object):
+	'''The verses of the Bible, from (ref_id, book, chapter, verse) rows.'''
+
+	def __init__(self, rows):
+		self._ref_ids = sorted(int(row[0]) for row in rows)
+		self._lids = {refId: lid for lid, refId in enumerate(self._ref_ids, 1)}
+		self._verse_counts = {}
+		self._chapter_counts = {}
+		for refId in self._ref_ids:
+			book, chapter, _ = bcv(refId)
+			self._verse_counts[(book, chapter)] = self._verse_counts.get((book, chapter), 0) + 1
+			self._chapter_counts[book] = max(self._chapter_counts.get(book, 0), chapter)
+
+	def __len__(self):
+		return len(self._ref_ids)
+
+	def has_verse(self, refId):
+		return refId in self._lids
+
+	def lid(self, refId):
+		'''The lid of a verse, or None if there is no such verse.'''
+		return self._lids.get(refId)
+
+	def ref_id_of_lid(self, lid):
+		'''The ref_id of a lid, or None if there is no such verse.'''
+		if 1 <= lid <= len(self._ref_ids):
+			return self._ref_ids[lid - 1]
+		return None
+
+	def verses_between(self, start, end):
+		'''The number of verses with a ref_id from start to end (inclusive).'''
+		return bisect.bisect_right(self._ref_ids, end) - bisect.bisect_left(self._ref_ids, start)
+
+	def has_chapter(self, book, chapter):
+		return (book, chapter) in self._verse_counts
+
+	def verse_count(self, book, chapter):
+		'''The number of verses of a chapter, 0 if there is no such chapter.'''
+		return self._verse_counts.get((book, chapter), 0)
+
+	def chapter_count(self, book):
+		return self._chapter_counts.get(book, 0)
+
+
+def read_csv(path):
+	with open(path, newline='') as csvFile:
+		return [(row['ref_id'], row['book'], row['chapter'], row['verse']) for row in csv.DictReader(csvFile)]
+
+
+def read_table(connection):
+	cursor = connection.cursor()
+	cursor.execute("select ref_id, book, chapter, verse from bcv_map")
+	rows = cursor.fetchall()
+	cursor.close()
+	return rows
+
+
+class VersificationLoader(object):
+	'''Loads the versification the first time it is needed, and shares it between threads.'''
+
+	def __init__(self, csv_path):
+		self.csv_path = csv_path
+		self._lock = threading.Lock()
+		self._versification = None
+
+	def get(self, get_connection):
+		'''The versification. get_connection gives a database connection, only called if the
+		csv file cannot be read.'''
+		if self._versification is None:
+			with self._lock:
+				if self._versification is None:
+					try:
+						rows = read_csv(self.csv_path)
+					except (IOError, KeyError, csv.Error):
+						rows = read_table(get_connection())
+					self._versification = Versification(rows)
+		return self._versification
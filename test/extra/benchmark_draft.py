@@ -0,0 +1,133 @@
+'''
+Compares the draft renderer of downloadDraft (agmt/draft.py) with the renderer it replaced,
+checking that both give the same draft and timing them.
+	python benchmark_draft.py [usfm files]
+Without any file, a USFM text of the size of the New Testament (260 chapters, about
+8000 verses) is generated, along with a lexicon translating most of its words and phrases.
+'''
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'agmt'))
+import draft
+from phrases import TranslationLexicon
+
+
+def legacy_render_draft(usfm_text, lexicon):
+	'''The renderer of downloadDraft before agmt/draft.py, without its debug prints'''
+	usfmMarker = re.compile(r'\\\w+\d?\*?\s?')
+	nonLangComponentsTwoSpaces = re.compile(r'\s[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]\s')
+	nonLangComponentsTrailingSpace = re.compile(r'[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]\s')
+	nonLangComponentsFrontSpace = re.compile(r'\s[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]')
+	nonLangComponents = re.compile(r'[!"#$%&\\\'()*+,./:;<=>?@\[\]^_`{|\}~”“‘’।]')
+	usfmLineList = []
+	for line in usfm_text.split('\n'):
+		usfmWordsList = []
+		nonLangCompsTwoSpaces = []
+		nonLangCompsTrailingSpace = []
+		nonLangCompsFrontSpace = []
+		nonLangComps = []
+		markers_in_line = re.findall(usfmMarker,line)
+		translated_seq = []
+		for word_seq in re.split(usfmMarker,line):
+			nonLangCompsTwoSpaces += re.findall(nonLangComponentsTwoSpaces,word_seq)
+			clean_word_seq = re.sub(nonLangComponentsTwoSpaces,' uuuQQQuuu ',word_seq)
+			nonLangCompsTrailingSpace += re.findall(nonLangComponentsTrailingSpace,clean_word_seq)
+			clean_word_seq = re.sub(nonLangComponentsTrailingSpace,' QQQuuu ',clean_word_seq)
+			nonLangCompsFrontSpace += re.findall(nonLangComponentsFrontSpace,clean_word_seq)
+			clean_word_seq = re.sub(nonLangComponentsFrontSpace,' uuuQQQ ',clean_word_seq)
+			nonLangComps += re.findall(nonLangComponents,clean_word_seq)
+			clean_word_seq = re.sub(nonLangComponents,' QQQ ',clean_word_seq)
+			if not re.match(r'\s+$',clean_word_seq) and clean_word_seq!='':
+				translated_seq.append(lexicon.translate_text( clean_word_seq ))
+		if not markers_in_line:
+			# the old code used the marker index of the previous line here, which always left the line empty
+			usfmLineList.append('')
+			continue
+		for i,marker in enumerate(markers_in_line):
+			usfmWordsList.append(marker)
+			if i<len(translated_seq):
+				usfmWordsList.append(translated_seq[i])
+		if i+1<len(translated_seq):
+			usfmWordsList += translated_seq[i+1:]
+		outputLine = " ".join(usfmWordsList)
+		for comp in nonLangCompsTwoSpaces:
+			comp = comp.replace("\\", '\\\\')
+			outputLine = re.sub(r' uuuQQQuuu '," "+comp+" ",outputLine,1)
+		for comp in nonLangCompsTrailingSpace:
+			comp = comp.replace("\\", '\\\\')
+			outputLine = re.sub(r' QQQuuu ',comp+" ",outputLine,1)
+		for comp in nonLangCompsFrontSpace:
+			comp = comp.replace("\\", '\\\\')
+			outputLine = re.sub(r' uuuQQQ '," "+comp,outputLine,1)
+		for comp in nonLangComps:
+			comp = comp.replace("\\", '\\\\')
+			outputLine = re.sub(r' QQQ ',comp,outputLine,1)
+		outputLine = re.sub(r'\s+',' ',outputLine)
+		usfmLineList.append(outputLine)
+	return "\n".join(usfmLineList)
+
+
+def generate_usfm(rand, words, chapters=260, verses=31):
+	punctuations = [',', '.', ';', ':', '?', '!', '"', "'", '“', '”', '‘', '’', '(', ')', '।', '-']
+	lines = ['\\id MAT', '\\h Matthew', '\\mt Matthew']
+	for c in range(1, chapters + 1):
+		lines.append('\\c %s' % c)
+		lines.append('\\p')
+		for v in range(1, verses + 1):
+			text = []
+			for _ in range(rand.randint(8, 30)):
+				word = rand.choice(words)
+				r = rand.random()
+				if r < 0.1:
+					word = word + rand.choice(punctuations)
+				elif r < 0.15:
+					word = rand.choice(punctuations) + word
+				elif r < 0.2:
+					word = word + ' ' + rand.choice(punctuations)
+				text.append(word)
+			if rand.random() < 0.1:
+				text.insert(rand.randint(0, len(text)), '\\f + \\ft %s\\f*' % rand.choice(words))
+			if rand.random() < 0.05:
+				text.insert(rand.randint(0, len(text)), '\\add %s\\add*' % rand.choice(words))
+			lines.append('\\v %s %s' % (v, ' '.join(text)))
+	return '\n'.join(lines)
+
+
+def generate_lexicon(rand, words):
+	translations = {}
+	for word in words:
+		if rand.random() < 0.8:
+			translations[word] = word.upper()
+	for _ in range(len(words)):
+		phrase = ' '.join(rand.choice(words) for _ in range(rand.randint(2, 3)))
+		translations[phrase] = phrase.upper().replace(' ', '_')
+	return TranslationLexicon(translations)
+
+
+def timed(function, *args):
+	start = time.perf_counter()
+	result = function(*args)
+	return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+	rand = random.Random(1)
+	words = ['w%s' % n for n in range(3000)]
+	lexicon = generate_lexicon(rand, words)
+	if len(sys.argv) > 1:
+		texts = [open(path, encoding='utf-8').read() for path in sys.argv[1:]]
+	else:
+		texts = [generate_usfm(rand, words)]
+	legacyTotal = newTotal = 0
+	for text in texts:
+		legacy, legacyTime = timed(legacy_render_draft, text, lexicon)
+		new, newTime = timed(draft.render_draft, text, lexicon)
+		assert legacy == new, 'The drafts differ'
+		legacyTotal += legacyTime
+		newTotal += newTime
+	print('%s lines: legacy %.2fs, draft.render_draft %.2fs (%.1fx), same output' % (
+		sum(text.count('\n') + 1 for text in texts), legacyTotal, newTotal, legacyTotal / newTotal))
@@ -0,0 +1,60 @@
+'''
+Tests of the artifact store of agmt/artifacts.py
+'''
+import os
+import sys
+import gzip
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'agmt'))
+import artifacts
+
+
+@pytest.fixture
+def store(tmpdir):
+	return artifacts.ArtifactStore(str(tmpdir))
+
+
+def test_write_read(store):
+	body = '{"sourceId": "35", "bibleBookCode": "gen", "bookContent": "\\\\id GEN అ"}' * 100
+	representations = store.write(35, "getBook.gen.usfm", "v1", body)
+	assert store.read(35, "getBook.gen.usfm", "v1") == body.encode('utf-8')
+	assert gzip.decompress(store.read(35, "getBook.gen.usfm", "v1", "gzip")) == body.encode('utf-8')
+	assert store.read(35, "getBook.gen.usfm", "v1", "gzip") == representations["gzip"]
+	assert store.read(35, "getBook.gen.usfm", "v2") is None
+	assert store.read(35, "getBook.exo.usfm", "v1") is None
+	assert store.stats()["writes"] == 1
+
+
+def test_new_version_removes_old(store, tmpdir):
+	store.write(35, "getBook.gen.json", "v1", '{}')
+	store.write(35, "getBook.gen.usfm", "v1", '{}')
+	store.write(35, "getBook.gen.json", "v2", '{"a": 1}')
+	assert store.read(35, "getBook.gen.json", "v1") is None
+	assert store.read(35, "getBook.gen.json", "v2") == b'{"a": 1}'
+	assert store.read(35, "getBook.gen.usfm", "v1") == b'{}'
+	assert len(tmpdir.join("35").listdir()) == 2 * (1 + len(store.encodings))
+
+
+def test_remove_source(store):
+	store.write(35, "getBible.all.json", "v1", '{}')
+	store.write(36, "getBible.all.json", "v1", '{}')
+	store.remove_source(35)
+	assert store.read(35, "getBible.all.json", "v1") is None
+	assert store.read(36, "getBible.all.json", "v1") == b'{}'
+
+
+def test_disabled_store():
+	store = artifacts.ArtifactStore(None)
+	assert not store.enabled
+	assert store.write(35, "getBible.all.json", "v1", '{}')[None] == b'{}'
+	assert store.read(35, "getBible.all.json", "v1") is None
+
+
+def test_negotiate(store):
+	http = pytest.importorskip("werkzeug.http")
+	assert store.negotiate(http.parse_accept_header("gzip, deflate")) == "gzip"
+	assert store.negotiate(http.parse_accept_header("gzip;q=0, deflate")) is None
+	assert store.negotiate(http.parse_accept_header("")) is None
+	expected = "br" if artifacts.brotli else "gzip"
+	assert store.negotiate(http.parse_accept_header("gzip, br")) == expected
@@ -0,0 +1,32 @@
+#-*-coding:utf-8-*-
+import pytest
+import requests
+import json
+
+@pytest.fixture
+def supply_url():
+	return "https://stagingapi.autographamt.com"
+
+
+def test_bookgzip(supply_url):
+	url = supply_url + '/v1/bibles/35/books/gen/json'
+	resp = requests.get(url, headers={'Accept-Encoding': 'gzip'})
+	assert resp.status_code == 200, resp.text
+	assert resp.headers['Content-Encoding'] == 'gzip'
+	assert 'Accept-Encoding' in resp.headers['Vary']
+	assert resp.headers['ETag'].endswith('-gzip"')
+	j = json.loads(resp.text)
+	assert j['bibleBookCode'] == 'gen', str(j)
+
+def test_bookidentity(supply_url):
+	url = supply_url + '/v1/bibles/35/books/gen/json'
+	resp = requests.get(url, headers={'Accept-Encoding': 'identity'})
+	assert resp.status_code == 200, resp.text
+	assert 'Content-Encoding' not in resp.headers
+	assert not resp.headers['ETag'].endswith('-gzip"')
+
+def test_booknotmodified(supply_url):
+	url = supply_url + '/v1/bibles/35/books/gen/json'
+	resp = requests.get(url, headers={'Accept-Encoding': 'gzip'})
+	resp = requests.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': resp.headers['ETag']})
+	assert resp.status_code == 304
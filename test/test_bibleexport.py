@@ -0,0 +1,33 @@
+#-*-coding:utf-8-*-
+import io
+import zipfile
+import pytest
+import requests
+import json
+
+@pytest.fixture
+def supply_url():
+	return "https://stagingapi.autographamt.com"
+
+
+def test_biblestream(supply_url):
+	url = supply_url + '/v1/bibles/35/json'
+	resp = requests.get(url)
+	streamed = requests.get(url + '?stream=true')
+	assert streamed.status_code == 200, streamed.text
+	assert json.loads(streamed.text) == json.loads(resp.text)
+
+def test_biblezip(supply_url):
+	url = supply_url + '/v1/bibles/35/usfm?archive=zip'
+	resp = requests.get(url)
+	assert resp.status_code == 200, resp.text
+	archive = zipfile.ZipFile(io.BytesIO(resp.content))
+	assert archive.testzip() is None
+	assert all(name.endswith('.usfm') for name in archive.namelist())
+
+def test_bibleinvalidarchive(supply_url):
+	url = supply_url + '/v1/bibles/35/usfm?archive=rar'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
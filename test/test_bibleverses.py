@@ -0,0 +1,61 @@
+#-*-coding:utf-8-*-
+import pytest
+import requests
+import json
+
+@pytest.fixture
+def supply_url():
+	return "https://stagingapi.autographamt.com"
+
+
+def test_bibleverses(supply_url):
+	url = supply_url + '/v1/bibles/35/verses?references=jhn.3.16-18,rom.8'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert 'references' in j, str(j)
+	assert [ref['reference'] for ref in j['references']] == ['jhn.3.16-18', 'rom.8'], str(j)
+	assert [verse['verseNumber'] for verse in j['references'][0]['verses']] == [16, 17, 18], str(j)
+	for verse in j['references'][1]['verses']:
+		assert verse['bibleBookCode'] == 'rom', str(j)
+		assert verse['chapterNumber'] == 8, str(j)
+
+def test_bibleverses_crosschapter(supply_url):
+	url = supply_url + '/v1/bibles/35/verses?references=jhn.3.35-4.2'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	verses = [(verse['chapterNumber'], verse['verseNumber']) for verse in j['references'][0]['verses']]
+	assert verses == [(3, 35), (3, 36), (4, 1), (4, 2)], str(j)
+
+def test_bibleverses_invalidreference(supply_url):
+	url = supply_url + '/v1/bibles/35/verses?references=jhn.3.x'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
+	assert j['message'] == "Invalid reference, jhn.3.x", str(j)
+
+def test_bibleverses_reversedrange(supply_url):
+	url = supply_url + '/v1/bibles/35/verses?references=jhn.3.18-16'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
+	assert j['message'] == "Invalid reference, jhn.3.18-16", str(j)
+
+def test_bibleverses_toomany(supply_url):
+	url = supply_url + '/v1/bibles/35/verses?references=' + ','.join(['jhn.3.16'] * 201)
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
+	assert j['message'] == "Too many references, at most 200 can be read at once", str(j)
+
+def test_bibleverses_invalidsource(supply_url):
+	url = supply_url + '/v1/bibles/9999/verses?references=jhn.3.16'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
+	assert j['message'] == "Invalid source Id", str(j)
@@ -19,3 +19,12 @@ def test_generateconcordance(url):
 
 
 	
+
+
+# the token is matched inside longer words too
+def test_generateconcordance_substring():
+	resp = requests.get("https://stagingapi.autographamt.com/v1/concordances/35/jhn/प्रेम")
+	out = json.loads(resp.text)
+	assert resp.status_code == 200
+	for verse in out['jhn'] + out['all']:
+		assert 'प्रेम' in verse['verse'], str(verse)
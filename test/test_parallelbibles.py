@@ -0,0 +1,41 @@
+#-*-coding:utf-8-*-
+import pytest
+import requests
+import json
+
+@pytest.fixture
+def supply_url():
+	return "https://stagingapi.autographamt.com"
+
+
+def test_parallelbibles(supply_url):
+	url = supply_url + '/v1/bibles/parallel?sources=35,35&reference=jhn.3.16-18'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['sources'] == [35, 35], str(j)
+	for verse in j['verses']:
+		assert len(verse['texts']) == 2, str(verse)
+		assert verse['texts'][0] == verse['texts'][1], str(verse)
+
+def test_parallelbibles_invalidsource(supply_url):
+	url = supply_url + '/v1/bibles/parallel?sources=35,9999&reference=jhn.3'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
+	assert j['message'] == "Invalid source Id, 9999", str(j)
+
+def test_parallelbibles_invalidreference(supply_url):
+	url = supply_url + '/v1/bibles/parallel?sources=35&reference=jhn.3.x'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
+
+def test_parallelbibles_toomanyverses(supply_url):
+	url = supply_url + '/v1/bibles/parallel?sources=35,35&startRefId=1001001&endRefId=66022021'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
@@ -0,0 +1,57 @@
+'''
+Tests of agmt/projectstats.py against the database of the environment variables (AGMT_POSTGRES_*).
+The tables are temporary tables of a transaction that is rolled back.
+'''
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'agmt'))
+psycopg2 = pytest.importorskip("psycopg2")
+import projectstats
+
+
+@pytest.fixture
+def cursor():
+	try:
+		connection = psycopg2.connect(host=os.environ.get("AGMT_POSTGRES_HOST", "localhost"),
+			port=os.environ.get("AGMT_POSTGRES_PORT", "5432"), user=os.environ.get("AGMT_POSTGRES_USER", "postgres"),
+			password=os.environ.get("AGMT_POSTGRES_PASSWORD", "secret"),
+			database=os.environ.get("AGMT_POSTGRES_DATABASE", "postgres"))
+	except psycopg2.OperationalError:
+		pytest.skip("database not available")
+	cursor = connection.cursor()
+	# temporary tables hide the tables of the same name for the session
+	cursor.execute("create temp table project_book_statistics (project_id bigint, book_id int, \
+		all_tokens_count int default 0 not null, translated_tokens_count int default 0 not null, \
+			updated_at timestamp with time zone, primary key (project_id, book_id))")
+	cursor.execute("create temp table translations (translation_id serial, token text)")
+	cursor.execute("create temp table translation_projects_look_up (translation_id int, project_id bigint)")
+	cursor.execute("create temp table test_1_stats_bible (book_id int)")
+	cursor.execute("create temp table test_1_stats_bible_tokens (token text, book_id int)")
+	cursor.execute("insert into test_1_stats_bible values (1), (2), (3), (4)")
+	# books 1 to 3 are tokenized, book 4 is not
+	cursor.execute("insert into test_1_stats_bible_tokens values ('a', 1), ('b', 1), ('c', 1), ('a', 2), \
+		('d', 2), ('e', 3)")
+	cursor.execute("insert into translations (token) values ('a'), ('d'), ('e')")
+	cursor.execute("insert into translation_projects_look_up select translation_id, 7 from translations \
+		where token in ('a', 'd')")
+	cursor.execute("insert into translation_projects_look_up select translation_id, 8 from translations \
+		where token='e'")
+	yield cursor
+	connection.rollback()
+	connection.close()
+
+
+def test_statistics_of_new_project(cursor):
+	assert projectstats.get_statistics(cursor, 7, 'test_1_stats_bible_tokens') == [(1, 3, 1), (2, 2, 2), (3, 1, 0)]
+
+
+def test_statistics_backfill_with_some_books(cursor):
+	# the statistics of book 2 were kept since it was tokenized, the other books were tokenized before
+	cursor.execute("insert into project_book_statistics (project_id, book_id, all_tokens_count, \
+		translated_tokens_count) values (7, 2, 2, 2)")
+	assert projectstats.missing_books(cursor, 7, 'test_1_stats_bible_tokens') == [1, 3, 4]
+	assert projectstats.get_statistics(cursor, 7, 'test_1_stats_bible_tokens') == [(1, 3, 1), (2, 2, 2), (3, 1, 0)]
+	assert projectstats.missing_books(cursor, 7, 'test_1_stats_bible_tokens') == []
+
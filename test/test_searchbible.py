@@ -0,0 +1,51 @@
+#-*-coding:utf-8-*-
+import pytest
+import requests
+import json
+
+@pytest.fixture
+def supply_url():
+	return "https://stagingapi.autographamt.com"
+
+
+def test_searchbible(supply_url):
+	url = supply_url + '/v1/search/35?keyword=love'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['total'] >= len(j['result']), str(j)
+	assert len(j['result']) <= 100, str(j)
+
+def test_searchbible_paged(supply_url):
+	url = supply_url + '/v1/search/35?keyword=love&offset=5&limit=5'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['offset'] == 5, str(j)
+	assert len(j['result']) <= 5, str(j)
+
+def test_searchbible_book_chapter(supply_url):
+	url = supply_url + '/v1/search/35?keyword=love&book=jhn&chapter=3'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert 'success' not in j, str(j)
+	assert 'result' in j, str(j)
+	for verse in j['result']:
+		assert verse['bookCode'] == 'jhn', str(j)
+		assert verse['chapter'] == 3, str(j)
+
+def test_searchbible_phrase(supply_url):
+	url = supply_url + '/v1/search/35?keyword="son of man"'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert 'result' in j, str(j)
+
+def test_searchbible_invalidsource(supply_url):
+	url = supply_url + '/v1/search/9999?keyword=love'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
+	assert j['message'] == "Invalid source Id", str(j)
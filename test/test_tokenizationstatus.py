@@ -0,0 +1,41 @@
+#-*-coding:utf-8-*-
+import pytest
+import requests
+import json
+
+@pytest.fixture
+def supply_url():
+	return "https://stagingapi.autographamt.com"
+
+
+def test_tokenizationstatus(supply_url):
+	url = supply_url + '/v1/tokenization/35?books=mat&books=mrk'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert len(j) == 2, str(j)
+	for book in j:
+		assert book['status'] in [None, 'pending', 'running', 'done', 'failed'], str(j)
+
+def test_tokenizationstatus_invalidsource(supply_url):
+	url = supply_url + '/v1/tokenization/9999?books=mat'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code == 200, resp.text
+	assert j['success'] == False, str(j)
+	assert j['message'] == "Invalid source Id", str(j)
+
+def test_tokenlist_pending_or_ready(supply_url):
+	url = supply_url + '/v1/tokenlist/35?books=mat'
+	resp = requests.get(url)
+	j = json.loads(resp.text)
+	assert resp.status_code in [200, 202], resp.text
+	if resp.status_code == 202:
+		assert j['status'] == 'pending', str(j)
+	else:
+		assert isinstance(j, list), str(j)
+
+def test_retrytokenization_notoken(supply_url):
+	url = supply_url + '/v1/tokenization/35'
+	resp = requests.post(url, json={'books': ['mat']})
+	assert resp.status_code == 401, resp.text
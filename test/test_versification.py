@@ -0,0 +1,70 @@
+'''
+Tests of the versification of agmt/versification.py
+'''
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'agmt'))
+import versification
+
+bcv_map_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DB', 'bcv_map.csv')
+
+
+@pytest.fixture(scope='module')
+def bible():
+	return versification.VersificationLoader(bcv_map_path).get(None)
+
+
+def test_ref_id_lid(bible):
+	assert len(bible) == 31102
+	assert bible.lid(1001001) == 1
+	assert bible.ref_id_of_lid(1) == 1001001
+	assert bible.lid(66022021) == 31102
+	for lid in (1, 2, 1534, 23146, 31102):
+		assert bible.lid(bible.ref_id_of_lid(lid)) == lid
+	assert bible.lid(1001032) is None
+	assert bible.ref_id_of_lid(0) is None
+	assert bible.ref_id_of_lid(31103) is None
+	assert versification.bcv(43003016) == (43, 3, 16)
+	assert versification.ref_id(43, 3, 16) == 43003016
+
+
+def test_chapters(bible):
+	assert bible.has_chapter(1, 50)
+	assert not bible.has_chapter(1, 51)
+	assert not bible.has_chapter(67, 1)
+	assert bible.verse_count(43, 3) == 36
+	assert bible.verse_count(19, 119) == 176
+	assert bible.verse_count(1, 51) == 0
+	assert bible.chapter_count(19) == 150
+	assert bible.verses_between(43003016, 43003018) == 3
+	assert bible.verses_between(1001001, 66999999) == 31102
+
+
+class Connection(object):
+	'''A connection returning the rows of the bcv_map table'''
+
+	def __init__(self, rows):
+		self.rows = rows
+
+	def cursor(self):
+		return self
+
+	def execute(self, query):
+		assert 'bcv_map' in query
+
+	def fetchall(self):
+		return self.rows
+
+	def close(self):
+		pass
+
+
+def test_table_fallback(tmpdir):
+	connection = Connection([(1001002, 1, 1, 2), (1001001, 1, 1, 1), (1002001, 1, 2, 1)])
+	bible = versification.VersificationLoader(str(tmpdir.join('missing.csv'))).get(lambda: connection)
+	assert len(bible) == 3
+	assert bible.lid(1001002) == 2
+	assert bible.verse_count(1, 1) == 2
+	assert bible.chapter_count(1) == 2